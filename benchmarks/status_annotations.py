@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Times Subject.objects.with_hiv_status() against Status.bulk, and StatusReport,
+on a synthetic SQLite database.
+
+    $ python benchmarks/status_annotations.py --subjects 20000 --visits 4
+    $ python benchmarks/status_annotations.py --subjects 250000 --visits 4 --report-only
+
+Creates `--subjects` subjects with `--visits` visits and HivResult rows each
+(every other visit also gets a HivStatusReview) in a temporary database, then
+counts the newly positive subjects in SQL with with_hiv_status() and in Python
+with Status.bulk, reports the size of the annotated query and times
+StatusReport by visit code and by visit code and encounter.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hiv_status.settings')
+
+
+def setup(database_name):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database_name
+    import django
+    django.setup()
+
+
+def populate(subject_count, visits_per_subject, batch_size=5000):
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from edc_constants.constants import POS, NEG
+    from hiv_status.models import HivResult, HivStatusReview, Subject, Visit
+
+    start = timezone.now() - timedelta(days=30 * visits_per_subject)
+    with transaction.atomic():
+        Subject.objects.bulk_create(
+            [Subject(subject_identifier='S{:09d}'.format(n)) for n in range(subject_count)])
+        visits = []
+        for subject_id in Subject.objects.values_list('pk', flat=True).iterator():
+            for m in range(visits_per_subject):
+                visits.append(Visit(
+                    subject_id=subject_id, visit_code='{}000'.format(m + 1),
+                    encounter=subject_id * visits_per_subject + m, visit_datetime=start + timedelta(days=30 * m)))
+            if len(visits) >= batch_size:
+                Visit.objects.bulk_create(visits)
+                visits = []
+        Visit.objects.bulk_create(visits)
+        results, reviews = [], []
+        for n, (visit_id, visit_datetime) in enumerate(
+                Visit.objects.order_by('pk').values_list('pk', 'visit_datetime').iterator()):
+            results.append(HivResult(
+                visit_id=visit_id, result_value=POS if n % 7 == 0 else NEG, result_datetime=visit_datetime))
+            if n % 2 == 0:
+                reviews.append(HivStatusReview(
+                    visit_id=visit_id, documented_result=POS if n % 3 == 0 else NEG,
+                    documented_result_date=visit_datetime.date(), report_datetime=visit_datetime))
+            if len(results) >= batch_size:
+                HivResult.objects.bulk_create(results)
+                HivStatusReview.objects.bulk_create(reviews)
+                results, reviews = [], []
+        HivResult.objects.bulk_create(results)
+        HivStatusReview.objects.bulk_create(reviews)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    value = func()
+    print('{:<48} {:>10} {:>10.2f} s'.format(label, value, time.perf_counter() - start))
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subjects', type=int, default=20000, help='number of subjects')
+    parser.add_argument('--visits', type=int, default=4, help='visits and HivResult rows per subject')
+    parser.add_argument('--report-only', action='store_true', help='only time StatusReport')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(os.path.join(tmp, 'benchmark.sqlite3'))
+        from django.core.management import call_command
+        from hiv_status.models import HivResult, HivStatusReview, Subject
+        from hiv_status.status import Status
+        from hiv_status.status_report import StatusReport
+
+        call_command('migrate', verbosity=0)
+        start = time.perf_counter()
+        populate(args.subjects, args.visits)
+        print('Created {} subjects with {} HivResult rows in {:.0f} s'.format(
+            args.subjects, args.subjects * args.visits, time.perf_counter() - start))
+
+        newly_positive = Subject.objects.with_hiv_status().filter(newly_positive=True)
+        for label, queryset in [('with_hiv_status()', newly_positive), ('StatusReport()', StatusReport().queryset())]:
+            sql, params = queryset.query.sql_with_params()
+            print('{}: {} SELECTs, {} bytes of SQL'.format(label, sql.upper().count('SELECT'), len(sql)))
+        print('')
+        if not args.report_only:
+            timed('with_hiv_status().filter(newly_positive).count()', newly_positive.count)
+            timed('list(with_hiv_status())', lambda: len(list(Subject.objects.with_hiv_status())))
+            timed('Status.bulk newly_positive', lambda: sum(
+                status.newly_positive for status in Status.bulk(
+                    Subject.objects.order_by('pk').iterator(), tested=HivResult, documented=HivStatusReview)))
+        timed('StatusReport() newly_positive', lambda: sum(row['newly_positive'] for row in StatusReport()))
+        timed('StatusReport(by_encounter=True) groups', lambda: len(list(StatusReport(by_encounter=True))))
+
+
+if __name__ == '__main__':
+    main()
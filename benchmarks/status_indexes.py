@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Compares query plans and latencies of the Status lookups before and after
+migration 0002_status_lookup_indexes on a synthetic SQLite database.
+
+    $ python benchmarks/status_indexes.py --rows 1000000
+
+Creates `--rows` HivResult rows (one per visit, `--visits` visits per subject,
+every `--review-every` visit also gets a HivStatusReview) in a temporary
+database, migrates hiv_status back to 0001_initial, times Status for a sample
+of subjects, applies 0002_status_lookup_indexes and times them again.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hiv_status.settings')
+
+
+def setup(database_name):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database_name
+    import django
+    django.setup()
+
+
+def populate(rows, visits_per_subject, review_every, batch_size=5000):
+    from django.db import transaction
+    from django.utils import timezone
+    from edc_constants.constants import POS, NEG
+    from hiv_status.models import HivResult, HivStatusReview, Subject, Visit
+
+    random.seed(0)
+    subject_count = rows // visits_per_subject
+    start = timezone.now() - timedelta(days=30 * visits_per_subject)
+    with transaction.atomic():
+        Subject.objects.bulk_create(
+            [Subject(subject_identifier='S{:09d}'.format(n)) for n in range(subject_count)])
+        subject_ids = list(Subject.objects.order_by('pk').values_list('pk', flat=True))
+        visits, encounter = [], 0
+        for subject_id in subject_ids:
+            for m in range(visits_per_subject):
+                encounter += 1
+                visits.append(Visit(
+                    subject_id=subject_id, visit_code='{}000'.format(m % 4 + 1), encounter=encounter,
+                    visit_datetime=start + timedelta(days=30 * m)))
+            if len(visits) >= batch_size:
+                Visit.objects.bulk_create(visits)
+                visits = []
+        Visit.objects.bulk_create(visits)
+        results, reviews = [], []
+        for n, (visit_id, visit_datetime) in enumerate(
+                Visit.objects.order_by('pk').values_list('pk', 'visit_datetime').iterator()):
+            results.append(HivResult(
+                visit_id=visit_id, result_value=POS if random.random() < 0.05 else NEG,
+                result_datetime=visit_datetime))
+            if n % review_every == 0:
+                reviews.append(HivStatusReview(
+                    visit_id=visit_id, documented_result=POS if random.random() < 0.2 else NEG,
+                    documented_result_date=visit_datetime.date(), report_datetime=visit_datetime))
+            if len(results) >= batch_size:
+                HivResult.objects.bulk_create(results)
+                HivStatusReview.objects.bulk_create(reviews)
+                results, reviews = [], []
+        HivResult.objects.bulk_create(results)
+        HivStatusReview.objects.bulk_create(reviews)
+    analyze()
+    return subject_ids
+
+
+def analyze():
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def lookup_querysets(subject):
+    """Returns the querysets Status runs for tested=HivResult, documented=HivStatusReview."""
+    from hiv_status.models import HivResult, HivStatusReview
+    from hiv_status.status import Status
+
+    status = Status(subject, visit_code='2000')
+    querysets = []
+    for name, model in [('tested', HivResult), ('documented', HivStatusReview)]:
+        options = status.options(name)
+        querysets.append(('{} latest'.format(name), model.objects.filter(**options).order_by(
+            '-{}'.format(status.plans[name].get_latest_by))[:1]))
+        options.update(status.visit_options(name))
+        querysets.append(('{} latest at visit_code'.format(name), model.objects.filter(**options).order_by(
+            '-{}'.format(status.plans[name].get_latest_by))[:1]))
+    querysets.append(('previous', status.previous_queryset(HivResult.objects.all(), 'previous').order_by(
+        *status.previous_ordering('previous'))[:1]))
+    return querysets
+
+
+def report(label, subjects):
+    from django.db import connection
+    from hiv_status.models import HivResult, HivStatusReview
+    from hiv_status.status import Status
+
+    print('\n== {}'.format(label))
+    with connection.cursor() as cursor:
+        for name, queryset in lookup_querysets(subjects[0]):
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute('EXPLAIN QUERY PLAN {}'.format(sql), params)
+            print('{}:'.format(name))
+            for row in cursor.fetchall():
+                print('    {}'.format(row[-1]))
+    timings = []
+    for subject in subjects:
+        start = time.perf_counter()
+        Status(subject, tested=HivResult, documented=HivStatusReview)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print('Status(tested=HivResult, documented=HivStatusReview) over {} subjects: '
+          'mean {:.2f} ms, p50 {:.2f} ms, p95 {:.2f} ms'.format(
+              len(timings), sum(timings) / len(timings), timings[len(timings) // 2],
+              timings[int(len(timings) * 0.95)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='number of HivResult rows')
+    parser.add_argument('--visits', type=int, default=10, help='visits per subject')
+    parser.add_argument('--review-every', type=int, default=5, help='add a HivStatusReview every n visits')
+    parser.add_argument('--sample', type=int, default=500, help='number of subjects to time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(os.path.join(tmp, 'benchmark.sqlite3'))
+        from django.core.management import call_command
+        from hiv_status.models import Subject
+
+        call_command('migrate', verbosity=0)
+        call_command('migrate', 'hiv_status', '0001_initial', verbosity=0)
+        start = time.perf_counter()
+        subject_ids = populate(args.rows, args.visits, args.review_every)
+        print('Created {} HivResult rows for {} subjects in {:.0f} s'.format(
+            args.rows, len(subject_ids), time.perf_counter() - start))
+        random.seed(1)
+        subjects = list(Subject.objects.filter(pk__in=random.sample(subject_ids, args.sample)))
+        report('before 0002_status_lookup_indexes', subjects)
+        call_command('migrate', 'hiv_status', '0002_status_lookup_indexes', verbosity=0)
+        analyze()
+        report('after 0002_status_lookup_indexes', subjects)
+
+
+if __name__ == '__main__':
+    main()
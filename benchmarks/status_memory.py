@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Measures the memory retained per Status on a synthetic SQLite database.
+
+    $ python benchmarks/status_memory.py --subjects 10000
+
+Creates `--subjects` subjects with `--visits` HivResult rows each (every
+other visit also gets a HivStatusReview) in a temporary database, builds a
+Status for every subject with Status.bulk and reports the memory still
+allocated, as traced by tracemalloc, divided by the number of statuses.
+Statuses from string sources and, if the Status class has the attribute,
+with keep_instances=True, i.e. keeping the result instances and their
+visits, are measured as well.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hiv_status.settings')
+
+
+def setup(database_name):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database_name
+    import django
+    django.setup()
+
+
+def populate(subject_count, visits_per_subject):
+    from django.db import transaction
+    from django.utils import timezone
+    from edc_constants.constants import POS, NEG
+    from hiv_status.models import HivResult, HivStatusReview, Subject, Visit
+
+    start = timezone.now() - timedelta(days=30 * visits_per_subject)
+    with transaction.atomic():
+        Subject.objects.bulk_create(
+            [Subject(subject_identifier='S{:09d}'.format(n)) for n in range(subject_count)])
+        Visit.objects.bulk_create([
+            Visit(subject_id=subject_id, visit_code='{}000'.format(m + 1),
+                  encounter=subject_id * visits_per_subject + m, visit_datetime=start + timedelta(days=30 * m))
+            for subject_id in Subject.objects.values_list('pk', flat=True) for m in range(visits_per_subject)])
+        results, reviews = [], []
+        for n, (visit_id, visit_datetime) in enumerate(Visit.objects.values_list('pk', 'visit_datetime')):
+            results.append(HivResult(
+                visit_id=visit_id, result_value=POS if n % 7 == 0 else NEG, result_datetime=visit_datetime))
+            if n % 2 == 0:
+                reviews.append(HivStatusReview(
+                    visit_id=visit_id, documented_result=POS if n % 3 == 0 else NEG,
+                    documented_result_date=visit_datetime.date(), report_datetime=visit_datetime))
+        HivResult.objects.bulk_create(results)
+        HivStatusReview.objects.bulk_create(reviews)
+
+
+def measure(label, build):
+    tracemalloc.start()
+    statuses = build()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('{:<40} {:>8} statuses {:>10.0f} bytes/status'.format(label, len(statuses), current / len(statuses)))
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subjects', type=int, default=10000, help='number of subjects')
+    parser.add_argument('--visits', type=int, default=4, help='visits per subject')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(os.path.join(tmp, 'benchmark.sqlite3'))
+        from django.core.management import call_command
+        from edc_constants.constants import POS, NEG
+        from hiv_status.models import HivResult, HivStatusReview, Subject
+        from hiv_status.status import Status
+
+        call_command('migrate', verbosity=0)
+        populate(args.subjects, args.visits)
+        subjects = list(Subject.objects.order_by('pk'))
+
+        measure('Status(tested=POS, documented=NEG)', lambda: [
+            Status(subject, tested=POS, documented=NEG) for subject in subjects])
+        measure('Status.bulk(HivResult, HivStatusReview)', lambda: list(
+            Status.bulk(subjects, tested=HivResult, documented=HivStatusReview)))
+        if hasattr(Status, 'keep_instances'):
+            class InstanceStatus(Status):
+                keep_instances = True
+            measure('  keep_instances=True', lambda: list(
+                InstanceStatus.bulk(subjects, tested=HivResult, documented=HivStatusReview)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+default_app_config = 'hiv_status.apps.AppConfig'
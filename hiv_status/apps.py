@@ -0,0 +1,9 @@
+from django.apps import AppConfig as DjangoAppConfig
+
+
+class AppConfig(DjangoAppConfig):
+    name = 'hiv_status'
+    verbose_name = 'HIV Status'
+
+    def ready(self):
+        from . import signals  # noqa
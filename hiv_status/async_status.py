@@ -0,0 +1,67 @@
+import asyncio
+
+from django.db import close_old_connections
+
+from .status import Status
+
+
+class AsyncStatusMixin:
+
+    """A mixin for Status, or a subclass of Status, that looks up the sources
+    concurrently in threads for use from coroutines.
+
+    Create instances with `aresolve`, instantiating the class directly does not
+    look up anything:
+
+        >>> status = await AsyncStatus.aresolve(subject, tested=HivResult, documented=HivStatusReview)
+        >>> str(status)
+        'POS'
+
+    tested and previous are looked up one after the other since previous is
+    compared with the tested result, documented, indirect and verbal each in
+    their own thread. The result is then decided as by Status. Lookups run in
+    `executor`, or the event loop's default executor if None; each thread uses
+    its own database connection, closed per CONN_MAX_AGE after each lookup.
+    """
+
+    executor = None
+
+    # instances are resolved after construction, by aresolve, so are not shared
+    memoize = False
+
+    def resolve(self, tested, documented, indirect, verbal):
+        self.sources = {'tested': tested, 'documented': documented, 'indirect': indirect, 'verbal': verbal}
+
+    @classmethod
+    async def aresolve(cls, subject, **kwargs):
+        """Returns a new instance with all sources looked up."""
+        status = cls(subject, **kwargs)
+        await status.alookup()
+        return status
+
+    async def alookup(self):
+        """Looks up the sources concurrently and sets the result."""
+        documented, self.indirect, self.verbal = (await asyncio.gather(
+            self.alookup_tested(),
+            self.run_in_executor(self.lookup_latest, self.sources['documented'], 'documented'),
+            self.run_in_executor(self.lookup_latest, self.sources['indirect'], 'indirect'),
+            self.run_in_executor(self.lookup_latest, self.sources['verbal'], 'verbal')))[1:]
+        self.documented = self.merge_previous(documented)
+        self.decide()
+
+    async def alookup_tested(self):
+        self.tested = await self.run_in_executor(self.lookup_latest, self.sources['tested'], 'tested')
+        self.previous = await self.run_in_executor(self.lookup_previous, self.sources['tested'], 'previous')
+
+    def run_in_executor(self, func, *args):
+        return asyncio.get_event_loop().run_in_executor(self.executor, self.in_thread, func, *args)
+
+    def in_thread(self, func, *args):
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+
+class AsyncStatus(AsyncStatusMixin, Status):
+    pass
@@ -43,5 +43,5 @@ class Status(BaseStatus):
         'tested': ['hiv_result', 'hiv_result_datetime', 'subject_visit'],
         'documented': ['recorded_hiv_result', 'hiv_test_date', 'subject_visit'],
         'indirect': ['result_recorded', 'result_date', 'subject_visit'],
-        'verbal': ['verbal_hiv_result', '', 'subject_visit'],
+        'verbal': ['verbal_hiv_result', 'report_datetime', 'subject_visit'],
     }
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+
+from .slow_lookups import SlowQuery, slow_lookup_log
+from .status import Status
+from .status_metrics import status_metrics
+
+
+class CountingCursorWrapper(CursorWrapper):
+
+    def __init__(self, cursor, db, counter):
+        super(CountingCursorWrapper, self).__init__(cursor, db)
+        self.counter = counter
+
+    def execute(self, sql, params=None):
+        started = perf_counter()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self.counter.executed(self.db, sql, params, perf_counter() - started)
+
+    def executemany(self, sql, param_list):
+        started = perf_counter()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self.counter.executed(self.db, sql, None, perf_counter() - started)
+
+
+class QueryCounter:
+
+    """Counts the queries executed in this thread on any database connection within
+    a `with` block.
+
+    Queries taking at least `threshold` seconds, if given, are kept in `slow_queries`
+    as SlowQuery tuples with the current `stage`.
+
+    Django 1.9 has no connection.execute_wrapper(), so the cursors of each connection
+    are wrapped by replacing its make_cursor and make_debug_cursor for the block."""
+
+    def __init__(self, threshold=None):
+        self.count = 0
+        self.threshold = threshold
+        self.stage = None
+        self.slow_queries = []
+        self.saved = []
+
+    def __enter__(self):
+        for connection in connections.all():
+            saved = {name: connection.__dict__.get(name) for name in ['make_cursor', 'make_debug_cursor']}
+            for name in saved:
+                setattr(connection, name, self.counting(connection, getattr(connection, name)))
+            self.saved.append((connection, saved))
+        return self
+
+    def __exit__(self, *exc_info):
+        while self.saved:
+            connection, saved = self.saved.pop()
+            for name, method in saved.items():
+                if method is None:
+                    delattr(connection, name)
+                else:
+                    setattr(connection, name, method)
+
+    def executed(self, connection, sql, params, seconds):
+        self.count += 1
+        if self.threshold is not None and seconds >= self.threshold:
+            self.slow_queries.append(SlowQuery(self.stage, connection.alias, sql, params, seconds))
+
+    def counting(self, connection, make_cursor):
+        def make_counting_cursor(cursor):
+            return CountingCursorWrapper(make_cursor(cursor), connection, self)
+        return make_counting_cursor
+
+
+class InstrumentedStatusMixin:
+
+    """A mixin for Status, or a subclass of Status that looks up its sources in
+    resolve(), that records the wall time and number of queries of each stage.
+
+    After construction `timings` and `queries` are OrderedDicts of stage: seconds
+    and stage: query count for the stages tested, previous, documented, indirect,
+    verbal (each lookup_latest or lookup_previous), merge (merge_previous and the
+    SimpleStatus decision) and total. Each status is then recorded in `metrics`,
+    by default `status_metrics`, for histograms sent to its sink. Queries slower
+    than the threshold of `slow_lookup_log` are logged with their plan:
+
+        >>> status = InstrumentedStatus(subject, tested=HivResult, documented=HivStatusReview)
+        >>> status.queries
+        OrderedDict([('tested', 1), ('previous', 1), ('documented', 1), ..., ('total', 3)])
+    """
+
+    metrics = status_metrics
+
+    slow_lookup_log = slow_lookup_log
+
+    def resolve(self, tested, documented, indirect, verbal):
+        self.timings = OrderedDict()
+        self.queries = OrderedDict()
+        threshold = self.slow_lookup_log.threshold if self.slow_lookup_log is not None else None
+        with QueryCounter(threshold=threshold) as self.query_counter:
+            with self.stage('total'):
+                super(InstrumentedStatusMixin, self).resolve(tested, documented, indirect, verbal)
+        self.timings.move_to_end('total')
+        self.queries.move_to_end('total')
+        self.slow_queries = self.query_counter.slow_queries
+        del self.query_counter
+        if self.slow_queries:
+            self.slow_lookup_log.log(self, self.slow_queries)
+        if self.metrics is not None:
+            self.metrics.record(self)
+
+    @contextmanager
+    def stage(self, name):
+        counter = getattr(self, 'query_counter', None)
+        if counter is None:
+            yield
+            return
+        started, count, outer_stage = perf_counter(), counter.count, counter.stage
+        counter.stage = name
+        try:
+            yield
+        finally:
+            counter.stage = outer_stage
+            self.timings[name] = self.timings.get(name, 0) + perf_counter() - started
+            self.queries[name] = self.queries.get(name, 0) + counter.count - count
+
+    def lookup_latest(self, result, name):
+        with self.stage(name):
+            return super(InstrumentedStatusMixin, self).lookup_latest(result, name)
+
+    def lookup_previous(self, result, name):
+        with self.stage(name):
+            return super(InstrumentedStatusMixin, self).lookup_previous(result, name)
+
+    def merge_previous(self, documented):
+        with self.stage('merge'):
+            return super(InstrumentedStatusMixin, self).merge_previous(documented)
+
+    def decide(self):
+        with self.stage('merge'):
+            super(InstrumentedStatusMixin, self).decide()
+
+
+class InstrumentedStatus(InstrumentedStatusMixin, Status):
+
+    pass
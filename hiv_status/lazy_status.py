@@ -0,0 +1,62 @@
+from django.utils.functional import cached_property
+from edc_constants.constants import POS
+
+from .result_wrapper import ResultWrapper
+from .status import Status
+
+
+class LazyStatusMixin:
+
+    """A mixin for Status, or a subclass of Status, that looks up each source on
+    first access instead of in __init__.
+
+    `result` follows the precedence of SimpleStatus but stops at the first source
+    that decides it, so a tested result never queries documented, indirect or
+    verbal, and verbal is only queried if include_verbal is True. `previous` is
+    only queried if there is a tested result. `subject_aware` and `newly_positive`
+    also only access the sources they need.
+
+        >>> status = LazyStatus(subject, tested=HivResult, documented=HivStatusReview)
+        >>> str(status)  # queries HivResult only if the result is POS
+        'POS'
+    """
+
+    def resolve(self, tested, documented, indirect, verbal):
+        self.sources = {'tested': tested, 'documented': documented, 'indirect': indirect, 'verbal': verbal}
+
+    @cached_property
+    def tested(self):
+        return self.lookup_latest(self.sources['tested'], name='tested')
+
+    @cached_property
+    def previous(self):
+        return self.lookup_previous(self.sources['tested'], name='previous')
+
+    @cached_property
+    def documented(self):
+        return self.merge_previous(self.lookup_latest(self.sources['documented'], name='documented'))
+
+    @cached_property
+    def indirect(self):
+        return self.lookup_latest(self.sources['indirect'], name='indirect')
+
+    @cached_property
+    def verbal(self):
+        return self.lookup_latest(self.sources['verbal'], name='verbal')
+
+    @cached_property
+    def result(self):
+        if str(self.tested):
+            return self.tested
+        elif self.documented == POS:
+            return self.documented
+        elif self.indirect == POS:
+            return self.indirect
+        elif self.include_verbal and self.verbal == POS:
+            if not str(self.documented) and not str(self.indirect):
+                return self.verbal
+        return ResultWrapper(None)
+
+
+class LazyStatus(LazyStatusMixin, Status):
+    pass
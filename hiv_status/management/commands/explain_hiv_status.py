@@ -0,0 +1,148 @@
+from collections import OrderedDict
+
+from django.apps import apps
+from django.core.exceptions import FieldError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from hiv_status.instrumented_status import InstrumentedStatusMixin
+from hiv_status.models import SubjectHivStatus
+from hiv_status.slow_lookups import IndexAdvisor, SlowLookupLog
+from hiv_status.status_metrics import StatusMetrics
+
+
+class ReplayLog(SlowLookupLog):
+
+    """Keeps the slowest query of each stage instead of logging it."""
+
+    def __init__(self):
+        super(ReplayLog, self).__init__(threshold=0)
+        self.slowest = OrderedDict()
+
+    def log(self, status, slow_queries):
+        for query in slow_queries:
+            if query.stage not in self.slowest or query.seconds > self.slowest[query.stage].seconds:
+                self.slowest[query.stage] = query
+
+
+class Command(BaseCommand):
+
+    help = ('Replays the Status lookups of a sample of subjects and prints the queries and '
+            'milliseconds of each stage, the query plan of the slowest query of each stage '
+            'and the index suggested for each source model.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sample', type=int, default=100, dest='sample',
+            help='Number of subjects to replay, the most recent first (default: 100).')
+        parser.add_argument(
+            '--status-class', default=None, dest='status_class',
+            help='Dotted path of the Status class to replay (default: SubjectHivStatus.status_class).')
+        for name in ['tested', 'documented', 'indirect', 'verbal']:
+            parser.add_argument(
+                '--{}'.format(name), default=None, dest=name,
+                help='Model of the {} source, app_label.ModelName (default: SubjectHivStatus.sources '
+                     'if no source is given).'.format(name))
+        parser.add_argument(
+            '--subject-model', default='hiv_status.Subject', dest='subject_model',
+            help='Model of the subjects to replay, app_label.ModelName (default: hiv_status.Subject).')
+        parser.add_argument(
+            '--threshold-ms', type=float, default=None, dest='threshold_ms',
+            help='Also count the queries of each stage taking at least this many milliseconds.')
+
+    def handle(self, *args, **options):
+        if options['sample'] < 1:
+            raise CommandError('Invalid sample {}. Expected a positive number.'.format(options['sample']))
+        status_class = self.get_status_class(options['status_class'])
+        sources = {name: self.get_model(options[name])
+                   for name in ['tested', 'documented', 'indirect', 'verbal'] if options[name]}
+        sources = sources or SubjectHivStatus.sources
+        subject_model = self.get_model(options['subject_model'])
+        replay_log = ReplayLog()
+        replay_class = type('Replay{}'.format(status_class.__name__), (InstrumentedStatusMixin, status_class), {
+            'memoize': False, 'metrics': StatusMetrics(), 'slow_lookup_log': replay_log})
+        threshold = None if options['threshold_ms'] is None else options['threshold_ms'] / 1000
+        try:
+            slow = self.replay(replay_class, subject_model.objects.order_by('-pk')[:options['sample']],
+                               sources, threshold)
+        except FieldError as e:
+            raise CommandError(
+                'Cannot replay {}.{} with sources {}. Use --tested, --documented, --indirect, --verbal '
+                'and --subject-model to replay its own models. Got {}'.format(
+                    status_class.__module__, status_class.__name__,
+                    ', '.join('{}={}'.format(name, model._meta.label) for name, model in sorted(sources.items())),
+                    e))
+        metrics = replay_class.metrics
+        if not metrics.count:
+            self.stdout.write('No subjects to replay.')
+            return
+        self.stdout.write('Replayed the lookups of {} subjects with {}.{}.'.format(
+            metrics.count, status_class.__module__, status_class.__name__))
+        self.write_stages(metrics, slow if threshold is not None else None)
+        advisor = IndexAdvisor(status_class)
+        for name, query in replay_log.slowest.items():
+            self.write_advice(advisor, replay_log, name, query, sources)
+
+    def replay(self, replay_class, subjects, sources, threshold):
+        """Replays the lookups of subjects, returning the number of queries of each stage
+        taking at least threshold seconds."""
+        slow = OrderedDict()
+        for subject in subjects:
+            status = replay_class(subject, **sources)
+            for query in status.slow_queries:
+                if threshold is not None and query.seconds >= threshold:
+                    slow[query.stage] = slow.get(query.stage, 0) + 1
+        return slow
+
+    def get_status_class(self, path):
+        if not path:
+            return SubjectHivStatus.status_class
+        try:
+            return import_string(path)
+        except ImportError as e:
+            raise CommandError('Invalid status class {}. Got {}'.format(path, e))
+
+    def get_model(self, label):
+        try:
+            return apps.get_model(label)
+        except (LookupError, ValueError) as e:
+            raise CommandError('Invalid model {}. Expected app_label.ModelName. Got {}'.format(label, e))
+
+    def write_stages(self, metrics, slow):
+        header = '{:<12}{:>9}{:>10}{:>10}{:>10}'.format('stage', 'queries', 'p50 ms', 'p95 ms', 'max ms')
+        self.stdout.write('')
+        self.stdout.write(header + ('{:>7}'.format('slow') if slow is not None else ''))
+        for name in metrics.samples:
+            if not name.endswith('.ms'):
+                continue
+            stage = name[:-len('.ms')]
+            queries = sum(metrics.samples['{}.queries'.format(stage)])
+            timings = metrics.histogram(name)
+            line = '{:<12}{:>9}{:>10.2f}{:>10.2f}{:>10.2f}'.format(
+                stage, queries, timings['p50'], timings['p95'], max(metrics.samples[name]))
+            if slow is not None:
+                line += '{:>7}'.format(slow.get(stage, 0))
+            self.stdout.write(line)
+
+    def write_advice(self, advisor, replay_log, name, query, sources):
+        model = sources.get(name if name != 'previous' else 'tested')
+        connection = connections[query.alias]
+        plan = replay_log.explain(query.alias, query.sql, query.params)
+        self.stdout.write('')
+        self.stdout.write('{}{} - slowest query {:.2f} ms:'.format(
+            name, ' ({})'.format(model._meta.label) if model is not None else '', query.seconds * 1000))
+        for line in plan:
+            self.stdout.write('    {}'.format(line))
+        warnings = advisor.warnings(connection.vendor, plan)
+        for line in warnings:
+            self.stdout.write('  Full scan or sort: {}'.format(line))
+        if model is None:
+            return
+        index = advisor.index(name, model)
+        existing = advisor.existing(model, index)
+        if existing:
+            self.stdout.write('  Index {} is covered by {}.'.format(index, existing))
+        else:
+            self.stdout.write('  Suggested index: {}.Meta.index_together = [{}]'.format(
+                model.__name__, index))
@@ -0,0 +1,84 @@
+import csv
+import gzip
+import json
+
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from hiv_status.models import Subject, SubjectHivStatus
+
+
+class Command(BaseCommand):
+
+    help = ('Writes the HIV status of every subject as CSV or JSON lines. Subjects are '
+            'read and resolved in chunks and rows are written as they are resolved.')
+
+    fields = ['subject_identifier', 'result', 'result_datetime', 'source', 'previous',
+              'previous_datetime', 'subject_aware', 'newly_positive']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'], default='csv', dest='format',
+            help='Output format (default: csv).')
+        parser.add_argument(
+            '--output', default=None, dest='output',
+            help='File to write to (default: stdout). A name ending in .gz is compressed.')
+        parser.add_argument(
+            '--gzip', action='store_true', default=False, dest='gzip',
+            help='Compress the output file with gzip.')
+        parser.add_argument(
+            '--reference-date', default=None, dest='reference_date',
+            help='Status as of this date, YYYY-MM-DD (default: today).')
+        parser.add_argument(
+            '--chunk-size', type=int, default=None, dest='chunk_size',
+            help='Number of subjects resolved per query (default: StatusBatch.chunk_size).')
+
+    def handle(self, *args, **options):
+        reference_date = None
+        if options['reference_date']:
+            reference_date = parse_date(options['reference_date'])
+            if not reference_date:
+                raise CommandError('Invalid reference date {}. Expected YYYY-MM-DD.'.format(
+                    options['reference_date']))
+        compress = options['gzip'] or (options['output'] or '').endswith('.gz')
+        if compress and not options['output']:
+            raise CommandError('--gzip requires --output.')
+        statuses = SubjectHivStatus.status_class.bulk(
+            Subject.objects.order_by('pk').iterator(), chunk_size=options['chunk_size'],
+            reference_date=reference_date, **SubjectHivStatus.sources)
+        rows = (self.row(status) for status in statuses)
+        if options['output']:
+            if compress:
+                f = gzip.open(options['output'], 'wt', encoding='utf-8', newline='')
+            else:
+                f = open(options['output'], 'w', encoding='utf-8', newline='')
+            with f:
+                exported = self.write(f, rows, options['format'])
+            self.stdout.write('Exported HIV status for {} subjects to {}.'.format(exported, options['output']))
+        else:
+            self.write(self.stdout, rows, options['format'])
+
+    def write(self, f, rows, format):
+        """Writes rows to file-like f and returns the number of rows written."""
+        exported = 0
+        if format == 'csv':
+            writer = csv.DictWriter(f, fieldnames=self.fields, lineterminator='\n')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                exported += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+                exported += 1
+        return exported
+
+    def row(self, status):
+        values = SubjectHivStatus.values(status)
+        values['subject_identifier'] = status.subject.subject_identifier
+        for field in ['result_datetime', 'previous_datetime']:
+            if values[field]:
+                values[field] = values[field].isoformat()
+        return OrderedDict((field, values[field]) for field in self.fields)
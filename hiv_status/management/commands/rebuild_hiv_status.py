@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hiv_status.models import SubjectHivStatus
+
+
+class Command(BaseCommand):
+
+    help = 'Deletes and recomputes SubjectHivStatus for all subjects.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=None, dest='chunk_size',
+            help='Number of subjects resolved per query (default: StatusBatch.chunk_size).')
+        parser.add_argument(
+            '--processes', type=int, default=None, dest='processes',
+            help='Number of worker processes to evaluate subjects in (default: this process only).')
+
+    def handle(self, *args, **options):
+        progress = self.progress if options['verbosity'] > 1 else None
+        with transaction.atomic():
+            created = SubjectHivStatus.objects.rebuild(
+                chunk_size=options['chunk_size'], processes=options['processes'], progress=progress)
+        self.stdout.write('Rebuilt HIV status for {} subjects.'.format(created))
+
+    def progress(self, done, total):
+        self.stdout.write('Evaluated {} of {} subjects.'.format(done, total))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 18:49
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HivResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result_value', models.CharField(choices=[('POS', 'HIV Positive (Reactive)'), ('NEG', 'HIV Negative (Non-reactive)'), ('IND', 'Indeterminate'), ('Declined', 'Participant declined testing'), ('Not performed', 'Test could not be performed (e.g. supply outage, technical problem)')], help_text='If participant declined HIV testing, please select a reason below.', max_length=50, verbose_name="Today's HIV test result")),
+                ('result_datetime', models.DateTimeField(blank=True, null=True, verbose_name="Today's HIV test result date and time")),
+                ('why_not_tested', models.CharField(blank=True, help_text='Note: Only asked of individuals declining HIV testing during this visit.', max_length=65, null=True, verbose_name="What was the main reason why you did not want HIV testing as part of today's visit?")),
+            ],
+            options={
+                'get_latest_by': 'result_datetime',
+            },
+        ),
+        migrations.CreateModel(
+            name='HivStatusReview',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_datetime', models.DateTimeField(null=True)),
+                ('documented_result', models.CharField(max_length=10, null=True)),
+                ('documented_result_date', models.DateField(null=True)),
+                ('indirect_documentation', models.CharField(max_length=10, null=True)),
+                ('indirect_documentation_date', models.DateField(null=True)),
+                ('verbal_result', models.CharField(max_length=10, null=True)),
+            ],
+            options={
+                'get_latest_by': 'report_datetime',
+            },
+        ),
+        migrations.CreateModel(
+            name='Subject',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_identifier', models.CharField(max_length=25, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SubjectHivStatus',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result', models.CharField(max_length=50, null=True)),
+                ('result_datetime', models.DateTimeField(null=True)),
+                ('source', models.CharField(help_text='Name of the Status attribute the result came from, e.g. tested, documented', max_length=25, null=True)),
+                ('previous', models.CharField(max_length=50, null=True)),
+                ('previous_datetime', models.DateTimeField(null=True)),
+                ('subject_aware', models.BooleanField(default=False)),
+                ('newly_positive', models.BooleanField(default=False)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('subject', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='hiv_status.Subject')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Visit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visit_datetime', models.DateTimeField()),
+                ('visit_code', models.CharField(max_length=10)),
+                ('encounter', models.IntegerField()),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hiv_status.Subject')),
+            ],
+            options={
+                'ordering': ('-visit_datetime', 'visit_code', 'encounter'),
+                'get_latest_by': 'visit_datetime',
+            },
+        ),
+        migrations.AddField(
+            model_name='hivstatusreview',
+            name='visit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hiv_status.Visit'),
+        ),
+        migrations.AddField(
+            model_name='hivresult',
+            name='visit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hiv_status.Visit'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='visit',
+            unique_together=set([('visit_code', 'encounter'), ('subject', 'visit_datetime')]),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 18:49
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hiv_status', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='hivresult',
+            index_together=set([('visit', 'result_value', 'result_datetime')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='hivstatusreview',
+            index_together=set([('visit', 'documented_result', 'documented_result_date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='visit',
+            index_together=set([('subject', 'visit_code', 'encounter')]),
+        ),
+    ]
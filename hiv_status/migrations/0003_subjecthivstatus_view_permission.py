@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 19:48
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hiv_status', '0002_status_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='subjecthivstatus',
+            options={'permissions': (('view_subjecthivstatus', 'Can view HIV status'),)},
+        ),
+    ]
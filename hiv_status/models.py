@@ -1,12 +1,19 @@
+from datetime import datetime
+
 from django.db import models
 
 from edc_constants.choices import HIV_RESULT
 
+from .status import Status
+from .status_queryset import StatusQuerySet
+
 
 class Subject(models.Model):
 
     subject_identifier = models.CharField(max_length=25, unique=True)
 
+    objects = StatusQuerySet.as_manager()
+
     class Meta:
         app_label = 'hiv_status'
 
@@ -27,6 +34,7 @@ class Visit(models.Model):
     class Meta:
         app_label = 'hiv_status'
         unique_together = (('subject', 'visit_datetime'), ('visit_code', 'encounter'))
+        index_together = (('subject', 'visit_code', 'encounter'), )
         ordering = ('-visit_datetime', 'visit_code', 'encounter')
         get_latest_by = 'visit_datetime'
 
@@ -62,6 +70,8 @@ class HivResult(models.Model):
     class Meta:
         app_label = 'hiv_status'
         get_latest_by = 'result_datetime'
+        # Status lookups filter on visit and result_value then order by or compare result_datetime
+        index_together = (('visit', 'result_value', 'result_datetime'), )
 
 
 class HivStatusReview(models.Model):
@@ -83,3 +93,114 @@ class HivStatusReview(models.Model):
     class Meta:
         app_label = 'hiv_status'
         get_latest_by = 'report_datetime'
+        index_together = (('visit', 'documented_result', 'documented_result_date'), )
+
+
+class SubjectHivStatusManager(models.Manager):
+
+    def update_subject(self, subject):
+        """Recomputes and saves the status of one subject."""
+        status = self.model.status_class(subject, **self.model.sources)
+        return self.update_or_create(subject=subject, defaults=self.model.values(status))[0]
+
+    def rebuild(self, subjects=None, chunk_size=None, processes=None, progress=None):
+        """Deletes and recreates the status of subjects, or of all subjects, using
+        StatusBatch or, if processes is given, a StatusPool of that many processes.
+        `progress`, if given, is called with (subjects done, total) after each chunk.
+        Returns the number of statuses created."""
+        subjects = Subject.objects.all() if subjects is None else subjects
+        if processes:
+            from .status_pool import StatusPool
+            pool = StatusPool(
+                processes=processes, chunk_size=chunk_size, status_class=self.model.status_class,
+                values=self.model.values, progress=progress, **self.model.sources)
+            rows = (self.model(subject_id=pk, **values)
+                    for pk, values in sorted(pool.evaluate(subjects).items()))
+            self.filter(subject__in=subjects).delete()
+        else:
+            self.filter(subject__in=subjects).delete()
+            statuses = self.model.status_class.bulk(
+                subjects.order_by('pk').iterator(), chunk_size=chunk_size, **self.model.sources)
+            if progress:
+                statuses = self.reporting(statuses, subjects.count(), statuses.chunk_size, progress)
+            rows = (self.model(subject=status.subject, **self.model.values(status)) for status in statuses)
+        created = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= 500:
+                self.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        self.bulk_create(batch)
+        return created + len(batch)
+
+    def reporting(self, statuses, total, chunk_size, progress):
+        """Yields statuses, calling progress(done, total) after each chunk of chunk_size."""
+        done = 0
+        for status in statuses:
+            yield status
+            done += 1
+            if done % chunk_size == 0 or done == total:
+                progress(done, total)
+
+
+class SubjectHivStatus(models.Model):
+
+    """A denormalized Status per subject kept current by the signals in signals.py.
+
+    The status is as of the day it was last computed; use the management
+    command `rebuild_hiv_status` to recompute all subjects, e.g. nightly."""
+
+    status_class = Status
+
+    sources = {'tested': HivResult, 'documented': HivStatusReview}
+
+    subject = models.OneToOneField(Subject)
+
+    result = models.CharField(max_length=50, null=True)
+
+    result_datetime = models.DateTimeField(null=True)
+
+    source = models.CharField(
+        max_length=25,
+        null=True,
+        help_text="Name of the Status attribute the result came from, e.g. tested, documented")
+
+    previous = models.CharField(max_length=50, null=True)
+
+    previous_datetime = models.DateTimeField(null=True)
+
+    subject_aware = models.BooleanField(default=False)
+
+    newly_positive = models.BooleanField(default=False)
+
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = SubjectHivStatusManager()
+
+    def __str__(self):
+        return self.result or ''
+
+    @classmethod
+    def values(cls, status):
+        """Returns a dictionary of field values for a Status instance."""
+        return dict(
+            result=str(status.result) or None,
+            result_datetime=cls.to_datetime(status, status.result.result_datetime),
+            source=status.result.name,
+            previous=str(status.previous) or None,
+            previous_datetime=cls.to_datetime(status, status.previous.result_datetime),
+            subject_aware=status.subject_aware,
+            newly_positive=status.newly_positive)
+
+    @classmethod
+    def to_datetime(cls, status, value):
+        if value and not isinstance(value, datetime):
+            return status.zero_time(value)
+        return value
+
+    class Meta:
+        app_label = 'hiv_status'
+        # Django 1.9 has no view permission; the status views require this one
+        permissions = (('view_subjecthivstatus', 'Can view HIV status'), )
@@ -0,0 +1,236 @@
+from bisect import bisect_right
+from datetime import date, datetime
+from functools import reduce
+from threading import RLock
+from time import monotonic
+
+from django.conf import settings
+from django.db import connections, router
+from edc_constants.constants import POS, NEG
+
+from .models import SubjectHivStatus
+from .status import Status, ResultValues, tz
+
+
+class ResultIndex:
+
+    """An in-process index of the result rows of the source models of a Status class.
+
+    For each source name and subject the rows are kept per result value in lists
+    sorted by the result datetime, so the latest result as of a datetime and the
+    earliest POS or NEG on or before the reference date, the lookups of
+    Status.latest_instance and Status.previous_instance, are binary searches.
+    Rows without a result datetime are kept apart and are the latest, or only
+    latest if there is no dated row, as the database orders NULLs in `.latest()`;
+    the previous result and lookups as of a datetime skip them.
+
+    A row is kept as a (pk, visit pk) tuple, its result value and datetime being
+    those of its list and sort key; lookups return ResultValues as with
+    Status.fetch_values, i.e. the visit is the visit's pk. Names whose
+    get_latest_by is not the result datetime, and lookups with visit options,
+    are not indexed.
+
+    All rows are loaded with one query per model on first use. `update(instance)`
+    and `remove(instance)` keep the index current; signals.py calls them when the
+    transaction saving or deleting a source model instance commits, so rows of a
+    transaction rolled back never enter the index.
+
+    The index only sees the writes of its own process that send signals. Rows
+    saved by other processes, or without signals (loaddata, bulk_create,
+    QuerySet.update), are missing until the index is reloaded: with `max_age`, in
+    seconds, the rows are loaded again on the first lookup after max_age, else
+    only by `load()`. Use IndexedStatus to look up results in the index:
+
+        >>> status = IndexedStatus(subject, tested=HivResult, documented=HivStatusReview)  # no queries
+    """
+
+    def __init__(self, status_class=None, sources=None, max_age=None):
+        self.status_class = status_class or Status
+        self.sources = {name: model for name, model in (sources or {}).items()
+                        if self.indexable(name) and name != 'previous'}
+        self.max_age = max_age
+        self.lock = RLock()
+        self.loaded = False
+        self.loaded_at = None
+        self.entries = {}
+        self.locations = {}
+        self.nulls_largest = {}
+        self.date_names = {name for name, model in self.sources.items() if model._meta.get_field(
+            self.status_class.plans[name].result_datetime_attr).get_internal_type() == 'DateField'}
+
+    def indexable(self, name):
+        plan = self.status_class.plans[name]
+        return plan.get_latest_by == plan.result_datetime_attr
+
+    def load(self):
+        """Loads all rows of the source models, replacing the rows already loaded."""
+        with self.lock:
+            self.entries = {name: {} for name in self.sources}
+            self.locations = {name: {} for name in self.sources}
+            self.nulls_largest = {
+                name: connections[router.db_for_read(model)].features.nulls_order_largest
+                for name, model in self.sources.items()}
+            for name, model in self.sources.items():
+                plan = self.status_class.plans[name]
+                for subject_id, pk, result_value, result_datetime, visit in model.objects.values_list(
+                        plan.subject_lookup, 'pk', plan.result_value_attr, plan.result_datetime_attr,
+                        plan.visit_attr).iterator():
+                    self.insert(name, subject_id, pk, result_value, result_datetime, visit)
+            self.loaded = True
+            self.loaded_at = monotonic()
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.locations = {}
+            self.loaded = False
+
+    def ensure_loaded(self):
+        if not self.loaded or self.expired():
+            self.load()
+
+    def expired(self):
+        return self.max_age is not None and monotonic() - self.loaded_at > self.max_age
+
+    def names(self, model):
+        return [name for name, source in self.sources.items() if source is model]
+
+    def update(self, instance):
+        """Adds or replaces the row of a saved instance if the index is loaded."""
+        with self.lock:
+            if not self.loaded:
+                return
+            for name in self.names(instance.__class__):
+                plan = self.status_class.plans[name]
+                self.delete(name, instance.pk)
+                self.insert(
+                    name, self.subject_id(instance, plan.subject_lookup), instance.pk,
+                    getattr(instance, plan.result_value_attr), self.field_value(instance, plan.result_datetime_attr),
+                    getattr(instance, '{}_id'.format(plan.visit_attr)))
+
+    def remove(self, instance, pk=None):
+        """Removes the row of a deleted instance, or of pk, the instance's pk before the delete."""
+        with self.lock:
+            for name in self.names(instance.__class__):
+                if name in self.locations:
+                    self.delete(name, instance.pk if pk is None else pk)
+
+    def insert(self, name, subject_id, pk, result_value, result_datetime, visit):
+        if not result_value:
+            return
+        keys, rows, undated = self.entries[name].setdefault(subject_id, {}).setdefault(result_value, ([], [], []))
+        if result_datetime is None:
+            undated.append((pk, visit))
+        else:
+            key = self.as_datetime(result_datetime)
+            n = bisect_right(keys, key)
+            keys.insert(n, key)
+            rows.insert(n, (pk, visit))
+        self.locations[name][pk] = (subject_id, result_value)
+
+    def delete(self, name, pk):
+        try:
+            subject_id, result_value = self.locations[name].pop(pk)
+        except KeyError:
+            return
+        keys, rows, undated = self.entries[name][subject_id][result_value]
+        for n, row in enumerate(undated):
+            if row[0] == pk:
+                del undated[n]
+                return
+        n = [row[0] for row in rows].index(pk)
+        del keys[n]
+        del rows[n]
+
+    def latest(self, name, subject_id, result_list, before=None):
+        """Returns the latest row of a value in result_list, dated on or before `before`
+        if given, or None."""
+        self.ensure_loaded()
+        latest = None
+        with self.lock:
+            values = self.entries[name].get(subject_id, {})
+            for result_value in result_list:
+                keys, rows, undated = values.get(result_value, ([], [], []))
+                if undated and before is None and (self.nulls_largest[name] or not keys):
+                    # (2,) sorts after and (0,) before the (1, key) of dated rows
+                    candidate = (2 if self.nulls_largest[name] else 0, ), result_value, None, undated[-1]
+                else:
+                    n = len(keys) if before is None else bisect_right(keys, before)
+                    if not n:
+                        continue
+                    candidate = (1, keys[n - 1]), result_value, keys[n - 1], rows[n - 1]
+                if latest is None or candidate[0] >= latest[0]:
+                    latest = candidate
+        return self.row(name, *latest[1:]) if latest else None
+
+    def earliest(self, name, subject_id, result_value, before):
+        """Returns the earliest row of result_value dated on or before `before` or None."""
+        self.ensure_loaded()
+        with self.lock:
+            keys, rows, _ = self.entries[name].get(subject_id, {}).get(result_value, ([], [], []))
+            return self.row(name, result_value, keys[0], rows[0]) if keys and keys[0] <= before else None
+
+    def row(self, name, result_value, key, row):
+        """Returns the ResultValues of a (pk, visit) row of result_value with sort key `key`."""
+        plan = self.status_class.plans[name]
+        pk, visit = row
+        return ResultValues(**{
+            'pk': pk, plan.result_value_attr: result_value,
+            plan.result_datetime_attr: key.date() if key is not None and name in self.date_names else key,
+            plan.visit_attr: visit})
+
+    def previous(self, subject_id, reference_datetime):
+        """Returns the earliest POS, or if none, the earliest NEG tested row on or before
+        the reference datetime, see Status.previous_instance."""
+        earliest_pos = self.earliest('tested', subject_id, POS, reference_datetime)
+        return earliest_pos or self.earliest('tested', subject_id, NEG, reference_datetime)
+
+    def instances(self, status, sources):
+        """Returns a dictionary of name: row or None for each source of status in the index,
+        for Status(instances=...)."""
+        instances = {}
+        for name, model in sources.items():
+            if self.sources.get(name) is model and model is not None and not status.visit_options(name):
+                instances[name] = self.latest(name, status.subject.id, status.result_list)
+                if name == 'tested':
+                    instances['previous'] = self.previous(status.subject.id, status.reference_datetime)
+        return instances
+
+    def subject_id(self, instance, subject_lookup):
+        """Returns the subject id of an instance following subject_lookup, e.g. visit__subject__id
+        is instance.visit.subject_id."""
+        attrs = subject_lookup.split('__')
+        if len(attrs) > 1 and attrs[-1] in ['id', 'pk']:
+            attrs = attrs[:-2] + ['{}_id'.format(attrs[-2])]
+        return reduce(getattr, attrs, instance)
+
+    def field_value(self, instance, attr):
+        """Returns the value of attr as loaded from the database, e.g. a date for a DateField."""
+        return instance._meta.get_field(attr).to_python(getattr(instance, attr))
+
+    def as_datetime(self, value):
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return tz.localize(datetime(value.year, value.month, value.day))
+        return value
+
+
+class IndexedStatusMixin:
+
+    """A mixin for Status, or a subclass of Status, that looks up the sources in
+    `result_index` instead of the database where it can."""
+
+    result_index = None
+
+    def resolve(self, tested, documented, indirect, verbal):
+        sources = {'tested': tested, 'documented': documented, 'indirect': indirect, 'verbal': verbal}
+        self.instances = dict(self.result_index.instances(self, sources), **self.instances)
+        super(IndexedStatusMixin, self).resolve(tested, documented, indirect, verbal)
+
+
+result_index = ResultIndex(
+    sources=SubjectHivStatus.sources, max_age=getattr(settings, 'HIV_STATUS_RESULT_INDEX_MAX_AGE', None))
+
+
+class IndexedStatus(IndexedStatusMixin, Status):
+
+    result_index = result_index
@@ -1,4 +1,5 @@
 from datetime import date
+from sys import intern
 
 
 class ResultWrapper:
@@ -13,20 +14,40 @@ class ResultWrapper:
     True
     >>> a is b
     False
+
+    Instances are immutable and have no __dict__; string result values are
+    interned and result_date is derived from result_datetime when accessed.
     """
+
+    __slots__ = ('result_value', 'result_datetime', 'visit_code', 'encounter', 'visit', 'name', 'instance')
+
     def __init__(self, result_value, result_datetime=None, visit_code=None, encounter=None,
                  visit=None, name=None, instance=None):
-        self.result_value = result_value or ''
-        self.result_datetime = result_datetime
-        if result_datetime:
-            self.result_date = date(result_datetime.year, result_datetime.month, result_datetime.day)
-        else:
-            self.result_date = None
-        self.visit_code = visit_code
-        self.encounter = encounter
-        self.visit = visit
-        self.name = name
-        self.instance = instance
+        if isinstance(result_value, str):
+            result_value = intern(result_value)
+        object.__setattr__(self, 'result_value', result_value or '')
+        object.__setattr__(self, 'result_datetime', result_datetime)
+        object.__setattr__(self, 'visit_code', visit_code)
+        object.__setattr__(self, 'encounter', encounter)
+        object.__setattr__(self, 'visit', visit)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'instance', instance)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable.'.format(self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is immutable.'.format(self.__class__.__name__))
+
+    def __reduce__(self):
+        return (self.__class__, (self.result_value, self.result_datetime, self.visit_code, self.encounter,
+                                 self.visit, self.name, self.instance))
+
+    @property
+    def result_date(self):
+        if self.result_datetime:
+            return date(self.result_datetime.year, self.result_datetime.month, self.result_datetime.day)
+        return None
 
     def __repr__(self):
         return '{}(\'{}\')'.format(self.__class__.__name__, str(self))
@@ -50,6 +50,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'hiv_status.status_memo.StatusMemoMiddleware',
 )
 
 ROOT_URLCONF = 'hiv_status.urls'
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import HivResult, HivStatusReview, Subject, SubjectHivStatus, Visit
+from .result_index import result_index
+from .status_cache import status_cache
+from .status_memo import StatusMemo
+
+
+@receiver(post_save, weak=False, sender=HivResult, dispatch_uid='hiv_result_on_post_save')
+@receiver(post_delete, weak=False, sender=HivResult, dispatch_uid='hiv_result_on_post_delete')
+@receiver(post_save, weak=False, sender=HivStatusReview, dispatch_uid='hiv_status_review_on_post_save')
+@receiver(post_delete, weak=False, sender=HivStatusReview, dispatch_uid='hiv_status_review_on_post_delete')
+def update_subject_hiv_status_on_result(sender, instance, raw=False, using=None, **kwargs):
+    """Drops the cached and memoized Status instances of the subject of a result, then
+    recomputes its SubjectHivStatus."""
+    invalidate_status_cache(instance.visit.subject_id, using)
+    if not raw:
+        SubjectHivStatus.objects.update_subject(instance.visit.subject)
+
+
+@receiver(post_save, weak=False, sender=Visit, dispatch_uid='visit_on_post_save')
+@receiver(post_delete, weak=False, sender=Visit, dispatch_uid='visit_on_post_delete')
+def update_subject_hiv_status_on_visit(sender, instance, raw=False, using=None, **kwargs):
+    """Drops the cached and memoized Status instances of the subject of a visit, then
+    recomputes its SubjectHivStatus."""
+    invalidate_status_cache(instance.subject_id, using)
+    if not raw:
+        SubjectHivStatus.objects.update_subject(instance.subject)
+
+
+@receiver(post_delete, weak=False, sender=Subject, dispatch_uid='subject_on_post_delete')
+def delete_subject_hiv_status_on_subject(sender, instance, **kwargs):
+    """Removes a SubjectHivStatus recreated by the signals above while the subject's
+    visits and results were deleted."""
+    SubjectHivStatus.objects.filter(subject_id=instance.pk).delete()
+
+
+def invalidate_status_cache(subject_id, using=None):
+    """Drops the cached and memoized Status instances of a subject now, before its
+    SubjectHivStatus is recomputed and for lookups later in this transaction, and in a
+    transaction again once it commits, dropping any status of the subject another
+    request cached from the data before the commit."""
+    status_cache.invalidate(subject_id)
+    StatusMemo.invalidate_active(subject_id)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: status_cache.invalidate(subject_id), using=using)
+
+
+@receiver(post_save, weak=False, sender=HivResult, dispatch_uid='hiv_result_result_index_on_post_save')
+@receiver(post_save, weak=False, sender=HivStatusReview, dispatch_uid='hiv_status_review_result_index_on_post_save')
+def update_result_index_on_save(sender, instance, raw=False, using=None, **kwargs):
+    """Adds or replaces the row of a result in the ResultIndex once the transaction commits."""
+    if not raw:
+        transaction.on_commit(lambda: result_index.update(instance), using=using)
+
+
+@receiver(post_delete, weak=False, sender=HivResult, dispatch_uid='hiv_result_result_index_on_post_delete')
+@receiver(post_delete, weak=False, sender=HivStatusReview,
+          dispatch_uid='hiv_status_review_result_index_on_post_delete')
+def remove_from_result_index_on_delete(sender, instance, using=None, **kwargs):
+    """Removes the row of a result from the ResultIndex once the transaction commits."""
+    pk = instance.pk
+    transaction.on_commit(lambda: result_index.remove(instance, pk=pk), using=using)
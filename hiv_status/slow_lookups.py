@@ -0,0 +1,97 @@
+import logging
+import re
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+SlowQuery = namedtuple('SlowQuery', 'stage, alias, sql, params, seconds')
+
+
+class SlowLookupLog:
+
+    """Logs the queries of Status lookups that take at least `threshold` seconds, see
+    InstrumentedStatusMixin, with their SQL, parameters and query plan.
+
+    The plan is that of EXPLAIN QUERY PLAN on SQLite and EXPLAIN on other databases.
+    The default `slow_lookup_log` is enabled by settings.HIV_STATUS_SLOW_LOOKUP_MS
+    and logs warnings to the logger 'hiv_status.slow_lookups'."""
+
+    def __init__(self, threshold=None, logger=None):
+        self.threshold = threshold
+        self.logger = logger or logging.getLogger('hiv_status.slow_lookups')
+
+    def log(self, status, slow_queries):
+        for query in slow_queries:
+            self.logger.warning(self.message(status, query))
+
+    def message(self, status, query):
+        return '\n'.join([
+            'Slow lookup {} of {} for subject {} took {:.1f} ms.'.format(
+                query.stage, status.__class__.__name__, getattr(status.subject, 'id', None), query.seconds * 1000),
+            'SQL: {}'.format(query.sql),
+            'Params: {!r}'.format(query.params),
+            'Plan:'] + ['    {}'.format(line) for line in self.explain(query.alias, query.sql, query.params)])
+
+    def explain(self, alias, sql, params):
+        """Returns the lines of the query plan of sql on database alias."""
+        connection = connections[alias]
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                return [' | '.join(str(column) for column in row) for row in cursor.fetchall()]
+        except DatabaseError as e:
+            return ['EXPLAIN failed: {}'.format(e)]
+
+
+class IndexAdvisor:
+
+    """Suggests an index for a Status lookup from its lookup plan and flags the full
+    table scans and sorts in its query plan.
+
+    The suggested index of a name is the local field of the subject lookup (e.g. the
+    foreign key to the visit), the result field and the field ordered by, in the
+    order the lookup filters and sorts on them, cf. the index_together of HivResult."""
+
+    # per database vendor, patterns of query plan lines that scan a whole table or sort
+    scan_patterns = {
+        'sqlite': [r'^(\S+ \| )*SCAN (?!.*\bUSING\b)', r'USE TEMP B-TREE'],
+        'postgresql': [r'Seq Scan', r'\bSort\b'],
+        'mysql': [r'\| ALL \|', r'Using filesort'],
+    }
+
+    def __init__(self, status_class):
+        self.status_class = status_class
+
+    def warnings(self, vendor, plan):
+        """Returns the lines of plan, as returned by SlowLookupLog.explain, that match
+        the scan_patterns of the vendor."""
+        patterns = [re.compile(pattern) for pattern in self.scan_patterns.get(vendor, [])]
+        return [line for line in plan if any(pattern.search(line) for pattern in patterns)]
+
+    def index(self, name, model):
+        """Returns a tuple of the field names of the suggested index of model for 'name'."""
+        plan = self.status_class.plans[name]
+        fields = []
+        for lookup in [plan.subject_lookup, plan.result_lookup, plan.get_latest_by]:
+            field_name = lookup.split('__')[0]
+            if field_name not in fields and field_name in self.local_fields(model):
+                fields.append(field_name)
+        return tuple(fields)
+
+    def existing(self, model, index):
+        """Returns the index_together or unique_together of model starting with index, or None."""
+        for fields in list(model._meta.index_together) + list(model._meta.unique_together):
+            if tuple(fields[:len(index)]) == index:
+                return tuple(fields)
+        return None
+
+    def local_fields(self, model):
+        return [field.name for field in model._meta.local_concrete_fields]
+
+
+slow_lookup_ms = getattr(settings, 'HIV_STATUS_SLOW_LOOKUP_MS', None)
+
+slow_lookup_log = SlowLookupLog(threshold=None if slow_lookup_ms is None else slow_lookup_ms / 1000)
@@ -0,0 +1,182 @@
+from threading import RLock
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.base import ModelBase
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from .result_wrapper import ResultWrapper
+
+
+class SourceAdapter:
+
+    """Looks up the latest and previous result of one kind of source for a Status.
+
+    `accepts(source_type)` decides if the adapter handles sources of a type.
+    `latest` and `previous` return a ResultWrapper, ResultWrapper(None) if there
+    is no result."""
+
+    # True if StatusBatch can select instances of this source for many subjects at once
+    is_model = False
+
+    def accepts(self, source_type):
+        return False
+
+    def latest(self, status, source, name):
+        return ResultWrapper(None)
+
+    def previous(self, status, source, name):
+        return ResultWrapper(None)
+
+
+class EmptyAdapter(SourceAdapter):
+
+    """None, no result."""
+
+    def accepts(self, source_type):
+        return source_type is type(None)
+
+
+class ValueAdapter(SourceAdapter):
+
+    """A result value such as 'POS'. The result datetime is now.
+
+    Accepts any type, the registry tries it last."""
+
+    def accepts(self, source_type):
+        return True
+
+    def latest(self, status, source, name):
+        if not source:
+            return ResultWrapper(None)
+        return ResultWrapper(source, result_datetime=timezone.now(), name=name)
+
+
+class ResultWrapperAdapter(SourceAdapter):
+
+    """A ResultWrapper, e.g. the result of another Status, renamed to 'name'."""
+
+    def accepts(self, source_type):
+        return issubclass(source_type, ResultWrapper)
+
+    def latest(self, status, source, name):
+        if not source.result_value:
+            return ResultWrapper(None)
+        return ResultWrapper(
+            source.result_value, result_datetime=source.result_datetime or timezone.now(),
+            visit_code=source.visit_code, encounter=source.encounter, visit=source.visit,
+            name=name, instance=source.instance)
+
+
+class ModelAdapter(SourceAdapter):
+
+    """A model class, queried with the lookup plan of 'name'."""
+
+    is_model = True
+
+    def accepts(self, source_type):
+        return issubclass(source_type, ModelBase)
+
+    def latest(self, status, source, name):
+        try:
+            instance = status.latest_instance(source, name)
+        except ObjectDoesNotExist:
+            return ResultWrapper(None)
+        return status.wrap_instance(instance, name)
+
+    def previous(self, status, source, name):
+        try:
+            instance = status.previous_instance(source, name)
+        except ObjectDoesNotExist:
+            return ResultWrapper(None)
+        return status.wrap_previous(instance, name)
+
+
+class QuerySetAdapter(ModelAdapter):
+
+    """A queryset of a model, e.g. HivResult.objects.filter(...), filtered further
+    with the lookup plan of 'name'."""
+
+    is_model = False
+
+    def accepts(self, source_type):
+        return issubclass(source_type, QuerySet)
+
+    def latest(self, status, source, name):
+        try:
+            instance = status.latest_instance(source.model, name, queryset=source)
+        except ObjectDoesNotExist:
+            return ResultWrapper(None)
+        return status.wrap_instance(instance, name)
+
+    def previous(self, status, source, name):
+        try:
+            instance = status.previous_instance(source.model, name, queryset=source)
+        except ObjectDoesNotExist:
+            return ResultWrapper(None)
+        return status.wrap_previous(instance, name)
+
+
+class CallableAdapter(SourceAdapter):
+
+    """A callable of (status, name) that returns a source, which is then
+    looked up with its own adapter."""
+
+    def accepts(self, source_type):
+        return any('__call__' in vars(klass) for klass in source_type.__mro__[:-1])
+
+    def latest(self, status, source, name):
+        result = source(status, name)
+        return status.source_adapters.adapter(result).latest(status, result, name)
+
+    def previous(self, status, source, name):
+        result = source(status, name)
+        return status.source_adapters.adapter(result).previous(status, result, name)
+
+
+class SourceAdapters:
+
+    """A registry of SourceAdapters tried in order, the first that accepts the
+    type of a source is used.
+
+    The adapter of each type is cached so a source is classified once per type,
+    not once per subject.
+
+        >>> source_adapters.adapter(HivResult)
+        <hiv_status.source_adapters.ModelAdapter object at ...>
+        >>> source_adapters.register(MyAdapter())  # tried before the others
+    """
+
+    def __init__(self, adapters=None):
+        self.adapters = list(adapters or [])
+        self.lock = RLock()
+        self.cache = {}
+
+    def register(self, adapter):
+        """Registers an adapter ahead of those already registered."""
+        with self.lock:
+            self.adapters.insert(0, adapter)
+            self.cache.clear()
+
+    def adapter(self, source):
+        source_type = type(source)
+        try:
+            return self.cache[source_type]
+        except KeyError:
+            pass
+        with self.lock:
+            for adapter in self.adapters:
+                if adapter.accepts(source_type):
+                    self.cache[source_type] = adapter
+                    return adapter
+        raise TypeError('No source adapter accepts {!r}.'.format(source))
+
+
+source_adapters = SourceAdapters([
+    EmptyAdapter(),
+    ResultWrapperAdapter(),
+    ModelAdapter(),
+    QuerySetAdapter(),
+    CallableAdapter(),
+    ValueAdapter(),
+])
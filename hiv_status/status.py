@@ -1,20 +1,77 @@
 import pytz
 from collections import namedtuple
 from datetime import date, datetime
+from types import SimpleNamespace
 from django.conf import settings
-from django.utils import timezone
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import six, timezone
 from edc_constants.constants import POS, NEG
 
 from .result_wrapper import ResultWrapper
 from .simple_status import SimpleStatus
-from django.core.exceptions import ObjectDoesNotExist
+from .source_adapters import source_adapters
 
 tz = pytz.timezone(settings.TIME_ZONE)
 
 SubjectWrapper = namedtuple('SubjectWrapper', 'id, subject_identifier')
 
 
-class Status:
+class ResultValues(SimpleNamespace):
+    """The result columns of a row fetched with QuerySet.values(), see Status.fetch_values."""
+    pass
+
+
+LookupPlan = namedtuple(
+    'LookupPlan',
+    'subject_lookup, result_lookup, visit_code_lookup, encounter_lookup, '
+    'result_value_attr, result_datetime_attr, visit_attr, get_latest_by')
+
+
+class StatusMeta(type):
+
+    """Compiles the `lookup_options`, `field_attr` and `get_latest_by` of each
+    Status class into `plans`, a dictionary of name: LookupPlan, when the class
+    is created.
+
+    A name with an empty list uses 'default' and 'previous' uses 'tested'.
+    Raises ImproperlyConfigured if a list is incomplete or has an empty item.
+
+    Within an active StatusMemo, e.g. during a request with StatusMemoMiddleware,
+    constructing an instance returns the memoized instance for the same arguments,
+    see status_memo.py."""
+
+    names = ['tested', 'previous', 'documented', 'indirect', 'verbal']
+
+    def __init__(cls, name, bases, attrs):
+        super(StatusMeta, cls).__init__(name, bases, attrs)
+        if hasattr(cls, 'lookup_options'):
+            cls.plans = {name: cls.compile_plan(name) for name in ['default'] + type(cls).names}
+
+    def compile_plan(cls, name):
+        config_name = 'tested' if name == 'previous' else name
+        lookups = cls.lookup_options.get(config_name) or cls.lookup_options['default']
+        attrs = cls.field_attr.get(config_name) or cls.field_attr['default']
+        if len(lookups) != 4 or not all(lookups):
+            raise ImproperlyConfigured(
+                '{}.lookup_options[{!r}] expects four lookups: subject, result, visit_code, encounter. '
+                'Got {}.'.format(cls.__name__, config_name, lookups))
+        if len(attrs) != 3 or not all(attrs):
+            raise ImproperlyConfigured(
+                '{}.field_attr[{!r}] expects three attributes: result_value, result_datetime, visit. '
+                'Got {}.'.format(cls.__name__, config_name, attrs))
+        return LookupPlan(*(list(lookups) + list(attrs) + [
+            cls.get_latest_by.get(name, cls.get_latest_by.get('default'))]))
+
+    def __call__(cls, subject, *args, **kwargs):
+        from .status_memo import StatusMemo
+        memo = StatusMemo.active()
+        if memo is None or not memo.accepts(cls, subject, args, kwargs):
+            return super(StatusMeta, cls).__call__(subject, *args, **kwargs)
+        return memo.get_status(subject, status_class=cls, **kwargs)
+
+
+class Status(six.with_metaclass(StatusMeta, object)):
 
     """Status is similar to SimpleStatus except the attributes can
     accept a model class.
@@ -49,6 +106,8 @@ class Status:
     RESULT_DATETIME_ATTR = 1
     VISIT_ATTR = 2
 
+    PREVIOUS_RANK = 'hiv_status_previous_rank'
+
     lookup_options = {
         'default': ['visit__subject__id', 'result_value__in', 'visit__visit_code', 'visit__encounter'],
         'tested': [],
@@ -65,6 +124,23 @@ class Status:
         'verbal': []
     }
 
+    # classifies each source (model, queryset, ResultWrapper, callable or value), see source_adapters.py
+    source_adapters = source_adapters
+
+    # fetch the visit of each result in the same query if keep_instances
+    select_visit = True
+
+    # fetch results with QuerySet.values() instead of model instances; ResultWrapper.instance
+    # is then None and ResultWrapper.visit is the visit's pk.
+    fetch_values = False
+
+    # keep the model instance and visit of each result; by default ResultWrapper.instance is
+    # None, ResultWrapper.visit is the visit's pk and prefetched instances are released.
+    keep_instances = False
+
+    # share instances constructed with the same arguments within an active StatusMemo
+    memoize = True
+
     get_latest_by = {
         'default': 'result_datetime',
         'tested': 'result_datetime',
@@ -75,8 +151,9 @@ class Status:
 
     def __init__(self, subject, tested=None, documented=None, indirect=None, verbal=None,
                  visit_code=None, encounter=None, visit=None, visit_model=None, result_list=None,
-                 reference_date=None, include_verbal=None):
+                 reference_date=None, include_verbal=None, instances=None):
         self.subject = subject
+        self.instances = instances or {}
         self.visit_code = visit_code
         self.encounter = encounter
         self.visit = visit
@@ -85,32 +162,47 @@ class Status:
             self.result_list = [POS]
         else:
             self.result_list = [POS] if POS in result_list else result_list
+        self.include_verbal = include_verbal
+        self.resolve(tested, documented, indirect, verbal)
+
+    def resolve(self, tested, documented, indirect, verbal):
+        """Looks up each source and sets the result."""
         self.tested = self.lookup_latest(tested, name='tested')
         self.previous = self.lookup_previous(tested, name='previous')
-        self.documented = self.lookup_latest(documented, name='documented')
-        if self.documented.result_value and self.previous.result_value:
-            if self.previous.result_date > self.documented.result_date:
-                self.documented = SimpleStatus(
-                    tested=self.previous, documented=self.documented
-                ).result
-            else:
-                self.documented = SimpleStatus(
-                    tested=self.documented, documented=self.previous
-                ).result
-        elif self.previous.result_value:
-            self.documented = self.previous
+        self.documented = self.merge_previous(self.lookup_latest(documented, name='documented'))
         self.indirect = self.lookup_latest(indirect, name='indirect')
         self.verbal = self.lookup_latest(verbal, name='verbal')
+        self.decide()
+        if not self.keep_instances:
+            self.instances = {}
+
+    def decide(self):
+        """Sets the result from the looked up sources."""
         self.result = SimpleStatus(
             tested=self.tested,
             documented=self.documented,
             indirect=self.indirect,
             verbal=self.verbal,
-            include_verbal=include_verbal
+            include_verbal=self.include_verbal
         ).result
         if self.result is None:
             self.result = ResultWrapper(None)
 
+    def merge_previous(self, documented):
+        """Returns the more recent of the documented and previous results."""
+        if documented.result_value and self.previous.result_value:
+            if self.previous.result_date > documented.result_date:
+                documented = SimpleStatus(
+                    tested=self.previous, documented=documented
+                ).result
+            else:
+                documented = SimpleStatus(
+                    tested=documented, documented=self.previous
+                ).result
+        elif self.previous.result_value:
+            documented = self.previous
+        return documented
+
     def __repr__(self):
         return '{}(\'{}\')'.format(self.__class__.__name__, str(self))
 
@@ -136,71 +228,130 @@ class Status:
         return SubjectWrapper(subject.id, subject.subject_identifier)
 
     def lookup_latest(self, result, name):
-        result_value = None
-        result_datetime = None
-        instance = None
-        visit = None
-        if result:
-            try:
-                try:
-                    options = self.options(name)
-                    options.update(self.visit_options(name))
-                    instance = result.objects.filter(**options).latest(
-                        self.get_latest_by.get(name, self.get_latest_by.get('default')))
-                    result_value_attr, result_datetime_attr, visit_attr = self.attrs(name)
-                    result_value = getattr(instance, result_value_attr)
-                    result_datetime = getattr(instance, result_datetime_attr)
-                    visit = getattr(instance, visit_attr)
-                except ObjectDoesNotExist:
-                    result_value = None
-            except AttributeError as e:
-                if ('object has no attribute \'DoesNotExist\'' in str(e) or
-                        'object has no attribute \'objects\'' or
-                        'instance has no attribute \'objects\'' in str(e)):
-                    result_value = result
-                    result_datetime = timezone.now()
-                else:
-                    raise AttributeError(e)
-        if result_value:
-            return ResultWrapper(
-                result_value, result_datetime=result_datetime, visit=visit, name=name, instance=instance)
-        else:
-            return ResultWrapper(None)
+        """Returns a ResultWrapper of the latest result of source 'result' for 'name'.
+
+        The source is looked up by its adapter in `source_adapters`."""
+        return self.source_adapters.adapter(result).latest(self, result, name)
 
     def lookup_previous(self, result, name):
         """Lookup previous result relative to the reference date but return None if same as "tested"."""
-        result_value = None
-        result_datetime = None
-        instance = None
-        visit = None
-        if result:
-            try:
-                try:
-                    result_value_attr, result_datetime_attr, visit_attr = self.attrs(name)
-                    try:
-                        options = self.options(name, result_list=[POS])
-                        options.update({'{}__lte'.format(result_datetime_attr): self.reference_datetime})
-                        instance = result.objects.filter(**options).earliest()
-                    except ObjectDoesNotExist:
-                        options = self.options(name, result_list=[NEG])
-                        options.update({'{}__lte'.format(result_datetime_attr): self.reference_datetime})
-                        instance = result.objects.filter(**options).earliest(
-                            self.get_latest_by.get(name, self.get_latest_by.get('default')))
-                    if getattr(instance, result_datetime_attr).date() == self.tested.result_datetime.date():
-                        result_value = None
-                    else:
-                        result_value = getattr(instance, result_value_attr)
-                        result_datetime = getattr(instance, result_datetime_attr)
-                        visit = getattr(instance, visit_attr)
-                except ObjectDoesNotExist:
-                    result_value = None
-            except AttributeError:
-                result_value = None
-        if result_value:
-            return ResultWrapper(
-                result_value, result_datetime=result_datetime, visit=visit, name=name, instance=instance)
+        if not self.tested.result_datetime:
+            return ResultWrapper(None)
+        return self.source_adapters.adapter(result).previous(self, result, name)
+
+    def wrap_instance(self, instance, name):
+        """Returns a ResultWrapper of the result of instance for 'name'."""
+        result_value_attr, result_datetime_attr, visit_attr = self.attrs(name)
+        result_value = getattr(instance, result_value_attr)
+        if not result_value:
+            return ResultWrapper(None)
+        result_datetime = getattr(instance, result_datetime_attr)
+        if isinstance(instance, ResultValues):
+            visit, instance = getattr(instance, visit_attr), None
+        elif self.keep_instances:
+            visit = getattr(instance, visit_attr)
         else:
+            visit, instance = getattr(instance, '{}_id'.format(visit_attr)), None
+        return ResultWrapper(
+            result_value, result_datetime=result_datetime, visit=visit, name=name, instance=instance)
+
+    def wrap_previous(self, instance, name):
+        """Returns a ResultWrapper of the previous instance or ResultWrapper(None) if on
+        the date of the tested result."""
+        result_datetime = getattr(instance, self.attrs(name)[self.RESULT_DATETIME_ATTR])
+        if result_datetime.date() == self.tested.result_datetime.date():
             return ResultWrapper(None)
+        return self.wrap_instance(instance, name)
+
+    def latest_instance(self, model, name, queryset=None):
+        """Returns the latest instance of model, or of queryset if given, for 'name' or
+        raises ObjectDoesNotExist.
+
+        If an instance for 'name' was passed in 'instances', e.g. by StatusBatch,
+        the database is not queried."""
+        if name in self.instances:
+            return self.prefetched_instance(model, name)
+        options = self.options(name)
+        options.update(self.visit_options(name))
+        return self.as_instance(self.result_queryset(model, name, queryset).filter(**options).latest(
+            self.plans[name].get_latest_by))
+
+    def previous_instance(self, model, name, queryset=None):
+        """Returns the earliest POS, or if none, the earliest NEG instance of model, or of
+        queryset if given, on or before the reference date or raises ObjectDoesNotExist.
+
+        POS and NEG are selected in one query ordered by previous_ordering()."""
+        if name in self.instances:
+            return self.prefetched_instance(model, name)
+        instance = self.previous_queryset(self.result_queryset(model, name, queryset), name).order_by(
+            *self.previous_ordering(name)).first()
+        if instance is None:
+            raise model.DoesNotExist()
+        return self.as_instance(instance)
+
+    def previous_queryset(self, queryset, name, options=None):
+        """Returns the queryset filtered on the POS and NEG results of 'name' on or before the
+        reference date and annotated with PREVIOUS_RANK, 0 for POS and 1 for NEG.
+
+        If given, options replace the filter options of this subject."""
+        result_value_attr, result_datetime_attr, _ = self.attrs(name)
+        if options is None:
+            options = self.options(name, result_list=[POS, NEG])
+        options.update({'{}__lte'.format(result_datetime_attr): self.reference_datetime})
+        return queryset.filter(**options).annotate(**{self.PREVIOUS_RANK: Case(
+            When(**{result_value_attr: POS}, then=Value(0)), default=Value(1), output_field=IntegerField())})
+
+    def previous_ordering(self, name):
+        """Returns the order_by() fields for the previous result: POS ahead of NEG, then earliest first."""
+        return [self.PREVIOUS_RANK, self.attrs(name)[self.RESULT_DATETIME_ATTR]]
+
+    def result_queryset(self, model, name, queryset=None):
+        """Returns a queryset of model, or queryset if given, that loads only the result
+        value, result datetime and visit of 'name'."""
+        result_value_attr, result_datetime_attr, visit_attr = self.attrs(name)
+        if queryset is None:
+            queryset = model.objects.all()
+        if self.fetch_values:
+            return queryset.values(result_value_attr, result_datetime_attr, visit_attr)
+        queryset = queryset.only(result_value_attr, result_datetime_attr, visit_attr)
+        if self.select_visit and self.keep_instances:
+            queryset = queryset.select_related(visit_attr)
+        return queryset
+
+    def as_instance(self, row):
+        return ResultValues(**row) if isinstance(row, dict) else row
+
+    def prefetched_instance(self, model, name):
+        instance = self.instances[name]
+        if instance is None:
+            raise model.DoesNotExist()
+        return instance
+
+    @classmethod
+    def bulk(cls, subjects, batch_class=None, **kwargs):
+        """Returns a StatusBatch, or an instance of batch_class, of this class for
+        the given subjects.
+
+        See StatusBatch."""
+        if not batch_class:
+            from .status_batch import StatusBatch as batch_class
+        return batch_class(subjects, status_class=cls, **kwargs)
+
+    @classmethod
+    def timeline(cls, subjects, reference_dates, **kwargs):
+        """Returns a StatusTimeline of this class for the given subjects and reference dates.
+
+        See StatusTimeline."""
+        from .status_timeline import StatusTimeline
+        return StatusTimeline(subjects, reference_dates, status_class=cls, **kwargs)
+
+    @classmethod
+    def cached(cls, subject, cache=None, **kwargs):
+        """Returns a Status of this class from the StatusCache, `cache` or the default
+        `status_cache`, computing it on a miss. Sources must be passed as keywords."""
+        if not cache:
+            from .status_cache import status_cache as cache
+        return cache.get_status(subject, status_class=cls, **kwargs)
 
     @property
     def subject_aware(self):
@@ -210,91 +361,46 @@ class Status:
         is not confirmed (tested=NEG) as well if a documented POS or indirect POS
         is contradicted (tested=POS)."""
 
-        if self.indirect.result_value == POS and self.tested.result_value == POS:
-            return True
-        elif self.documented.result_value == POS and self.tested.result_value == POS:
-            return True
-        elif self.documented.result_value == NEG and self.tested.result_value == NEG:
-            return True
-        elif self.documented.result_value == NEG and self.tested.result_value == POS:
-            return False
-        elif self.documented.result_value == POS and self.tested.result_value == NEG:
-            return False
-        elif self.indirect.result_value == POS and self.tested.result_value == NEG:
-            return False
-        elif self.documented.result_value == POS:
-            return True
-        elif self.indirect.result_value == POS:
-            return True
-        else:
-            return False
+        if self.tested.result_value == NEG:
+            return self.documented.result_value == NEG
+        return self.documented.result_value == POS or self.indirect.result_value == POS
 
     @property
     def newly_positive(self):
         """Returns True if the subject is considered newly diagnosed positive."""
-        if self.tested.result_value == POS:
-            if not self.documented.result_value and not self.indirect.result_value:
-                return True
-            elif self.documented.result_value == NEG:
-                return True
-        return False
+        if self.tested.result_value != POS:
+            return False
+        elif self.documented.result_value == NEG:
+            return True
+        return not self.documented.result_value and not self.indirect.result_value
 
     def options(self, name, result_list=None):
         """Returns model filter lookups for 'name' or the default."""
-        result_list = result_list or self.result_list
-        try:
-            name = 'tested' if name == 'previous' else name
-            options = {
-                self.lookup_options[name][self.SUBJECT_LOOKUP]: self.subject.id,
-                self.lookup_options[name][self.RESULT_LOOKUP]: result_list,
-            }
-        except IndexError:
-            options = {
-                self.lookup_options['default'][self.SUBJECT_LOOKUP]: self.subject.id,
-                self.lookup_options['default'][self.RESULT_LOOKUP]: result_list,
-            }
-        return options
+        plan = self.plans[name]
+        return {
+            plan.subject_lookup: self.subject.id,
+            plan.result_lookup: result_list or self.result_list,
+        }
 
     def attrs(self, name):
         """Returns model attributes of 'name' or the default for attributes
         result_value, result_datetime, visit."""
-        try:
-            name = 'tested' if name == 'previous' else name
-            result_value = self.field_attr[name][self.RESULT_VALUE_ATTR]
-            result_datetime = self.field_attr[name][self.RESULT_DATETIME_ATTR]
-            visit = self.field_attr[name][self.VISIT_ATTR]
-        except IndexError:
-            result_value = self.field_attr['default'][self.RESULT_VALUE_ATTR]
-            result_datetime = self.field_attr['default'][self.RESULT_DATETIME_ATTR]
-            visit = self.field_attr['default'][self.VISIT_ATTR]
-        return result_value, result_datetime, visit
+        plan = self.plans[name]
+        return plan.result_value_attr, plan.result_datetime_attr, plan.visit_attr
 
     def visit_options(self, name):
         """Returns the filter lookup of name or the default for the visit based on the
         values available of visit, visit_code and encounter.
 
         Used to filter the model associated with 'name' on visit."""
-        visit_options = {}
-        if self.lookup_options[name]:
-            lookup = self.lookup_options[name]
-        else:
-            lookup = self.lookup_options['default']
+        plan = self.plans[name]
         if self.visit_code and self.encounter:
-            visit_options.update({
-                lookup[self.VISIT_CODE_LOOKUP]: self.visit_code,
-                lookup[self.ENCOUNTER_LOOKUP]: self.encounter})
+            return {plan.visit_code_lookup: self.visit_code, plan.encounter_lookup: self.encounter}
         elif self.visit_code:
-            visit_options.update({
-                lookup[self.VISIT_CODE_LOOKUP]: self.visit_code})
+            return {plan.visit_code_lookup: self.visit_code}
         elif self.visit:
-            try:
-                attrs = self.field_attr[name]
-            except KeyError:
-                attrs = self.field_attr['default']
-            visit_options.update({attrs[self.VISIT_ATTR]: self.visit})
-        else:
-            pass
-        return visit_options
+            return {plan.visit_attr: self.visit}
+        return {}
 
     def zero_time(self, d=None):
         """Returns a datetime with time(0)."""
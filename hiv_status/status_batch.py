@@ -0,0 +1,132 @@
+from itertools import islice
+
+from django.db.models import F
+from edc_constants.constants import POS, NEG
+
+from .status import Status, SubjectWrapper
+
+
+class StatusBatch:
+
+    """Computes a Status for each of many subjects with a constant number of queries
+    per chunk of subjects.
+
+    Each source model is fetched once per chunk, rows are grouped per subject
+    in memory and the selected instances are passed to `status_class` so that
+    result, previous, subject_aware and newly_positive are decided exactly as
+    for a single subject.
+
+        >>> batch = Status.bulk(
+            Subject.objects.all(), tested=HivResult, documented=HivStatusReview)
+        >>> for status in batch:
+        ...     print(status.subject.subject_identifier, status, status.newly_positive)
+
+    Sources that are not model classes, e.g. 'POS', are passed to each Status as is.
+    Since `visit` is specific to one subject it is not accepted here; use
+    `visit_code` and `encounter`.
+    """
+
+    chunk_size = 500
+    subject_id_attr = 'hiv_status_subject_id'
+
+    def __init__(self, subjects, tested=None, documented=None, indirect=None, verbal=None,
+                 visit_code=None, encounter=None, result_list=None, reference_date=None,
+                 include_verbal=None, status_class=None, chunk_size=None):
+        self.subjects = subjects
+        self.status_class = status_class or Status
+        self.chunk_size = chunk_size or self.chunk_size
+        self.sources = {
+            'tested': tested, 'documented': documented, 'indirect': indirect, 'verbal': verbal}
+        self.status_options = dict(
+            visit_code=visit_code, encounter=encounter, result_list=result_list,
+            reference_date=reference_date, include_verbal=include_verbal)
+        # a Status without sources does not query; it is used to build the filter options.
+        self.prototype = self.status_class(
+            SubjectWrapper(None, None), visit_code=visit_code, encounter=encounter,
+            result_list=result_list, reference_date=reference_date)
+
+    def __iter__(self):
+        subjects = iter(self.subjects)
+        chunk = list(islice(subjects, self.chunk_size))
+        while chunk:
+            for status in self.statuses(chunk):
+                yield status
+            chunk = list(islice(subjects, self.chunk_size))
+
+    def statuses(self, subjects):
+        """Returns a list of Status, one per subject, for a chunk of subjects."""
+        instances = self.instances([subject.id for subject in subjects])
+        options = dict(self.sources, **self.status_options)
+        return [self.status_class(subject, instances=instances[subject.id], **options)
+                for subject in subjects]
+
+    def instances(self, subject_ids):
+        """Returns a dictionary of subject id: {name: instance or None} for each
+        source that is a model."""
+        instances = {subject_id: {} for subject_id in subject_ids}
+        for name, model in self.models():
+            if name == 'previous':
+                selected = self.previous_instances(model, subject_ids)
+            else:
+                selected = self.latest_instances(model, name, subject_ids)
+            for subject_id in subject_ids:
+                instances[subject_id][name] = selected.get(subject_id)
+        return instances
+
+    def models(self):
+        """Returns a list of (name, model) for each source that is a model, including 'previous'."""
+        models = [(name, self.sources[name]) for name in ['tested', 'documented', 'indirect', 'verbal']
+                  if self.is_model(self.sources[name])]
+        if self.is_model(self.sources['tested']):
+            models.append(('previous', self.sources['tested']))
+        return models
+
+    def is_model(self, source):
+        return self.status_class.source_adapters.adapter(source).is_model
+
+    def subject_lookup(self, name):
+        return self.status_class.plans[name].subject_lookup
+
+    def get_latest_by(self, name):
+        return self.status_class.plans[name].get_latest_by
+
+    def queryset(self, model, name, options, subject_ids):
+        """Returns a queryset of model filtered on options for all subject_ids annotated
+        with the subject id."""
+        subject_lookup = self.subject_lookup(name)
+        del options[subject_lookup]
+        options['{}__in'.format(subject_lookup)] = subject_ids
+        visit_attr = self.prototype.attrs(name)[Status.VISIT_ATTR]
+        return model.objects.filter(**options).select_related(visit_attr).annotate(
+            **{self.subject_id_attr: F(subject_lookup)})
+
+    def last_by_subject(self, queryset):
+        """Returns a dictionary of subject id: the last instance in the queryset."""
+        instances = {}
+        for instance in queryset:
+            instances[getattr(instance, self.subject_id_attr)] = instance
+        return instances
+
+    def latest_queryset(self, model, name, subject_ids):
+        """Returns a queryset of the instances of model from which the latest per subject
+        is selected."""
+        options = self.prototype.options(name)
+        options.update(self.prototype.visit_options(name))
+        return self.queryset(model, name, options, subject_ids)
+
+    def previous_queryset(self, model, subject_ids):
+        """Returns a queryset of the instances of model from which the previous per subject
+        is selected, see Status.previous_queryset."""
+        options = self.prototype.options('previous', result_list=[POS, NEG])
+        queryset = self.queryset(model, 'previous', options, subject_ids)
+        return self.prototype.previous_queryset(queryset, 'previous', options={})
+
+    def latest_instances(self, model, name, subject_ids):
+        """Returns a dictionary of subject id: latest instance as selected by Status.latest_instance."""
+        queryset = self.latest_queryset(model, name, subject_ids)
+        return self.last_by_subject(queryset.order_by(self.get_latest_by(name)))
+
+    def previous_instances(self, model, subject_ids):
+        """Returns a dictionary of subject id: previous instance as selected by Status.previous_instance."""
+        ordering = ['-{}'.format(field) for field in self.prototype.previous_ordering('previous')]
+        return self.last_by_subject(self.previous_queryset(model, subject_ids).order_by(*ordering))
@@ -0,0 +1,166 @@
+import hashlib
+
+from collections import OrderedDict, namedtuple
+from datetime import date
+from threading import RLock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.base import ModelBase
+
+from .status import Status
+
+CacheInfo = namedtuple('CacheInfo', 'hits, misses, evictions, maxsize, currsize')
+
+
+class StatusCache:
+
+    """An opt-in cache of Status instances.
+
+    Instances are kept in an in-process LRU of at most `maxsize` entries and, if
+    `backend` names a Django cache (e.g. 'default'), in that cache as well.
+
+    Keys are built from the status class, subject id, reference date (today if
+    not given), visit, visit_code, encounter, include_verbal, result_list and the
+    sources (model label or value). Statuses with a queryset or callable source
+    have no stable key and are computed without caching. `invalidate(subject)`
+    drops every entry of a subject; signals.py calls it when a HivResult,
+    HivStatusReview or Visit is saved or deleted and again when the transaction
+    commits. With a backend, entries are invalidated by bumping a per-subject
+    version kept in the backend so that other processes see it too.
+
+        >>> status = Status.cached(subject, tested=HivResult, documented=HivStatusReview)
+        >>> status_cache.cache_info()
+        CacheInfo(hits=0, misses=1, evictions=0, maxsize=1024, currsize=1)
+
+    Cached instances are shared, treat them as read-only.
+    """
+
+    key_prefix = 'hiv_status.status'
+
+    def __init__(self, maxsize=None, backend=None, timeout=None):
+        self.maxsize = maxsize or 1024
+        self.backend = caches[backend] if backend else None
+        self.timeout = timeout
+        self.lock = RLock()
+        self.entries = OrderedDict()
+        self.subject_keys = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_status(self, subject, status_class=None, **kwargs):
+        """Returns a cached Status for these arguments or computes and caches a new one."""
+        status_class = status_class or Status
+        if not self.cacheable(kwargs):
+            return self.build(status_class, subject, **kwargs)
+        key = self.key(status_class, subject, **kwargs)
+        with self.lock:
+            status = self.entries.get(key)
+            if status is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return status
+        if self.backend is not None:
+            status = self.backend.get(key)
+        if status is None:
+            status = self.build(status_class, subject, **kwargs)
+            if self.backend is not None:
+                self.backend.set(key, status, **self.timeout_kwargs())
+            with self.lock:
+                self.misses += 1
+        else:
+            with self.lock:
+                self.hits += 1
+        self.store(subject.id, key, status)
+        return status
+
+    def build(self, status_class, subject, **kwargs):
+        return status_class(subject, **kwargs)
+
+    def cacheable(self, kwargs):
+        """Returns True if the sources in kwargs are models, strings or None."""
+        return all(self.stable_source(kwargs.get(name)) for name in ['tested', 'documented', 'indirect', 'verbal'])
+
+    def stable_source(self, source):
+        return source is None or isinstance(source, (str, ModelBase))
+
+    def store(self, subject_id, key, status):
+        with self.lock:
+            self.entries[key] = status
+            self.entries.move_to_end(key)
+            self.subject_keys.setdefault(subject_id, set()).add(key)
+            while len(self.entries) > self.maxsize:
+                old_key, old_status = self.entries.popitem(last=False)
+                keys = self.subject_keys.get(old_status.subject.id, set())
+                keys.discard(old_key)
+                if not keys:
+                    self.subject_keys.pop(old_status.subject.id, None)
+                self.evictions += 1
+
+    def invalidate(self, subject):
+        """Drops all entries of a subject, a model instance or id."""
+        subject_id = getattr(subject, 'id', subject)
+        with self.lock:
+            for key in self.subject_keys.pop(subject_id, set()):
+                self.entries.pop(key, None)
+        if self.backend is not None:
+            version_key = self.version_key(subject_id)
+            try:
+                self.backend.incr(version_key)
+            except ValueError:
+                self.backend.set(version_key, 1, None)
+
+    def clear(self):
+        """Drops all in-process entries and resets the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.subject_keys.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def timeout_kwargs(self):
+        # None is "never expire" to Django, here it means the backend's default.
+        return {} if self.timeout is None else {'timeout': self.timeout}
+
+    def cache_info(self):
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.entries))
+
+    def version_key(self, subject_id):
+        return '{}.version.{}'.format(self.key_prefix, subject_id)
+
+    def key(self, status_class, subject, tested=None, documented=None, indirect=None, verbal=None,
+            visit_code=None, encounter=None, visit=None, result_list=None, reference_date=None,
+            include_verbal=None, **kwargs):
+        """Returns the cache key for the arguments of a Status."""
+        parts = [
+            '{}.{}'.format(status_class.__module__, status_class.__name__),
+            subject.id,
+            reference_date or date.today(),
+            getattr(visit, 'pk', visit),
+            visit_code,
+            encounter,
+            bool(include_verbal),
+            sorted(result_list) if result_list else None,
+        ]
+        parts.extend(self.source_key(source) for source in [tested, documented, indirect, verbal])
+        parts.extend(sorted(kwargs.items()))
+        if self.backend is not None:
+            parts.append(self.backend.get(self.version_key(subject.id), 0))
+        digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+        return '{}.{}.{}'.format(self.key_prefix, subject.id, digest)
+
+    def source_key(self, source):
+        if not self.stable_source(source):
+            # str() of a queryset evaluates it and is truncated, so it is no key
+            raise TypeError('Expected a model, string or None source. Got {}.'.format(type(source).__name__))
+        try:
+            return source._meta.label_lower
+        except AttributeError:
+            return source or None
+
+
+status_cache = StatusCache(
+    maxsize=getattr(settings, 'HIV_STATUS_CACHE_MAXSIZE', None),
+    backend=getattr(settings, 'HIV_STATUS_CACHE_BACKEND', None),
+    timeout=getattr(settings, 'HIV_STATUS_CACHE_TIMEOUT', None))
@@ -0,0 +1,70 @@
+from collections import namedtuple
+
+from edc_constants.constants import POS, NEG, IND, UNK
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+KernelResult = namedtuple('KernelResult', 'result, subject_aware, newly_positive')
+
+
+class StatusKernel:
+
+    """Evaluates the rules of SimpleStatus and Status.subject_aware / Status.newly_positive
+    for a cohort at once on arrays of coded results. Requires numpy.
+
+    Results are coded by their index in `values`, 0 is no result. `encode` and
+    `decode` convert between values (strings, ResultWrappers or None) and codes.
+
+        >>> kernel = StatusKernel()
+        >>> arrays = kernel.evaluate(
+        ...     kernel.encode(['POS', None, 'NEG']), kernel.encode(['NEG', 'POS', None]),
+        ...     kernel.encode([None, None, None]), kernel.encode([None, None, None]))
+        >>> kernel.decode(arrays.result)
+        ['POS', 'POS', 'NEG']
+        >>> arrays.newly_positive
+        array([ True, False, False])
+
+    As with Status, pass the documented results after merging the previous result
+    (Status.documented) to get the same subject_aware and newly_positive."""
+
+    values = ['', POS, NEG, IND, UNK]
+
+    def __init__(self):
+        if np is None:
+            raise ImportError('StatusKernel requires numpy. Try \'pip install numpy\'.')
+        self.codes = {value: code for code, value in enumerate(self.values)}
+        self.none = self.codes['']
+        self.pos = self.codes[POS]
+        self.neg = self.codes[NEG]
+
+    def encode(self, results):
+        """Returns an int8 array of the codes of results."""
+        try:
+            return np.fromiter(
+                (self.codes[str(result or '')] for result in results), dtype=np.int8)
+        except KeyError as e:
+            raise ValueError('Unknown result {}. Expected one of {}.'.format(e, self.values))
+
+    def decode(self, codes):
+        """Returns a list of the values of codes."""
+        return [self.values[code] for code in codes]
+
+    def evaluate(self, tested, documented, indirect, verbal, include_verbal=False):
+        """Returns a KernelResult of the result codes and the subject_aware and
+        newly_positive boolean arrays.
+
+        include_verbal may be a boolean or a boolean array, one per subject."""
+        tested, documented, indirect, verbal = (
+            np.asarray(codes, dtype=np.int8) for codes in [tested, documented, indirect, verbal])
+        no_documented_or_indirect = (documented == self.none) & (indirect == self.none)
+        verbal_pos = (verbal == self.pos) & np.asarray(include_verbal, dtype=bool) & no_documented_or_indirect
+        pos = (documented == self.pos) | (indirect == self.pos) | verbal_pos
+        result = np.where(
+            tested != self.none, tested, np.where(pos, self.pos, self.none)).astype(np.int8)
+        subject_aware = np.where(
+            tested == self.neg, documented == self.neg, (documented == self.pos) | (indirect == self.pos))
+        newly_positive = (tested == self.pos) & ((documented == self.neg) | no_documented_or_indirect)
+        return KernelResult(result, subject_aware, newly_positive)
@@ -0,0 +1,105 @@
+import sys
+import threading
+
+from django.conf import settings
+
+from .status_cache import StatusCache
+
+
+class StatusMemo(StatusCache):
+
+    """Memoizes the Status instances constructed in this thread within a `with` block,
+    e.g. one request, see StatusMemoMiddleware.
+
+    While a memo is active, `Status(subject, ...)`, or a subclass with `memoize`
+    True, returns the instance already constructed with the same arguments instead
+    of looking up the sources again:
+
+        >>> with StatusMemo() as memo:
+        ...     a = Status(subject, tested=HivResult, documented=HivStatusReview)
+        ...     b = Status(subject, tested=HivResult, documented=HivStatusReview)  # no queries
+        >>> a is b, memo.hits
+        (True, 1)
+
+    Only constructions with keyword sources that are models, strings or None are
+    memoized; `instances`, querysets and callables are always looked up. Entries
+    of a subject are dropped when one of its results or visits is saved or deleted
+    in the block, and all entries when the block exits.
+    """
+
+    key_prefix = 'hiv_status.memo'
+
+    local = threading.local()
+
+    def __init__(self):
+        super(StatusMemo, self).__init__(maxsize=sys.maxsize)
+
+    def __enter__(self):
+        self.stack().append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack().remove(self)
+        with self.lock:
+            self.entries.clear()
+            self.subject_keys.clear()
+
+    @classmethod
+    def stack(cls):
+        try:
+            return cls.local.stack
+        except AttributeError:
+            cls.local.stack = []
+            return cls.local.stack
+
+    @classmethod
+    def active(cls):
+        """Returns the innermost active memo of this thread or None."""
+        stack = cls.stack()
+        return stack[-1] if stack else None
+
+    @classmethod
+    def invalidate_active(cls, subject):
+        """Drops the entries of a subject, a model instance or id, from the active memos
+        of this thread."""
+        for memo in cls.stack():
+            memo.invalidate(subject)
+
+    def accepts(self, status_class, subject, args, kwargs):
+        """Returns True if a construction with these arguments can be memoized."""
+        if not status_class.memoize or args or 'instances' in kwargs or getattr(subject, 'id', None) is None:
+            return False
+        return self.cacheable(kwargs)
+
+    def build(self, status_class, subject, **kwargs):
+        return type.__call__(status_class, subject, **kwargs)
+
+
+class StatusMemoMiddleware:
+
+    """Memoizes Status instances for the lifetime of each request, see StatusMemo.
+
+    If settings.HIV_STATUS_MEMO_HEADER, by default settings.DEBUG, is True, the
+    response has a header `X-HIV-Status-Memo: saved=<hits>; computed=<misses>`.
+    """
+
+    header = 'X-HIV-Status-Memo'
+
+    def process_request(self, request):
+        request.hiv_status_memo = StatusMemo().__enter__()
+
+    def process_response(self, request, response):
+        memo = getattr(request, 'hiv_status_memo', None)
+        if memo is not None:
+            self.release(request)
+            if getattr(settings, 'HIV_STATUS_MEMO_HEADER', settings.DEBUG):
+                response[self.header] = 'saved={}; computed={}'.format(memo.hits, memo.misses)
+        return response
+
+    def process_exception(self, request, exception):
+        self.release(request)
+
+    def release(self, request):
+        memo = getattr(request, 'hiv_status_memo', None)
+        if memo is not None and memo in StatusMemo.stack():
+            memo.__exit__(None, None, None)
@@ -0,0 +1,152 @@
+import logging
+import math
+import socket
+
+from collections import OrderedDict, deque
+from threading import RLock
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LoggingSink:
+
+    """Logs each flush of StatusMetrics as one line of name=value pairs."""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('hiv_status.metrics')
+        self.level = level
+
+    def send(self, metrics):
+        self.logger.log(self.level, ' '.join('{}={}'.format(name, value) for name, value in metrics.items()))
+
+
+class MemorySink:
+
+    """Keeps each flush of StatusMetrics in `sent`, e.g. for tests or a status page."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, metrics):
+        self.sent.append(metrics)
+
+
+class StatsdSink:
+
+    """Sends each flush of StatusMetrics as statsd gauges over UDP, e.g. to a local
+    statsd agent:
+
+        hiv_status.tested.ms.p95:4.210|g
+
+    Lines are batched into packets of at most `max_packet_size` bytes. Errors sending
+    are logged, not raised."""
+
+    max_packet_size = 512
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='hiv_status'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, metrics):
+        packet = ''
+        for name, value in metrics.items():
+            line = '{}.{}:{}|g'.format(self.prefix, name, value)
+            if packet and len(packet) + len(line) + 1 > self.max_packet_size:
+                self.sendto(packet)
+                packet = ''
+            packet = '{}\n{}'.format(packet, line) if packet else line
+        if packet:
+            self.sendto(packet)
+
+    def sendto(self, packet):
+        try:
+            self.socket.sendto(packet.encode('utf-8'), self.address)
+        except OSError as e:
+            logger.warning('Could not send metrics to %s:%s. Got %s', self.address[0], self.address[1], e)
+
+
+class StatusMetrics:
+
+    """Aggregates the stage timings and query counts of instrumented statuses, see
+    InstrumentedStatusMixin, into histograms.
+
+    The last `maxlen` samples of each stage are kept. `summary()` returns the count
+    and the 50th, 95th and 99th percentiles of the milliseconds and queries of each
+    stage, e.g. 'tested.ms.p95', and `flush()` sends the summary to `sink` and starts
+    over; it is called every `flush_every` statuses if given.
+
+        >>> class MyStatus(InstrumentedStatus):
+        ...     metrics = StatusMetrics(sink=MemorySink())
+        >>> status = MyStatus(subject, tested=HivResult)
+        >>> MyStatus.metrics.summary()['tested.queries.p50']
+        1
+    """
+
+    percentiles = [50, 95, 99]
+
+    def __init__(self, sink=None, maxlen=None, flush_every=None):
+        self.sink = sink
+        self.maxlen = maxlen or 10000
+        self.flush_every = flush_every
+        self.lock = RLock()
+        self.samples = OrderedDict()
+        self.count = 0
+
+    def record(self, status):
+        """Adds the timings and query counts of an instrumented status."""
+        with self.lock:
+            for stage, seconds in status.timings.items():
+                self.add('{}.ms'.format(stage), round(seconds * 1000, 3))
+            for stage, queries in status.queries.items():
+                self.add('{}.queries'.format(stage), queries)
+            self.count += 1
+            flush = self.flush_every and self.count >= self.flush_every
+        if flush:
+            self.flush()
+
+    def add(self, name, value):
+        try:
+            self.samples[name].append(value)
+        except KeyError:
+            self.samples[name] = deque([value], maxlen=self.maxlen)
+
+    def histogram(self, name):
+        """Returns an OrderedDict of percentile: value of the samples of name, e.g. 'tested.ms'."""
+        with self.lock:
+            values = sorted(self.samples.get(name, []))
+        return OrderedDict(
+            ('p{}'.format(p), values[max(0, math.ceil(p / 100 * len(values)) - 1)] if values else None)
+            for p in self.percentiles)
+
+    def summary(self):
+        """Returns an OrderedDict of the count and the percentiles of each sampled name."""
+        with self.lock:
+            summary = OrderedDict([('count', self.count)])
+            for name in self.samples:
+                for percentile, value in self.histogram(name).items():
+                    summary['{}.{}'.format(name, percentile)] = value
+        return summary
+
+    def flush(self):
+        """Sends the summary to the sink, clears the samples and returns the summary."""
+        with self.lock:
+            summary = self.summary()
+            self.samples = OrderedDict()
+            self.count = 0
+        if self.sink is not None and summary['count']:
+            self.sink.send(summary)
+        return summary
+
+
+def default_sink():
+    """Returns a StatsdSink if settings.HIV_STATUS_STATSD_ADDRESS, a (host, port), is
+    set, else a LoggingSink."""
+    address = getattr(settings, 'HIV_STATUS_STATSD_ADDRESS', None)
+    return StatsdSink(*address) if address else LoggingSink()
+
+
+status_metrics = StatusMetrics(
+    sink=default_sink(), flush_every=getattr(settings, 'HIV_STATUS_METRICS_FLUSH_EVERY', 1000))
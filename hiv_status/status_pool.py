@@ -0,0 +1,110 @@
+import math
+import multiprocessing
+
+import django
+
+from .status import Status
+from .status_batch import StatusBatch
+
+
+def setup_worker(databases=None):
+    """Sets up Django in a new worker process with the settings of `databases`, a
+    dictionary of alias: settings, updating settings.DATABASES. The worker opens
+    its own database connections on first use.
+
+    This module does not import models so that it can be imported before the setup."""
+    from django.conf import settings
+    for alias, database in (databases or {}).items():
+        settings.DATABASES[alias].update(database)
+    django.setup()
+
+
+def evaluate_chunk(task):
+    """Returns a list of (subject pk, values) for one chunk of subject pks."""
+    (status_class, batch_class, values, options), subject_model, subject_ids = task
+    subjects = subject_model.objects.filter(pk__in=subject_ids).order_by('pk')
+    return [(status.subject.pk, values(status))
+            for status in status_class.bulk(
+                subjects, batch_class=batch_class, chunk_size=len(subject_ids), **options)]
+
+
+class StatusPool:
+
+    """Evaluates a Status, or a subclass of Status, for many subjects in a pool of
+    worker processes.
+
+    The subject pks are split into chunks and each chunk is evaluated by a worker
+    with `batch_class` (StatusBatch). For each subject the worker returns
+    `values(status)`, by default SubjectHivStatus.values, and `evaluate` merges
+    these into one dictionary of subject pk: values.
+
+        >>> pool = StatusPool(processes=4, tested=HivResult, documented=HivStatusReview)
+        >>> values = pool.evaluate(Subject.objects.all())
+        >>> values[subject.pk]['result']
+        'POS'
+
+    Workers are started with `start_method` ('spawn'), so they do not share the
+    database connections of this process and only see committed data. The
+    status class, sources and `values` must be picklable, e.g. model classes
+    and module level functions. `progress`, if given, is called in this process
+    with (subjects done, total) as each chunk completes. With processes=1 the
+    chunks are evaluated in this process.
+
+    Workers connect to the databases of this process, e.g. the test database, or
+    those of `databases`, a dictionary of alias: settings such as {'NAME': ...}.
+    An in-memory SQLite database cannot be shared, use processes=1 with it.
+    """
+
+    start_method = 'spawn'
+
+    # chunks per process, more chunks balance the load across workers
+    chunks_per_process = 4
+
+    def __init__(self, processes=None, chunk_size=None, status_class=None, batch_class=None,
+                 values=None, progress=None, databases=None, **options):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self.status_class = status_class or Status
+        self.batch_class = batch_class or StatusBatch
+        if not values:
+            from .models import SubjectHivStatus
+            values = SubjectHivStatus.values
+        self.values = values
+        self.progress = progress
+        self.databases = databases
+        self.options = options
+
+    def evaluate(self, subjects):
+        """Returns a dictionary of subject pk: values for a queryset of subjects."""
+        subject_ids = list(subjects.order_by('pk').values_list('pk', flat=True))
+        job = (self.status_class, self.batch_class, self.values, self.options)
+        tasks = [(job, subjects.model, chunk) for chunk in self.chunks(subject_ids)]
+        results = {}
+        if self.processes == 1 or len(tasks) <= 1:
+            self.merge(results, map(evaluate_chunk, tasks), len(subject_ids))
+        else:
+            context = multiprocessing.get_context(self.start_method)
+            with context.Pool(min(self.processes, len(tasks)), initializer=setup_worker,
+                              initargs=(self.worker_databases(), )) as pool:
+                self.merge(results, pool.imap_unordered(evaluate_chunk, tasks), len(subject_ids))
+        return results
+
+    def merge(self, results, chunks, total):
+        for rows in chunks:
+            results.update(rows)
+            if self.progress:
+                self.progress(len(results), total)
+
+    def worker_databases(self):
+        """Returns a dictionary of alias: settings of the databases of the workers."""
+        from django.db import connections
+        if self.databases is not None:
+            return self.databases
+        return {alias: {'NAME': connections[alias].settings_dict['NAME']} for alias in connections}
+
+    def chunks(self, subject_ids):
+        """Returns a list of lists of subject pks of at most chunk_size."""
+        chunk_size = self.chunk_size or max(1, min(
+            self.batch_class.chunk_size,
+            int(math.ceil(len(subject_ids) / float(self.processes * self.chunks_per_process)))))
+        return [subject_ids[n:n + chunk_size] for n in range(0, len(subject_ids), chunk_size)]
@@ -0,0 +1,343 @@
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import BooleanField, Case, CharField, DateField, DateTimeField, F, Q, QuerySet, Value, When
+from django.db.models.expressions import Col, RawSQL
+from django.db.models.sql.datastructures import BaseTable
+from edc_constants.constants import POS, NEG
+
+from .status import Status, SubjectWrapper
+
+
+class DerivedTable(BaseTable):
+
+    """The base table of a query replaced by a subquery selecting its rows, see
+    StatusAnnotations.annotate."""
+
+    def __init__(self, table_name, alias, sql, params):
+        super(DerivedTable, self).__init__(table_name, alias)
+        self.sql, self.params = sql, params
+
+    def as_sql(self, compiler, connection):
+        return '({}) {}'.format(self.sql, compiler.quote_name_unless_alias(self.table_alias)), list(self.params)
+
+    def relabeled_clone(self, change_map):
+        return self.__class__(
+            self.table_name, change_map.get(self.table_alias, self.table_alias), self.sql, self.params)
+
+
+class StatusAnnotations:
+
+    """Builds the expressions that annotate a queryset with the status of each subject.
+
+    The latest result of each source model, and the previous tested result, are
+    selected by correlated subqueries compiled from the same querysets as
+    Status.latest_instance and Status.previous_instance, i.e. from the `plans` of
+    `status_class`. The decision of Status and SimpleStatus, and subject_aware and
+    newly_positive, are then expressed with Case/When over these annotations.
+
+    Case/When repeats the SQL of each annotation it refers to, so the subqueries are
+    selected once per row in a derived table, see rows_sql, and the annotated
+    queryset selects from it instead of the model's table. Each subquery selects the
+    pk of its row, which is then joined for the result and its dates. Filters of the
+    queryset apply within the derived table; filters added to the annotated
+    queryset, e.g. on newly_positive, apply to its rows. The derived tables end with
+    OFFSET 0 so the database evaluates them as is instead of merging their columns
+    into each expression of the outer query.
+
+    `columns` maps 'subject', and optionally 'visit_code' and 'encounter', to fields
+    of `model`, the model of the annotated queryset. The subqueries are correlated
+    on these fields instead of on the subject, visit_code and encounter of a Status,
+    e.g. {'subject': 'subject', 'visit_code': 'visit_code', 'encounter': 'encounter'}
+    annotates each visit with the status as of its visit code and encounter.
+
+    Django 1.9 has no Subquery/OuterRef, so each queryset is filtered on sentinel
+    values whose placeholders are replaced by the columns of the outer query.
+    """
+
+    sentinels = {'subject': -738291046, 'visit_code': 'hiv-status-visit-code', 'encounter': -738291047}
+
+    columns = {'subject': 'pk'}
+
+    # names of the intermediate annotations, see Status.PREVIOUS_RANK
+    prefix = 'hiv_status_'
+
+    def __init__(self, model, tested=None, documented=None, indirect=None, verbal=None,
+                 visit_code=None, encounter=None, result_list=None, reference_date=None,
+                 include_verbal=None, status_class=None, columns=None):
+        self.model = model
+        self.status_class = status_class or Status
+        self.columns = columns or self.columns
+        self.sources = {'tested': tested, 'documented': documented, 'indirect': indirect, 'verbal': verbal}
+        self.include_verbal = include_verbal
+        if 'visit_code' in self.columns:
+            visit_code = self.sentinels['visit_code']
+        if 'encounter' in self.columns:
+            encounter = self.sentinels['encounter']
+        # a Status without sources does not query; it is used to build the filter options.
+        self.prototype = self.status_class(
+            SubjectWrapper(self.sentinels['subject'], None), visit_code=visit_code, encounter=encounter,
+            result_list=result_list, reference_date=reference_date)
+        for name, source in self.sources.items():
+            if source is not None and not self.status_class.source_adapters.adapter(source).is_model:
+                raise TypeError(
+                    'Expected a model class or None for \'{}\'. Got {!r}.'.format(name, source))
+
+    def annotate(self, queryset, fields=None):
+        """Returns the queryset annotated with tested, previous, documented, indirect,
+        verbal, result, subject_aware and newly_positive.
+
+        If fields are given, e.g. the fields of `columns`, the annotated queryset has a
+        row, with only these fields, per distinct value of fields in queryset instead
+        of a row per row of queryset."""
+        if fields:
+            rows = queryset.order_by().values(*fields).distinct()
+            sql, params = rows.query.get_compiler(using=queryset.db).as_sql()
+            queryset = self.from_sql(queryset, sql + self.fence(), params)
+        queryset = self.derived(queryset, fields)
+        queryset = queryset.annotate(previous=self.previous(), previous_datetime=self.previous_datetime())
+        queryset = queryset.annotate(documented=self.documented())
+        return queryset.annotate(
+            result=self.result(), subject_aware=self.subject_aware(), newly_positive=self.newly_positive())
+
+    def name(self, name):
+        return '{}{}'.format(self.prefix, name)
+
+    def derived(self, queryset, fields=None):
+        """Returns a new queryset of the rows of queryset selected from a derived table,
+        see rows_sql, annotated with its columns and with None for sources that are None."""
+        sql, params, columns = self.rows_sql(queryset, fields)
+        derived = self.from_sql(queryset, sql, params)
+        alias = derived.query.get_initial_alias()
+        annotations = {name: self.column(alias, name, output_field) for name, output_field in columns.items()}
+        for name, output_field in self.source_columns().items():
+            annotations.setdefault(name, Value(None, output_field=output_field))
+        return derived.annotate(**annotations)
+
+    def from_sql(self, queryset, sql, params):
+        """Returns a new queryset of the class of queryset selecting from the rows of sql
+        instead of the model's table."""
+        derived = queryset.__class__(model=self.model, using=queryset.db)
+        alias = derived.query.get_initial_alias()
+        derived.query.alias_map[alias] = DerivedTable(self.model._meta.db_table, alias, sql, params)
+        return derived
+
+    def rows_sql(self, queryset, fields=None):
+        """Returns the SQL, params and a dictionary of column name: output field of a
+        derived table of fields, by default all fields, of the rows of queryset with the
+        latest result of each source and the previous tested result with their dates.
+
+        Each lookup selects the pk of its row in a correlated subquery, then the row is
+        joined on the pk, so a lookup runs once per row of queryset. The previous
+        result depends on the subject only; if `columns` has more than the subject, it
+        is looked up once per subject of queryset in a derived table joined on the subject."""
+        connection = self.connection()
+        qn = connection.ops.quote_name
+        lookups = self.lookups()
+        per_subject = ['previous'] if 'previous' in lookups and len(self.columns) > 1 else []
+        pks = {self.name('{}_pk'.format(name)): self.scalar(lookup, 'pk', model._meta.pk)
+               for name, (model, lookup) in lookups.items() if name not in per_subject}
+        fields = fields or [field.attname for field in self.model._meta.concrete_fields]
+        rows = queryset.order_by().annotate(**pks).values(*(fields + sorted(pks)))
+        rows_sql, rows_params = rows.query.get_compiler(using=queryset.db).as_sql()
+        selects, joins, params, join_params, columns = ['hs_rows.*'], [], [], [], {}
+        if per_subject:
+            subject_field = self.columns['subject']
+            subjects = queryset.order_by().values(subject_field).distinct()
+            subjects = self.from_sql(queryset, *subjects.query.get_compiler(using=queryset.db).as_sql())
+            subjects = subjects.order_by().annotate(**{
+                self.name('{}_pk'.format(name)): self.scalar(lookups[name][1], 'pk', lookups[name][0]._meta.pk)
+                for name in per_subject}).values(subject_field, *[
+                    self.name('{}_pk'.format(name)) for name in per_subject])
+            subjects_sql, subjects_params = subjects.query.get_compiler(using=queryset.db).as_sql()
+            column = qn(self.field_column(subject_field))
+            joins.append('LEFT OUTER JOIN ({}{}) hs_subjects ON hs_subjects.{column} = hs_rows.{column}'.format(
+                subjects_sql, self.fence(), column=column))
+            join_params.extend(subjects_params)
+        for name, (model, _) in sorted(lookups.items()):
+            result_value_attr, result_datetime_attr, _ = self.prototype.attrs(name)
+            table = 'hs_{}'.format(name)
+            joins.append('LEFT OUTER JOIN {} {table} ON {table}.{} = {}.{}'.format(
+                qn(model._meta.db_table), qn(model._meta.pk.column),
+                'hs_subjects' if name in per_subject else 'hs_rows', qn(self.name('{}_pk'.format(name))),
+                table=table))
+            result_datetime = '{}.{}'.format(table, qn(model._meta.get_field(result_datetime_attr).column))
+            date_sql, date_params = self.as_date(result_datetime, model, result_datetime_attr)
+            selects.append('{}.{} AS {}'.format(
+                table, qn(model._meta.get_field(result_value_attr).column), qn(self.name(name))))
+            selects.append('{} AS {}'.format(date_sql, qn(self.name('{}_date'.format(name)))))
+            params.extend(date_params)
+            columns.update({self.name(name): CharField(), self.name('{}_date'.format(name)): DateField()})
+            if name == 'previous':
+                selects.append('{} AS {}'.format(result_datetime, qn(self.name('previous_datetime'))))
+                columns[self.name('previous_datetime')] = DateTimeField()
+        sql = 'SELECT {} FROM ({}{}) hs_rows {}{}'.format(
+            ', '.join(selects), rows_sql, self.fence(), ' '.join(joins), self.fence())
+        return sql, params + list(rows_params) + join_params, columns
+
+    def field_column(self, field_name):
+        """Returns the column of a field of `columns`, e.g. 'pk' or 'subject'."""
+        if field_name == 'pk':
+            return self.model._meta.pk.column
+        return self.model._meta.get_field(field_name).column
+
+    def fence(self):
+        """Returns the OFFSET 0 clause that keeps the database from merging a derived table
+        into the outer query, which would evaluate its columns once per reference."""
+        no_limit = self.connection().ops.no_limit_value()
+        return ' OFFSET 0' if no_limit is None else ' LIMIT {} OFFSET 0'.format(no_limit)
+
+    def column(self, alias, name, output_field):
+        """Returns an expression selecting the column name of the derived table."""
+        target = output_field.__class__()
+        target.column = name
+        return Col(alias, target)
+
+    def lookups(self):
+        """Returns a dictionary of name: (model, queryset) for each source that is a model
+        and, if tested is, for previous."""
+        lookups = {name: (model, self.latest_queryset(model, name))
+                   for name, model in self.sources.items() if model is not None}
+        if self.sources['tested'] is not None:
+            lookups['previous'] = (self.sources['tested'], self.previous_queryset(self.sources['tested']))
+        return lookups
+
+    def source_columns(self):
+        """Returns a dictionary of name: output field of the columns of the derived table."""
+        columns = {self.name('previous_datetime'): DateTimeField()}
+        for name in ['tested', 'documented', 'indirect', 'verbal', 'previous']:
+            columns.update({self.name(name): CharField(), self.name('{}_date'.format(name)): DateField()})
+        return columns
+
+    def latest_queryset(self, model, name):
+        """Returns the queryset of Status.latest_instance ordered latest first."""
+        options = self.prototype.options(name)
+        options.update(self.prototype.visit_options(name))
+        return model.objects.filter(**options).order_by(
+            '-{}'.format(self.status_class.plans[name].get_latest_by), '-pk')
+
+    def previous_queryset(self, model):
+        """Returns the queryset of Status.previous_instance ordered POS ahead of NEG,
+        then earliest first."""
+        result_value_attr, result_datetime_attr, _ = self.prototype.attrs('previous')
+        options = self.prototype.options('previous', result_list=[POS, NEG])
+        options.update({'{}__lte'.format(result_datetime_attr): self.prototype.reference_datetime})
+        rank = Case(When(**{result_value_attr: POS}, then=Value(0)), default=Value(1))
+        return model.objects.filter(**options).order_by(rank.asc(), result_datetime_attr, 'pk')
+
+    def scalar(self, queryset, attr, output_field):
+        """Returns a RawSQL expression selecting attr of the first row of queryset for
+        the subject of the outer query."""
+        query = queryset.values(attr)[:1].query
+        # alias the tables of the subquery apart from those of the outer query
+        query.bump_prefix(self.model._base_manager.all().query)
+        sql, params = self.correlate(*query.sql_with_params())
+        return RawSQL('({})'.format(sql), params, output_field=output_field)
+
+    def correlate(self, sql, params):
+        """Returns the sql and params with the placeholder of each sentinel replaced by
+        its column of the outer query."""
+        if list(params).count(self.sentinels['subject']) != 1:
+            raise ValueError('Expected one subject lookup in \'{}\'.'.format(sql))
+        connection = self.connection()
+        columns = {}
+        for name, field_name in self.columns.items():
+            columns[self.sentinels[name]] = '{}.{}'.format(
+                connection.ops.quote_name(self.model._meta.db_table),
+                connection.ops.quote_name(self.field_column(field_name)))
+        parts = sql.split('%s')
+        sql, correlated_params = parts[0], []
+        for param, part in zip(params, parts[1:]):
+            if isinstance(param, (int, str)) and param in columns:
+                sql += columns[param] + part
+            else:
+                sql += '%s' + part
+                correlated_params.append(param)
+        return sql, correlated_params
+
+    def as_date(self, sql, model, attr):
+        """Returns the SQL and params of the column sql cast to the date of a datetime as
+        compared by ResultWrapper.result_date, i.e. in UTC if USE_TZ, if attr is a DateTimeField."""
+        if model._meta.get_field(attr).get_internal_type() != 'DateTimeField':
+            return sql, []
+        connection = self.connection()
+        if connection.vendor == 'sqlite':
+            # SQLite stores datetimes in UTC, or naive if not USE_TZ, and its datetime_cast_date
+            # calls back into Python for every row; date() gives the same date.
+            return 'date({})'.format(sql), []
+        sql, params = connection.ops.datetime_cast_date_sql(sql, 'UTC' if settings.USE_TZ else None)
+        return sql, list(params)
+
+    def connection(self):
+        return connections[router.db_for_read(self.model)]
+
+    def previous(self):
+        """Returns the previous result, None if there is no tested result or if it is on
+        the date of the tested result, see Status.lookup_previous."""
+        return Case(
+            When(**{'{}__isnull'.format(self.name('tested')): True, 'then': Value(None)}),
+            When(**{self.name('previous_date'): F(self.name('tested_date')), 'then': Value(None)}),
+            default=F(self.name('previous')), output_field=CharField())
+
+    def previous_datetime(self):
+        return Case(
+            When(**{'{}__isnull'.format(self.name('tested')): True, 'then': Value(None)}),
+            When(**{self.name('previous_date'): F(self.name('tested_date')), 'then': Value(None)}),
+            default=F(self.name('previous_datetime')), output_field=DateTimeField())
+
+    def documented(self):
+        """Returns the more recent of the documented and previous results, see Status.merge_previous."""
+        no_documented = Q(**{'{}__isnull'.format(self.name('documented')): True})
+        previous_later = Q(**{'{}__gt'.format(self.name('previous_date')): F(self.name('documented_date'))})
+        more_recent = no_documented | previous_later
+        return Case(
+            When(Q(previous__isnull=False) & more_recent, then=F('previous')),
+            default=F(self.name('documented')), output_field=CharField())
+
+    def result(self):
+        """Returns the result as decided by SimpleStatus."""
+        whens = [
+            When(**{'{}__isnull'.format(self.name('tested')): False, 'then': F(self.name('tested'))}),
+            When(documented=POS, then=Value(POS)),
+            When(**{self.name('indirect'): POS, 'then': Value(POS)})]
+        if self.include_verbal:
+            verbal_only = Q(**{self.name('verbal'): POS}) & Q(documented__isnull=True)
+            verbal_only &= Q(**{'{}__isnull'.format(self.name('indirect')): True})
+            whens.append(When(verbal_only, then=Value(POS)))
+        return Case(*whens, default=Value(None), output_field=CharField())
+
+    def subject_aware(self):
+        """See Status.subject_aware."""
+        tested_neg = Q(**{self.name('tested'): NEG})
+        return Case(
+            When(tested_neg & Q(documented=NEG), then=Value(True)),
+            When(tested_neg, then=Value(False)),
+            When(Q(documented=POS) | Q(**{self.name('indirect'): POS}), then=Value(True)),
+            default=Value(False), output_field=BooleanField())
+
+    def newly_positive(self):
+        """See Status.newly_positive."""
+        tested_pos = Q(**{self.name('tested'): POS})
+        return Case(
+            When(tested_pos & Q(documented=NEG), then=Value(True)),
+            When(tested_pos & Q(documented__isnull=True) & Q(**{'{}__isnull'.format(self.name('indirect')): True}),
+                 then=Value(True)),
+            default=Value(False), output_field=BooleanField())
+
+
+class StatusQuerySet(QuerySet):
+
+    """A QuerySet of subjects that can be annotated with their status, see StatusAnnotations.
+
+        >>> Subject.objects.with_hiv_status(visit_code='1000').filter(newly_positive=True).order_by('result')
+    """
+
+    annotations_class = StatusAnnotations
+
+    def with_hiv_status(self, status_class=None, **kwargs):
+        """Returns this queryset annotated with the status of each subject. Sources
+        default to SubjectHivStatus.sources."""
+        if not any(name in kwargs for name in ['tested', 'documented', 'indirect', 'verbal']):
+            from .models import SubjectHivStatus
+            kwargs.update(SubjectHivStatus.sources)
+            status_class = status_class or SubjectHivStatus.status_class
+        return self.annotations_class(self.model, status_class=status_class, **kwargs).annotate(self)
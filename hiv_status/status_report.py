@@ -0,0 +1,62 @@
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from edc_constants.constants import POS, NEG
+
+from .models import SubjectHivStatus, Visit
+from .status_queryset import StatusAnnotations
+
+
+class StatusReport:
+
+    """Counts the subjects by status per visit code, or per visit code and encounter
+    if by_encounter, in one GROUP BY query.
+
+    Each visit is annotated with the status of its subject as of the visit code, and
+    the encounter if by_encounter, of the visit, see StatusAnnotations, and the
+    subjects with each status are counted per group. The status is looked up once per
+    subject and group, not per visit. Iterating yields a dictionary per group:
+
+        >>> for row in StatusReport(reference_date=date(2016, 1, 1)):
+        ...     print(row['visit_code'], row['subjects'], row['pos'], row['neg'], row['newly_positive'])
+
+    Sources default to those of SubjectHivStatus. A subject with several visits in a
+    group is counted once. See benchmarks/status_annotations.py for timings.
+    """
+
+    group_by = ['visit_code']
+
+    # fields of the visit model the status lookups are correlated on, see StatusAnnotations.columns
+    columns = {'subject': 'subject', 'visit_code': 'visit_code'}
+
+    def __init__(self, visits=None, status_class=None, by_encounter=False, **kwargs):
+        self.visits = Visit.objects.all() if visits is None else visits
+        if by_encounter:
+            self.group_by = self.group_by + ['encounter']
+            self.columns = dict(self.columns, encounter='encounter')
+        if not any(name in kwargs for name in ['tested', 'documented', 'indirect', 'verbal']):
+            kwargs.update(SubjectHivStatus.sources)
+            status_class = status_class or SubjectHivStatus.status_class
+        self.annotations = StatusAnnotations(
+            self.visits.model, status_class=status_class, columns=self.columns, **kwargs)
+
+    def __iter__(self):
+        return iter(self.queryset())
+
+    def queryset(self):
+        """Returns a values() queryset of the counts per group ordered by group."""
+        fields = sorted(self.columns.values())
+        return self.annotations.annotate(self.visits, fields=fields).values(*self.group_by).annotate(
+            **self.aggregates()).order_by(*self.group_by)
+
+    def aggregates(self):
+        return {
+            'subjects': Count(self.columns['subject']),
+            'pos': self.count(Q(result=POS)),
+            'neg': self.count(Q(result=NEG)),
+            'unknown': self.count(Q(result__isnull=True)),
+            'subject_aware': self.count(Q(subject_aware=True)),
+            'newly_positive': self.count(Q(newly_positive=True)),
+        }
+
+    def count(self, condition):
+        """Returns an aggregate counting the rows, one per subject and group, that match condition."""
+        return Count(Case(When(condition, then=Value(1)), output_field=IntegerField()))
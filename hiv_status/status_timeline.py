@@ -0,0 +1,113 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import reduce
+
+from edc_constants.constants import POS, NEG
+
+from .status import Status
+from .status_batch import StatusBatch
+
+
+class StatusTimeline(StatusBatch):
+
+    """Computes the Status of each of many subjects as of each of many reference dates.
+
+    Each source model is fetched once per chunk of subjects, not once per date. The
+    rows of a subject are sorted once and swept through the sorted reference dates,
+    selecting the latest and previous instance as of each date. These are passed to
+    `status_class` so that each Status is decided exactly as for a single subject.
+    Iterating yields (subject, [(reference_date, status), ...]):
+
+        >>> for subject, timeline in Status.timeline(
+        ...         Subject.objects.all(), dates, tested=HivResult, documented=HivStatusReview):
+        ...     print(subject, [(d, str(status), status.subject_aware) for d, status in timeline])
+
+    The status as of a date is that of a Status with reference_date=date where only
+    the results on or before the date exist; previous, as always, only counts results
+    before the reference date. Results without a result datetime are on or before no
+    date and are skipped.
+    """
+
+    def __init__(self, subjects, reference_dates, **kwargs):
+        super(StatusTimeline, self).__init__(subjects, **kwargs)
+        self.reference_dates = sorted(reference_dates)
+
+    def statuses(self, subjects):
+        """Returns a list of (subject, [(reference_date, status), ...]) for a chunk of subjects."""
+        rows = self.rows([subject.id for subject in subjects])
+        latest_limits = [self.prototype.zero_time(d + timedelta(days=1)) for d in self.reference_dates]
+        previous_limits = [self.prototype.zero_time(d) for d in self.reference_dates]
+        options = dict(self.sources, **self.status_options)
+        timelines = []
+        for subject in subjects:
+            selected = {}
+            for name, subject_rows in rows.items():
+                if name == 'previous':
+                    selected[name] = self.previous_sweep(subject_rows[subject.id], previous_limits)
+                else:
+                    selected[name] = self.latest_sweep(name, subject_rows[subject.id], latest_limits)
+            timeline = []
+            for n, reference_date in enumerate(self.reference_dates):
+                options['reference_date'] = reference_date
+                instances = {name: instances[n] for name, instances in selected.items()}
+                timeline.append((reference_date, self.status_class(subject, instances=instances, **options)))
+            timelines.append((subject, timeline))
+        return timelines
+
+    def rows(self, subject_ids):
+        """Returns a dictionary of name: {subject id: [instance, ...]} for each source that
+        is a model, including 'previous'."""
+        rows = {}
+        for name, model in self.models():
+            if name == 'previous':
+                options = self.prototype.options(name, result_list=[POS, NEG])
+                queryset = self.queryset(model, name, options, subject_ids)
+            else:
+                queryset = self.latest_queryset(model, name, subject_ids)
+            rows[name] = defaultdict(list)
+            for instance in queryset:
+                rows[name][getattr(instance, self.subject_id_attr)].append(instance)
+        return rows
+
+    def latest_sweep(self, name, rows, limits):
+        """Returns a list of the latest instance, as by get_latest_by, of those dated before
+        each limit."""
+        rows = self.by_datetime(name, rows)
+        selected, instance, n = [], None, 0
+        for limit in limits:
+            while n < len(rows) and rows[n][0] < limit:
+                if instance is None or self.latest_by(name, rows[n][1]) >= self.latest_by(name, instance):
+                    instance = rows[n][1]
+                n += 1
+            selected.append(instance)
+        return selected
+
+    def previous_sweep(self, rows, limits):
+        """Returns a list of the earliest POS, or if none, the earliest NEG instance of those
+        dated on or before each limit, see Status.previous_instance."""
+        rows = self.by_datetime('previous', rows)
+        result_value_attr = self.prototype.attrs('previous')[Status.RESULT_VALUE_ATTR]
+        selected, earliest, n = [], {}, 0
+        for limit in limits:
+            while n < len(rows) and rows[n][0] <= limit:
+                earliest.setdefault(getattr(rows[n][1], result_value_attr), rows[n][1])
+                n += 1
+            selected.append(earliest.get(POS) or earliest.get(NEG))
+        return selected
+
+    def by_datetime(self, name, rows):
+        """Returns a list of (datetime, instance) sorted by the result datetime of 'name',
+        skipping instances without one."""
+        result_datetime_attr = self.prototype.attrs(name)[Status.RESULT_DATETIME_ATTR]
+        dated = ((self.as_datetime(getattr(instance, result_datetime_attr)), instance) for instance in rows)
+        return sorted((row for row in dated if row[0] is not None), key=lambda row: row[0])
+
+    def latest_by(self, name, instance):
+        """Returns a key ordering instances by get_latest_by, nulls first as SQLite orders them."""
+        value = reduce(getattr, self.get_latest_by(name).split('__'), instance)
+        return (0, ) if value is None else (1, value)
+
+    def as_datetime(self, value):
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return self.prototype.zero_time(value)
+        return value
@@ -0,0 +1,45 @@
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from hiv_status.models import HivResult, Visit
+
+
+class StatusTestMixin:
+
+    """Creates visits and tested results and compares statuses with those of Status."""
+
+    encounter = 0
+
+    def create_visit(self, subject, visit_datetime, visit_code=None):
+        self.encounter += 1
+        return Visit.objects.create(
+            subject=subject,
+            visit_code=visit_code or '1000',
+            encounter=self.encounter,
+            visit_datetime=visit_datetime)
+
+    def create_results(self, subject, results, visit_code=None, base_datetime=None):
+        """Creates a visit a month apart for each result, the last a month before base_datetime
+        (default: now), and a HivResult of the result on it. Returns the visits."""
+        base_datetime = (base_datetime or timezone.now()) - relativedelta(months=len(results))
+        visits = []
+        for m, result in enumerate(results):
+            visit = self.create_visit(subject, base_datetime + relativedelta(months=m), visit_code)
+            HivResult.objects.create(
+                visit=visit,
+                result_value=result,
+                result_datetime=visit.visit_datetime)
+            visits.append(visit)
+        return visits
+
+    def assert_same_status(self, status, expected, attrs=None, date_attr='result_date'):
+        """Asserts status has the value, the results and their date_attr of attrs (default: all
+        sources), subject_aware and newly_positive of the Status expected.
+
+        Results of string sources are dated now, so compare their result_date only."""
+        self.assertEqual(status, expected)
+        for attr in attrs or ['tested', 'previous', 'documented', 'indirect', 'verbal']:
+            self.assertEqual(getattr(status, attr), getattr(expected, attr))
+            self.assertEqual(getattr(getattr(status, attr), date_attr), getattr(getattr(expected, attr), date_attr))
+        self.assertEqual(status.subject_aware, expected.subject_aware)
+        self.assertEqual(status.newly_positive, expected.newly_positive)
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import TransactionTestCase
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.async_status import AsyncStatus
+from hiv_status.models import HivResult, Subject, HivStatusReview
+from hiv_status.status import Status
+
+from .mixins import StatusTestMixin
+
+
+class TestAsyncStatus(StatusTestMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        self.create_results(self.subject, [NEG, POS])
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def aresolve(self, status_class, **kwargs):
+        return self.loop.run_until_complete(status_class.aresolve(self.subject, **kwargs))
+
+    def test_same_as_status(self):
+        for kwargs in [dict(tested=HivResult, documented=HivStatusReview),
+                       dict(tested=HivResult, documented=HivStatusReview, result_list=[NEG]),
+                       dict(documented=POS, indirect=NEG, verbal=POS, include_verbal=True)]:
+            status = Status(self.subject, **kwargs)
+            async_status = self.aresolve(AsyncStatus, **kwargs)
+            self.assertEqual(async_status, status)
+            for attr in ['tested', 'previous', 'documented', 'indirect', 'verbal']:
+                self.assertEqual(getattr(async_status, attr), getattr(status, attr))
+            self.assertEqual(async_status.subject_aware, status.subject_aware)
+            self.assertEqual(async_status.newly_positive, status.newly_positive)
+
+    def test_previous(self):
+        status = self.aresolve(AsyncStatus, tested=HivResult)
+        self.assertEqual(status, POS)
+        self.assertEqual(status.previous, '')  # the earliest POS is the tested result
+        self.assertTrue(status.newly_positive)
+
+    def test_lookups_in_executor(self):
+        threads = set()
+        barrier = threading.Barrier(3, timeout=5)
+
+        def source(status, name):
+            threads.add(threading.current_thread())
+            barrier.wait()  # the documented, indirect and verbal lookups run at the same time
+            return POS if name == 'indirect' else None
+
+        class ExecutorStatus(AsyncStatus):
+            executor = ThreadPoolExecutor(4)
+        status = self.aresolve(ExecutorStatus, documented=source, indirect=source, verbal=source)
+        ExecutorStatus.executor.shutdown()
+        self.assertEqual(status, POS)
+        self.assertEqual(status.result.name, 'indirect')
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.current_thread(), threads)
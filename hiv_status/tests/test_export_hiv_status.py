@@ -0,0 +1,57 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+from dateutil.relativedelta import relativedelta
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import Subject
+
+from .mixins import StatusTestMixin
+
+
+class TestExportHivStatus(StatusTestMixin, TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        self.create_results(self.subject, [NEG, POS])
+        Subject.objects.create(subject_identifier='987654321')
+
+    def test_csv(self):
+        out = StringIO()
+        call_command('export_hiv_status', chunk_size=1, stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual([row['subject_identifier'] for row in rows], ['123456789', '987654321'])
+        self.assertEqual(rows[0]['result'], POS)
+        self.assertEqual(rows[0]['source'], 'tested')
+        self.assertEqual(rows[1]['result'], '')
+
+    def test_jsonl_gzip(self):
+        path = os.path.join(tempfile.mkdtemp(), 'hiv_status.jsonl.gz')
+        out = StringIO()
+        call_command('export_hiv_status', format='jsonl', output=path, stdout=out)
+        self.assertIn('2 subjects', out.getvalue())
+        with gzip.open(path, 'rt') as f:
+            rows = [json.loads(line) for line in f]
+        os.remove(path)
+        self.assertEqual(rows[0]['result'], POS)
+        self.assertTrue(rows[0]['newly_positive'])
+        self.assertIsNone(rows[1]['result'])
+
+    def test_reference_date(self):
+        self.create_results(self.subject, [POS], base_datetime=timezone.now() + relativedelta(months=1))
+        out = StringIO()
+        call_command('export_hiv_status', format='jsonl', stdout=out)
+        self.assertEqual(json.loads(out.getvalue().splitlines()[0])['previous'], POS)
+        out = StringIO()
+        reference_date = (timezone.now() - relativedelta(weeks=6)).date()
+        call_command('export_hiv_status', format='jsonl', reference_date=reference_date.isoformat(), stdout=out)
+        self.assertEqual(json.loads(out.getvalue().splitlines()[0])['previous'], NEG)
+        self.assertRaises(CommandError, call_command, 'export_hiv_status', reference_date='01/02/2016')
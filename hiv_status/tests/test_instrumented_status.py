@@ -0,0 +1,104 @@
+import socket
+
+from datetime import date
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.instrumented_status import InstrumentedStatus, QueryCounter
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview
+from hiv_status.status import Status
+from hiv_status.status_metrics import LoggingSink, MemorySink, StatsdSink, StatusMetrics
+
+
+class TestInstrumentedStatus(TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        for encounter, result in enumerate([NEG, POS]):
+            visit = Visit.objects.create(
+                subject=self.subject, visit_code='1000', encounter=encounter,
+                visit_datetime=timezone.now() - relativedelta(months=2 - encounter))
+            HivResult.objects.create(visit=visit, result_value=result, result_datetime=visit.visit_datetime)
+        HivStatusReview.objects.create(visit=visit, documented_result=POS, documented_result_date=date(2001, 1, 1))
+
+        class MetricsStatus(InstrumentedStatus):
+            metrics = StatusMetrics(sink=MemorySink())
+
+        self.status_class = MetricsStatus
+
+    def test_stages(self):
+        with self.assertNumQueries(3):
+            status = self.status_class(self.subject, tested=HivResult, documented=HivStatusReview)
+        self.assertEqual(status, Status(self.subject, tested=HivResult, documented=HivStatusReview))
+        self.assertEqual(list(status.queries.items()), [
+            ('tested', 1), ('previous', 1), ('documented', 1), ('merge', 0), ('indirect', 0),
+            ('verbal', 0), ('total', 3)])
+        self.assertEqual(list(status.timings), list(status.queries))
+        self.assertGreaterEqual(status.timings['total'], sum(status.timings.values()) - status.timings['total'])
+
+    def test_values(self):
+        status = self.status_class(self.subject, tested=POS, documented=NEG)
+        self.assertEqual(status.queries['total'], 0)
+        self.assertEqual(status, POS)
+
+    def test_metrics(self):
+        for _ in range(3):
+            self.status_class(self.subject, tested=HivResult, documented=HivStatusReview)
+        metrics = self.status_class.metrics
+        summary = metrics.summary()
+        self.assertEqual(summary['count'], 3)
+        self.assertEqual(summary['tested.queries.p50'], 1)
+        self.assertEqual(summary['total.queries.p99'], 3)
+        self.assertIn('previous.ms.p95', summary)
+        self.assertEqual(metrics.flush(), summary)
+        self.assertEqual(metrics.sink.sent, [summary])
+        self.assertEqual(metrics.summary()['count'], 0)
+        metrics.flush()
+        self.assertEqual(len(metrics.sink.sent), 1)
+
+    def test_flush_every(self):
+        self.status_class.metrics.flush_every = 2
+        for _ in range(5):
+            self.status_class(self.subject, tested=HivResult)
+        self.assertEqual([summary['count'] for summary in self.status_class.metrics.sink.sent], [2, 2])
+
+    def test_query_counter(self):
+        with QueryCounter() as counter:
+            with QueryCounter() as inner:
+                list(Subject.objects.all())
+            list(Visit.objects.all())
+        self.assertEqual((counter.count, inner.count), (2, 1))
+        self.assertNotIn('make_cursor', vars(connection))
+        self.assertNotIn('make_debug_cursor', vars(connection))
+
+
+class TestStatusMetrics(TestCase):
+
+    def test_histogram(self):
+        metrics = StatusMetrics(maxlen=100)
+        for value in range(200, 0, -1):
+            metrics.add('tested.ms', value)
+        self.assertEqual(list(metrics.histogram('tested.ms').items()), [('p50', 50), ('p95', 95), ('p99', 99)])
+        self.assertEqual(metrics.histogram('verbal.ms'), {'p50': None, 'p95': None, 'p99': None})
+
+    def test_logging_sink(self):
+        with self.assertLogs('hiv_status.metrics', level='INFO') as logs:
+            LoggingSink().send({'count': 2, 'tested.ms.p50': 1.5})
+        self.assertEqual(logs.output, ['INFO:hiv_status.metrics:count=2 tested.ms.p50=1.5'])
+
+    def test_statsd_sink(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(5)
+        self.addCleanup(receiver.close)
+        sink = StatsdSink(*receiver.getsockname())
+        sink.max_packet_size = 60
+        sink.send({'count': 2, 'tested.ms.p50': 1.5, 'tested.queries.p50': 1})
+        packets = [receiver.recv(512).decode('utf-8') for _ in range(2)]
+        self.assertEqual(packets, [
+            'hiv_status.count:2|g\nhiv_status.tested.ms.p50:1.5|g',
+            'hiv_status.tested.queries.p50:1|g'])
@@ -0,0 +1,49 @@
+from itertools import product
+
+from django.test import TestCase
+
+from edc_constants.constants import POS, NEG, IND
+
+from hiv_status.lazy_status import LazyStatus
+from hiv_status.models import HivResult, Subject, HivStatusReview
+from hiv_status.status import Status
+
+from .mixins import StatusTestMixin
+
+
+class TestLazyStatus(StatusTestMixin, TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+
+    def assert_same_as_status(self, **kwargs):
+        self.assert_same_status(LazyStatus(self.subject, **kwargs), Status(self.subject, **kwargs))
+
+    def test_same_as_status_for_strings(self):
+        values = [POS, NEG, IND, None]
+        for tested, documented, indirect, verbal, include_verbal in product(
+                values, values, values, values, [True, False]):
+            self.assert_same_as_status(
+                tested=tested, documented=documented, indirect=indirect, verbal=verbal,
+                include_verbal=include_verbal)
+
+    def test_same_as_status_for_models(self):
+        self.create_results(self.subject, [NEG, POS, NEG])
+        self.assert_same_as_status(tested=HivResult, documented=HivStatusReview)
+        self.assert_same_as_status(tested=HivResult, documented=HivStatusReview, result_list=[NEG])
+
+    def test_tested_pos_queries_tested_only(self):
+        self.create_results(self.subject, [NEG, POS])
+        status = LazyStatus(self.subject, tested=HivResult, documented=HivStatusReview, verbal=HivStatusReview)
+        with self.assertNumQueries(1):
+            self.assertEqual(str(status), POS)
+
+    def test_verbal_not_queried(self):
+        status = LazyStatus(self.subject, tested=HivResult, documented=HivStatusReview, verbal=HivStatusReview)
+        with self.assertNumQueries(2):
+            self.assertEqual(str(status), '')
+
+    def test_newly_positive_not_tested(self):
+        status = LazyStatus(self.subject, tested=HivResult, documented=HivStatusReview)
+        with self.assertNumQueries(1):
+            self.assertFalse(status.newly_positive)
@@ -0,0 +1,143 @@
+from datetime import datetime
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview
+from hiv_status.result_index import IndexedStatus, IndexedStatusMixin, ResultIndex, result_index
+from hiv_status.status import Status
+
+from .mixins import StatusTestMixin
+
+
+class TestResultIndex(StatusTestMixin, TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        self.visits = [
+            self.create_visit(self.subject, timezone.now() - relativedelta(months=4 - m)) for m in range(4)]
+        self.index = ResultIndex(sources={'tested': HivResult, 'documented': HivStatusReview})
+
+        class TestIndexedStatus(IndexedStatusMixin, Status):
+            result_index = self.index
+        self.status_class = TestIndexedStatus
+
+    def create_result(self, visit, result):
+        hiv_result = HivResult.objects.create(visit=visit, result_value=result, result_datetime=visit.visit_datetime)
+        self.index.update(hiv_result)
+        return hiv_result
+
+    def assert_same_as_status(self, **kwargs):
+        kwargs = dict(dict(tested=HivResult, documented=HivStatusReview), **kwargs)
+        with self.assertNumQueries(0):
+            indexed_status = self.status_class(self.subject, **kwargs)
+        self.assert_same_status(
+            indexed_status, Status(self.subject, **kwargs), attrs=['tested', 'previous', 'documented'])
+
+    def test_same_as_status(self):
+        self.create_result(self.visits[0], NEG)
+        self.create_result(self.visits[1], POS)
+        self.create_result(self.visits[2], NEG)
+        d = self.visits[1].visit_datetime
+        self.index.update(HivStatusReview.objects.create(
+            visit=self.visits[1], documented_result=POS, documented_result_date=datetime(d.year, d.month, d.day)))
+        self.index.load()
+        self.assert_same_as_status()
+        self.assert_same_as_status(result_list=[NEG])
+        self.assert_same_as_status(reference_date=self.visits[1].visit_datetime.date())
+
+    def test_update_and_remove(self):
+        self.index.load()
+        self.assert_same_as_status()
+        hiv_result = self.create_result(self.visits[0], NEG)
+        self.create_result(self.visits[3], POS)
+        self.assert_same_as_status()
+        hiv_result.result_value = POS
+        hiv_result.save()
+        self.index.update(hiv_result)
+        self.assert_same_as_status()
+        self.assertEqual(self.status_class(self.subject, tested=HivResult).previous, POS)
+        self.index.remove(hiv_result)
+        hiv_result.delete()
+        self.assert_same_as_status()
+
+    def test_latest_before(self):
+        self.create_result(self.visits[0], POS)
+        self.create_result(self.visits[2], POS)
+        self.index.load()
+        row = self.index.latest('tested', self.subject.id, [POS], before=self.visits[1].visit_datetime)
+        self.assertEqual(row.visit, self.visits[0].pk)
+        self.assertIsNone(self.index.latest('tested', self.subject.id, [NEG]))
+
+    def test_undated_result(self):
+        # .latest() orders NULL result datetimes last on SQLite, first on PostgreSQL
+        undated = HivResult.objects.create(visit=self.visits[1], result_value=POS)
+        self.index.load()
+        self.assertEqual(self.index.latest('tested', self.subject.id, [POS]).pk, undated.pk)
+        self.assertIsNone(self.index.latest('tested', self.subject.id, [POS], before=self.visits[3].visit_datetime))
+        self.assert_same_as_status()
+        self.create_result(self.visits[2], NEG)
+        self.assert_same_as_status()
+        self.index.nulls_largest['tested'] = True
+        self.assertEqual(self.index.latest('tested', self.subject.id, [POS, NEG]).pk, undated.pk)
+        undated.result_datetime = self.visits[1].visit_datetime
+        undated.save()
+        self.index.update(undated)
+        self.assert_same_as_status()
+        self.assert_same_as_status(result_list=[POS, NEG])
+
+    def test_max_age(self):
+        self.index.max_age = 60
+        self.index.load()
+        hiv_result = HivResult.objects.create(
+            visit=self.visits[0], result_value=POS, result_datetime=self.visits[0].visit_datetime)
+        self.assertIsNone(self.index.latest('tested', self.subject.id, [POS]))
+        self.index.loaded_at -= 61
+        with self.assertNumQueries(2):
+            self.assertEqual(self.index.latest('tested', self.subject.id, [POS]).pk, hiv_result.pk)
+
+    def test_compact_rows(self):
+        hiv_result = self.create_result(self.visits[0], POS)
+        self.index.load()
+        self.assertEqual(self.index.entries['tested'][self.subject.id][POS], (
+            [hiv_result.result_datetime], [(hiv_result.pk, self.visits[0].pk)], []))
+        row = self.index.latest('tested', self.subject.id, [POS])
+        self.assertEqual((row.pk, row.result_value, row.result_datetime, row.visit), (
+            hiv_result.pk, POS, hiv_result.result_datetime, self.visits[0].pk))
+
+    def test_visit_options_not_indexed(self):
+        self.index.load()
+        with self.assertNumQueries(1):
+            self.status_class(self.subject, tested=HivResult, visit_code='1000')
+
+
+class TestResultIndexSignals(StatusTestMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        self.visit = self.create_visit(self.subject, timezone.now() - relativedelta(months=1))
+        result_index.load()
+        self.addCleanup(result_index.clear)
+
+    def test_signals(self):
+        hiv_result = HivResult.objects.create(
+            visit=self.visit, result_value=POS, result_datetime=self.visit.visit_datetime)
+        self.assertEqual(result_index.latest('tested', self.subject.id, [POS]).pk, hiv_result.pk)
+        with transaction.atomic():
+            hiv_result.delete()
+            self.assertIsNotNone(result_index.latest('tested', self.subject.id, [POS]))
+        self.assertIsNone(result_index.latest('tested', self.subject.id, [POS]))
+
+    def test_rolled_back(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                HivResult.objects.create(
+                    visit=self.visit, result_value=POS, result_datetime=self.visit.visit_datetime)
+                raise ValueError()
+        self.assertEqual(HivResult.objects.count(), 0)
+        self.assertIsNone(result_index.latest('tested', self.subject.id, [POS]))
+        self.assertEqual(IndexedStatus(self.subject, tested=HivResult), None)
@@ -1,5 +1,8 @@
+import pickle
 import unittest
 
+from datetime import date, datetime
+
 from edc_constants.constants import POS, NEG, UNK
 
 from hiv_status.status import SimpleStatus, ResultWrapper
@@ -31,6 +34,18 @@ class TestWrapper(unittest.TestCase):
         a = ResultWrapper(None, name='tested')
         self.assertEqual(a.name, 'tested')
 
+    def test_wrapper_immutable(self):
+        a = ResultWrapper('POS', result_datetime=datetime(2016, 1, 31, 10, 0))
+        self.assertRaises(AttributeError, setattr, a, 'result_value', 'NEG')
+        self.assertFalse(hasattr(a, '__dict__'))
+        self.assertEqual(a.result_date, date(2016, 1, 31))
+        self.assertIs(a.result_value, ResultWrapper(''.join(['PO', 'S'])).result_value)
+
+    def test_wrapper_pickle(self):
+        a = pickle.loads(pickle.dumps(ResultWrapper('POS', result_datetime=datetime(2016, 1, 31), name='tested')))
+        self.assertEqual(a, 'POS')
+        self.assertEqual((a.result_date, a.name), (date(2016, 1, 31), 'tested'))
+
 
 class TestSimpleStatus(unittest.TestCase):
 
@@ -0,0 +1,101 @@
+from datetime import date
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+from dateutil.relativedelta import relativedelta
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.instrumented_status import InstrumentedStatus
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview
+from hiv_status.slow_lookups import IndexAdvisor, SlowLookupLog
+from hiv_status.status import Status
+from hiv_status.status_metrics import StatusMetrics
+
+
+class SubjectVisitStatus(Status):
+
+    """A Status whose source models have a subject_visit, e.g. as in bcpp."""
+
+    lookup_options = dict(Status.lookup_options, default=[
+        'subject_visit__subject__id', 'result_value__in', 'subject_visit__visit_code', 'subject_visit__encounter'])
+
+    field_attr = dict(Status.field_attr, default=['result_value', 'result_datetime', 'subject_visit'])
+
+
+class TestSlowLookups(TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        for encounter, result in enumerate([NEG, POS]):
+            visit = Visit.objects.create(
+                subject=self.subject, visit_code='1000', encounter=encounter,
+                visit_datetime=timezone.now() - relativedelta(months=2 - encounter))
+            HivResult.objects.create(visit=visit, result_value=result, result_datetime=visit.visit_datetime)
+        HivStatusReview.objects.create(visit=visit, documented_result=POS, documented_result_date=date(2001, 1, 1))
+
+    def test_slow_lookup_log(self):
+
+        class SlowStatus(InstrumentedStatus):
+            metrics = StatusMetrics()
+            slow_lookup_log = SlowLookupLog(threshold=0)
+
+        with self.assertLogs('hiv_status.slow_lookups', level='WARNING') as logs:
+            status = SlowStatus(self.subject, tested=HivResult, documented=HivStatusReview)
+        self.assertEqual([query.stage for query in status.slow_queries], ['tested', 'previous', 'documented'])
+        self.assertEqual(len(logs.output), 3)
+        self.assertIn('Slow lookup tested of SlowStatus for subject {}'.format(self.subject.id), logs.output[0])
+        self.assertIn('hiv_status_hivresult', logs.output[0])
+        self.assertRegex(logs.output[0], r'Plan:\n    .*(SEARCH|SCAN)')
+
+    def test_no_threshold(self):
+
+        class QuietStatus(InstrumentedStatus):
+            metrics = StatusMetrics()
+            slow_lookup_log = SlowLookupLog()
+
+        with self.assertNumQueries(3):
+            status = QuietStatus(self.subject, tested=HivResult, documented=HivStatusReview)
+        self.assertEqual(status.slow_queries, [])
+
+    def test_index_advisor(self):
+        advisor = IndexAdvisor(Status)
+        self.assertEqual(advisor.index('tested', HivResult), ('visit', 'result_value', 'result_datetime'))
+        self.assertEqual(advisor.index('previous', HivResult), ('visit', 'result_value', 'result_datetime'))
+        self.assertEqual(
+            advisor.existing(HivResult, ('visit', 'result_value')), ('visit', 'result_value', 'result_datetime'))
+        self.assertIsNone(advisor.existing(HivResult, ('result_value', 'visit')))
+        plan = [
+            '2 | 0 | 0 | SCAN TABLE hiv_status_hivresult',
+            '3 | 0 | 0 | SEARCH TABLE hiv_status_visit USING INDEX',
+            '4 | 0 | 0 | SCAN TABLE hiv_status_visit USING COVERING INDEX',
+            '5 | 0 | 0 | USE TEMP B-TREE FOR ORDER BY']
+        self.assertEqual(advisor.warnings('sqlite', plan), [plan[0], plan[3]])
+        self.assertEqual(advisor.warnings('postgresql', ['Sort  (cost=1.02..1.03)', 'Index Scan using x']),
+                         ['Sort  (cost=1.02..1.03)'])
+
+    def test_explain_hiv_status(self):
+        out = StringIO()
+        call_command('explain_hiv_status', sample=5, threshold_ms=0, stdout=out)
+        output = out.getvalue()
+        self.assertIn('Replayed the lookups of 1 subjects with hiv_status.status.Status.', output)
+        self.assertRegex(output, r'\ntested\s+1\s')
+        self.assertIn('tested (hiv_status.HivResult) - slowest query', output)
+        self.assertIn("Index ('visit', 'result_value', 'result_datetime') is covered by", output)
+        self.assertIn('documented (hiv_status.HivStatusReview)', output)
+
+    def test_explain_hiv_status_sources(self):
+        out = StringIO()
+        call_command('explain_hiv_status', tested='hiv_status.HivResult', subject_model='hiv_status.Subject',
+                     stdout=out)
+        output = out.getvalue()
+        self.assertIn('tested (hiv_status.HivResult) - slowest query', output)
+        self.assertNotIn('documented (', output)
+
+    def test_explain_hiv_status_invalid(self):
+        status_class = 'hiv_status.tests.test_slow_lookups.SubjectVisitStatus'
+        self.assertRaisesRegex(CommandError, 'Cannot replay .*SubjectVisitStatus', call_command,
+                               'explain_hiv_status', status_class=status_class, tested='hiv_status.HivResult')
+        for options in [{'tested': 'hiv_status.Nope'}, {'tested': 'HivResult'}, {'subject_model': 'x.Subject'}]:
+            self.assertRaisesRegex(CommandError, 'Invalid model', call_command, 'explain_hiv_status', **options)
@@ -0,0 +1,78 @@
+from django.test import TestCase
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview
+from hiv_status.result_wrapper import ResultWrapper
+from hiv_status.source_adapters import (
+    SourceAdapter, SourceAdapters, ModelAdapter, QuerySetAdapter, ValueAdapter, source_adapters)
+from hiv_status.status import Status
+
+
+class TestSourceAdapters(TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        for m, result in enumerate([NEG, POS, NEG]):
+            visit = Visit.objects.create(
+                subject=self.subject,
+                visit_code='{}000'.format(m + 1),
+                encounter=m,
+                visit_datetime=timezone.now() - relativedelta(months=3 - m))
+            HivResult.objects.create(
+                visit=visit,
+                result_value=result,
+                result_datetime=visit.visit_datetime)
+
+    def test_adapter(self):
+        self.assertIsInstance(source_adapters.adapter(HivResult), ModelAdapter)
+        self.assertIsInstance(source_adapters.adapter(HivResult.objects.all()), QuerySetAdapter)
+        self.assertIsInstance(source_adapters.adapter(POS), ValueAdapter)
+        self.assertIs(source_adapters.adapter(HivStatusReview), source_adapters.cache[type(HivResult)])
+
+    def test_value_does_not_query(self):
+        with self.assertNumQueries(0):
+            status = Status(self.subject, tested=POS, documented=NEG)
+        self.assertEqual(status, POS)
+        self.assertEqual(status.previous, '')
+
+    def test_queryset(self):
+        status = Status(
+            self.subject, tested=HivResult.objects.filter(visit__visit_code__in=['1000', '3000']),
+            result_list=[NEG])
+        self.assertEqual(status.tested, NEG)
+        self.assertEqual(Visit.objects.get(pk=status.tested.visit).visit_code, '3000')
+        self.assertEqual(status.previous, NEG)
+        self.assertEqual(Visit.objects.get(pk=status.previous.visit).visit_code, '1000')
+
+    def test_result_wrapper(self):
+        tested = Status(self.subject, tested=HivResult).tested
+        status = Status(self.subject, indirect=tested)
+        self.assertEqual(status.indirect, POS)
+        self.assertEqual(status.indirect.name, 'indirect')
+        self.assertEqual(status.indirect.result_datetime, tested.result_datetime)
+
+    def test_callable(self):
+        def tested(status, name):
+            return HivResult if status.subject.subject_identifier == '123456789' else None
+        status = Status(self.subject, tested=tested)
+        self.assertEqual(status.tested, POS)
+        self.assertEqual(status.previous, '')
+        other = Subject.objects.create(subject_identifier='987654321')
+        self.assertEqual(Status(other, tested=tested).tested, '')
+
+    def test_register(self):
+        class UpperAdapter(SourceAdapter):
+            def accepts(self, source_type):
+                return issubclass(source_type, bytes)
+
+            def latest(self, status, source, name):
+                return ResultWrapper(source.decode().upper(), name=name)
+
+        class BytesStatus(Status):
+            source_adapters = SourceAdapters(source_adapters.adapters)
+        BytesStatus.source_adapters.register(UpperAdapter())
+        self.assertEqual(BytesStatus(self.subject, documented=b'pos'), POS)
+        self.assertIsInstance(source_adapters.adapter(b'pos'), ValueAdapter)
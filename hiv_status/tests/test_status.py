@@ -1,4 +1,5 @@
 from datetime import datetime
+from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
@@ -194,7 +195,7 @@ class TestStatus(TestCase):
         hiv_result.save()
         status = Status(subject=self.subject, tested=HivResult)
         self.assertEqual(status, POS)
-        self.assertEqual(status.result.visit, hiv_result.visit)
+        self.assertEqual(status.result.visit, hiv_result.visit_id)
         self.assertEqual(status.previous, POS)
         self.assertFalse(status.newly_positive)
         self.assertTrue(status.subject_aware)
@@ -220,7 +221,7 @@ class TestStatus(TestCase):
         self.assertEqual(status, NEG)
         status = Status(subject=self.subject, tested=HivResult, visit_code='2000', result_list=[POS, NEG])
         self.assertEqual(status, POS)
-        self.assertEqual(status.result.visit, hiv_result.visit)
+        self.assertEqual(status.result.visit, hiv_result.visit_id)
 
     def test_result_as_of_visit_code_and_encounter(self):
         self.create_visits(3, visit_code='1000', base_datetime=timezone.now() - relativedelta(years=2))
@@ -235,7 +236,7 @@ class TestStatus(TestCase):
         hiv_result.save()
         status = Status(subject=self.subject, tested=HivResult, visit_code='2000', encounter=1)
         self.assertEqual(status, POS)
-        self.assertEqual(status.result.visit, hiv_result.visit)
+        self.assertEqual(status.result.visit, hiv_result.visit_id)
 
     def test_result_as_of_visit_code_and_encounter2(self):
         self.create_visits(3, visit_code='1000', base_datetime=timezone.now() - relativedelta(years=2))
@@ -316,6 +317,92 @@ class TestStatus(TestCase):
         status = Status(subject=self.subject, tested=POS, documented=NEG)
         self.assertTrue(status.newly_positive)
 
+    def test_one_query_per_lookup(self):
+        self.create_visits(3)
+        for visit in Visit.objects.all():
+            HivResult.objects.create(
+                visit=visit,
+                result_value=POS,
+                result_datetime=visit.visit_datetime)
+        with self.assertNumQueries(3):
+            # tested, previous and documented
+            status = Status(subject=self.subject, tested=HivResult, documented=HivStatusReview)
+        self.assertEqual(status.result.visit, Visit.objects.all().order_by('-visit_datetime')[0].pk)
+
+    def test_previous_neg_one_query(self):
+        """Asserts POS and NEG previous results are looked up in one query."""
+        self.create_visits(3)
+        for visit in Visit.objects.order_by('visit_datetime'):
+            HivResult.objects.create(
+                visit=visit,
+                result_value=NEG,
+                result_datetime=visit.visit_datetime)
+        hiv_result = HivResult.objects.all().latest()
+        hiv_result.result_value = POS
+        hiv_result.save()
+        with self.assertNumQueries(2):
+            status = Status(subject=self.subject, tested=HivResult)
+        self.assertEqual(status.previous, NEG)
+        self.assertEqual(
+            status.previous.visit, Visit.objects.order_by('visit_datetime')[0].pk)
+
+    def test_fetch_values(self):
+        class ValuesStatus(Status):
+            fetch_values = True
+        self.create_visits(2)
+        for visit in Visit.objects.all():
+            HivResult.objects.create(
+                visit=visit,
+                result_value=POS,
+                result_datetime=visit.visit_datetime)
+        status = ValuesStatus(subject=self.subject, tested=HivResult)
+        visit = Visit.objects.all().order_by('-visit_datetime')[0]
+        self.assertEqual(status, POS)
+        self.assertEqual(status.result.visit, visit.pk)
+        self.assertEqual(status.result.result_datetime, visit.visit_datetime)
+        self.assertIsNone(status.result.instance)
+        self.assertEqual(status.previous, POS)
+        self.assertIsNone(status.previous.instance)
+
+    def test_keep_instances(self):
+        class InstanceStatus(Status):
+            keep_instances = True
+        self.create_visits(2)
+        for visit in Visit.objects.all():
+            HivResult.objects.create(visit=visit, result_value=POS, result_datetime=visit.visit_datetime)
+        visit = Visit.objects.all().order_by('-visit_datetime')[0]
+        with self.assertNumQueries(2):
+            status = Status(subject=self.subject, tested=HivResult)
+        self.assertEqual(status, POS)
+        self.assertEqual(status.result.visit, visit.pk)
+        self.assertIsNone(status.result.instance)
+        self.assertEqual(status.previous, POS)
+        self.assertIsNone(status.previous.instance)
+        with self.assertNumQueries(2):
+            # the visits are selected with the results
+            status = InstanceStatus(subject=self.subject, tested=HivResult)
+            self.assertEqual(status.result.visit, visit)
+        self.assertEqual(status.result.instance, HivResult.objects.get(visit=visit))
+        self.assertEqual(status.previous.visit.visit_datetime, Visit.objects.earliest().visit_datetime)
+
+    def test_plans(self):
+        class ReviewStatus(Status):
+            get_latest_by = {'default': 'report_datetime'}
+        plans = ReviewStatus.plans
+        self.assertEqual(plans['tested'].result_lookup, 'result_value__in')
+        self.assertEqual(plans['previous'].subject_lookup, 'visit__subject__id')
+        self.assertEqual(plans['documented'].result_datetime_attr, 'documented_result_date')
+        self.assertEqual(plans['verbal'].get_latest_by, 'report_datetime')
+        self.assertEqual(Status.plans['documented'].get_latest_by, 'documented_result_date')
+
+    def test_plans_misconfigured(self):
+        with self.assertRaises(ImproperlyConfigured):
+            class MissingLookup(Status):
+                lookup_options = dict(Status.lookup_options, tested=['visit__subject__id', 'result_value__in'])
+        with self.assertRaises(ImproperlyConfigured):
+            class EmptyAttr(Status):
+                field_attr = dict(Status.field_attr, verbal=['result_value', '', 'visit'])
+
 #     def test_longitudinal(self):
 #         self.create_visits(3)
 #         visit = Visit.objects.all()[0]
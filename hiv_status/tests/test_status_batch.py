@@ -0,0 +1,92 @@
+from datetime import datetime
+from django.test import TestCase
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview
+from hiv_status.status import Status
+from hiv_status.status_batch import StatusBatch
+from hiv_status.window_status_batch import WindowStatusBatch
+
+from .mixins import StatusTestMixin
+
+
+class TestStatusBatch(StatusTestMixin, TestCase):
+
+    def setUp(self):
+        self.subjects = []
+        # tested results in visit order per subject
+        for index, results in enumerate([
+                [NEG, NEG, POS], [NEG, POS, NEG, POS], [NEG, NEG], [POS], [], [NEG, POS]]):
+            subject = Subject.objects.create(subject_identifier='12345678{}'.format(index))
+            self.subjects.append(subject)
+            self.create_results(subject, results)
+        visit = Visit.objects.filter(subject=self.subjects[2]).order_by('visit_datetime')[0]
+        HivStatusReview.objects.create(
+            visit=visit,
+            documented_result=POS,
+            documented_result_date=datetime(2001, 1, 1))
+
+    def assert_same_as_status(self, statuses, **kwargs):
+        statuses = list(statuses)
+        self.assertEqual([status.subject for status in statuses], self.subjects)
+        for status in statuses:
+            expected = Status(status.subject, **kwargs)
+            self.assert_same_status(
+                status, expected, attrs=['result', 'tested', 'previous', 'documented', 'indirect', 'verbal'])
+            self.assert_same_visit(status.result, expected.result)
+
+    def assert_same_visit(self, result, expected):
+        self.assertEqual(result.visit, expected.visit)
+
+    def bulk(self, subjects, **kwargs):
+        return Status.bulk(subjects, **kwargs)
+
+    def test_bulk(self):
+        batch = Status.bulk(self.subjects, tested=HivResult, documented=HivStatusReview)
+        self.assertIsInstance(batch, StatusBatch)
+        self.assert_same_as_status(batch, tested=HivResult, documented=HivStatusReview)
+
+    def test_bulk_result_list(self):
+        self.assert_same_as_status(
+            self.bulk(self.subjects, tested=HivResult, result_list=[NEG]),
+            tested=HivResult, result_list=[NEG])
+
+    def test_bulk_visit_code(self):
+        self.create_results(self.subjects[0], [POS], visit_code='2000')
+        self.assert_same_as_status(
+            self.bulk(self.subjects, tested=HivResult, visit_code='1000'),
+            tested=HivResult, visit_code='1000')
+
+    def test_bulk_strings(self):
+        self.assert_same_as_status(
+            self.bulk(self.subjects, tested=HivResult, indirect=POS),
+            tested=HivResult, indirect=POS)
+
+    def test_bulk_constant_queries(self):
+        with self.assertNumQueries(3):
+            list(Status.bulk(self.subjects, tested=HivResult, documented=HivStatusReview))
+        with self.assertNumQueries(6):
+            list(Status.bulk(self.subjects, tested=HivResult, documented=HivStatusReview, chunk_size=3))
+
+
+class TestWindowStatusBatch(TestStatusBatch):
+
+    def bulk(self, subjects, **kwargs):
+        return Status.bulk(subjects, batch_class=WindowStatusBatch, **kwargs)
+
+    def test_bulk(self):
+        batch = self.bulk(self.subjects, tested=HivResult, documented=HivStatusReview)
+        self.assertIsInstance(batch, WindowStatusBatch)
+        self.assert_same_as_status(batch, tested=HivResult, documented=HivStatusReview)
+
+    def assert_same_visit(self, result, expected):
+        # rows are ResultValues, as with Status.fetch_values
+        self.assertIsNone(result.instance)
+        self.assertEqual(result.visit, expected.visit)
+
+    def test_bulk_constant_queries(self):
+        with self.assertNumQueries(1):
+            list(self.bulk(self.subjects, tested=HivResult, documented=HivStatusReview))
+        with self.assertNumQueries(2):
+            list(self.bulk(self.subjects, tested=HivResult, documented=HivStatusReview, chunk_size=3))
@@ -0,0 +1,95 @@
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview
+from hiv_status.status import Status
+from hiv_status.status_cache import StatusCache, status_cache
+
+
+class TestStatusCache(TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        self.visit = Visit.objects.create(
+            subject=self.subject, visit_code='1000', encounter=0, visit_datetime=timezone.now())
+        HivResult.objects.create(
+            visit=self.visit, result_value=NEG, result_datetime=self.visit.visit_datetime)
+        self.cache = StatusCache(maxsize=2)
+
+    def test_hit(self):
+        status = self.cache.get_status(self.subject, tested=HivResult, result_list=[NEG])
+        self.assertEqual(status, NEG)
+        with self.assertNumQueries(0):
+            self.assertIs(self.cache.get_status(self.subject, tested=HivResult, result_list=[NEG]), status)
+        self.assertEqual(self.cache.cache_info().hits, 1)
+        self.assertEqual(self.cache.cache_info().misses, 1)
+
+    def test_key(self):
+        self.cache.get_status(self.subject, tested=HivResult)
+        self.cache.get_status(self.subject, tested=HivResult, documented=HivStatusReview)
+        self.cache.get_status(self.subject, tested=HivResult, visit_code='1000')
+        self.assertEqual(self.cache.cache_info().misses, 3)
+
+    def test_eviction(self):
+        self.cache.get_status(self.subject, tested=HivResult)
+        self.cache.get_status(self.subject, tested=HivResult, visit_code='1000')
+        self.cache.get_status(self.subject, tested=HivResult)
+        self.cache.get_status(self.subject, tested=HivResult, include_verbal=True)
+        self.assertEqual(self.cache.cache_info().evictions, 1)
+        self.assertEqual(self.cache.cache_info().currsize, 2)
+        self.cache.get_status(self.subject, tested=HivResult)
+        self.assertEqual(self.cache.cache_info().hits, 2)
+
+    def test_invalidated_on_save(self):
+        status_cache.clear()
+        self.assertEqual(Status.cached(self.subject, tested=HivResult), None)
+        HivResult.objects.create(
+            visit=Visit.objects.create(
+                subject=self.subject, visit_code='2000', encounter=0, visit_datetime=timezone.now()),
+            result_value=POS,
+            result_datetime=timezone.now())
+        self.assertEqual(Status.cached(self.subject, tested=HivResult), POS)
+        self.assertEqual(status_cache.cache_info().misses, 2)
+
+    def test_backend(self):
+        caches['default'].clear()
+        cache = StatusCache(backend='default')
+        status = cache.get_status(self.subject, tested=HivResult, result_list=[NEG])
+        other_process = StatusCache(backend='default')
+        with self.assertNumQueries(0):
+            self.assertEqual(other_process.get_status(self.subject, tested=HivResult, result_list=[NEG]), status)
+        self.assertEqual(other_process.cache_info().hits, 1)
+        other_process.invalidate(self.subject)
+        cache.get_status(self.subject, tested=HivResult, result_list=[NEG])
+        self.assertEqual(cache.cache_info().misses, 2)
+
+    def test_queryset_source_not_cached(self):
+        queryset = HivResult.objects.filter(result_value=NEG)
+        with self.assertNumQueries(0):
+            with self.assertRaises(TypeError):
+                self.cache.key(Status, self.subject, tested=queryset)
+        self.assertEqual(self.cache.get_status(self.subject, tested=queryset, result_list=[NEG]), NEG)
+        self.assertEqual(self.cache.cache_info().currsize, 0)
+
+
+class TestStatusCacheTransaction(TransactionTestCase):
+
+    def test_invalidated_on_commit(self):
+        subject = Subject.objects.create(subject_identifier='123456789')
+        status_cache.clear()
+        stale = Status.cached(subject, tested=HivResult)
+        self.assertEqual(stale, None)
+        with transaction.atomic():
+            HivResult.objects.create(
+                visit=Visit.objects.create(
+                    subject=subject, visit_code='1000', encounter=0, visit_datetime=timezone.now()),
+                result_value=POS,
+                result_datetime=timezone.now())
+            # a concurrent request, not seeing the insert yet, caches the status again
+            status_cache.store(subject.id, status_cache.key(Status, subject, tested=HivResult), stale)
+            self.assertIs(Status.cached(subject, tested=HivResult), stale)
+        self.assertEqual(Status.cached(subject, tested=HivResult), POS)
@@ -0,0 +1,45 @@
+import unittest
+
+from itertools import product
+
+from edc_constants.constants import POS, NEG, IND
+
+from hiv_status.simple_status import SimpleStatus
+from hiv_status.status import Status, SubjectWrapper
+from hiv_status.status_kernel import StatusKernel, np
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestStatusKernel(unittest.TestCase):
+
+    def setUp(self):
+        self.kernel = StatusKernel()
+        self.subject = SubjectWrapper(1, '123456789')
+
+    def test_truth_table(self):
+        """Asserts the kernel agrees with SimpleStatus and Status for every combination."""
+        values = [POS, NEG, IND, None]
+        for include_verbal in [True, False]:
+            rows = list(product(values, values, values, values))
+            arrays = self.kernel.evaluate(
+                *[self.kernel.encode(column) for column in zip(*rows)], include_verbal=include_verbal)
+            for n, (tested, documented, indirect, verbal) in enumerate(rows):
+                simple_status = SimpleStatus(
+                    tested=tested, documented=documented, indirect=indirect, verbal=verbal,
+                    include_verbal=include_verbal)
+                status = Status(
+                    self.subject, tested=tested, documented=documented, indirect=indirect, verbal=verbal,
+                    include_verbal=include_verbal)
+                self.assertEqual(self.kernel.values[arrays.result[n]], str(simple_status))
+                self.assertEqual(arrays.subject_aware[n], status.subject_aware)
+                self.assertEqual(arrays.newly_positive[n], status.newly_positive)
+
+    def test_include_verbal_per_subject(self):
+        none = self.kernel.encode([None, None])
+        verbal = self.kernel.encode([POS, POS])
+        arrays = self.kernel.evaluate(none, none, none, verbal, include_verbal=[True, False])
+        self.assertEqual(self.kernel.decode(arrays.result), [POS, ''])
+
+    def test_encode(self):
+        self.assertEqual(list(self.kernel.encode([POS, None, '', NEG])), [1, 0, 0, 2])
+        self.assertRaises(ValueError, self.kernel.encode, ['DWTA'])
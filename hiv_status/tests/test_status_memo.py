@@ -0,0 +1,107 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.lazy_status import LazyStatus
+from hiv_status.models import HivResult, Subject, SubjectHivStatus, Visit, HivStatusReview
+from hiv_status.status import Status
+from hiv_status.status_memo import StatusMemo, StatusMemoMiddleware
+
+
+class TestStatusMemo(TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        self.visit = Visit.objects.create(
+            subject=self.subject, visit_code='1000', encounter=0, visit_datetime=timezone.now())
+        HivResult.objects.create(
+            visit=self.visit, result_value=NEG, result_datetime=self.visit.visit_datetime)
+
+    def test_memoized(self):
+        with StatusMemo() as memo:
+            status = Status(self.subject, tested=HivResult, documented=HivStatusReview, result_list=[NEG])
+            with self.assertNumQueries(0):
+                self.assertIs(
+                    Status(self.subject, tested=HivResult, documented=HivStatusReview, result_list=[NEG]), status)
+            self.assertIsNot(Status(self.subject, tested=HivResult), status)
+            self.assertIsNot(LazyStatus(self.subject, tested=HivResult, documented=HivStatusReview,
+                                        result_list=[NEG]), status)
+        self.assertEqual(status, NEG)
+        self.assertEqual((memo.hits, memo.misses), (1, 3))
+        self.assertEqual(memo.cache_info().currsize, 0)
+
+    def test_not_active(self):
+        self.assertIsNone(StatusMemo.active())
+        status = Status(self.subject, tested=HivResult)
+        self.assertIsNot(Status(self.subject, tested=HivResult), status)
+
+    def test_not_memoized(self):
+        with StatusMemo() as memo:
+            Status(self.subject, HivResult)
+            Status(self.subject, HivResult)
+            Status(self.subject, tested=HivResult.objects.all())
+            Status(self.subject, tested=HivResult, instances={'tested': None, 'previous': None})
+        self.assertEqual((memo.hits, memo.misses), (0, 0))
+
+    def test_nested(self):
+        with StatusMemo() as outer:
+            Status(self.subject, tested=HivResult)
+            with StatusMemo() as inner:
+                self.assertIs(StatusMemo.active(), inner)
+                Status(self.subject, tested=HivResult)
+            self.assertIs(StatusMemo.active(), outer)
+        self.assertEqual((outer.misses, inner.misses), (1, 1))
+
+    def test_invalidated_on_save(self):
+        with StatusMemo():
+            self.assertEqual(Status(self.subject, tested=HivResult), None)
+            HivResult.objects.create(
+                visit=Visit.objects.create(
+                    subject=self.subject, visit_code='2000', encounter=0, visit_datetime=timezone.now()),
+                result_value=POS, result_datetime=timezone.now())
+            self.assertEqual(Status(self.subject, tested=HivResult), POS)
+
+    def test_subject_hiv_status_on_save(self):
+        visit = Visit.objects.create(
+            subject=self.subject, visit_code='2000', encounter=0, visit_datetime=timezone.now())
+        with StatusMemo():
+            self.assertEqual(Status(self.subject, **SubjectHivStatus.sources), None)
+            HivResult.objects.create(visit=visit, result_value=POS, result_datetime=timezone.now())
+            self.assertEqual(SubjectHivStatus.objects.get(subject=self.subject).result, POS)
+
+
+class TestStatusMemoMiddleware(TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        self.middleware = StatusMemoMiddleware()
+
+    def view(self, request):
+        for _ in range(3):
+            Status(self.subject, tested=HivResult, documented=HivStatusReview)
+        return HttpResponse()
+
+    def get(self):
+        request = RequestFactory().get('/')
+        self.middleware.process_request(request)
+        self.assertIs(StatusMemo.active(), request.hiv_status_memo)
+        response = self.middleware.process_response(request, self.view(request))
+        self.assertIsNone(StatusMemo.active())
+        return response
+
+    @override_settings(HIV_STATUS_MEMO_HEADER=True)
+    def test_header(self):
+        self.assertEqual(self.get()[StatusMemoMiddleware.header], 'saved=2; computed=1')
+
+    @override_settings(HIV_STATUS_MEMO_HEADER=False)
+    def test_no_header(self):
+        self.assertFalse(self.get().has_header(StatusMemoMiddleware.header))
+
+    def test_exception(self):
+        request = RequestFactory().get('/')
+        self.middleware.process_request(request)
+        self.middleware.process_exception(request, ValueError())
+        self.assertIsNone(StatusMemo.active())
+        self.middleware.process_response(request, HttpResponse())
@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import tempfile
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, HivStatusReview
+from hiv_status.status import Status
+from hiv_status.status_pool import StatusPool
+
+from .mixins import StatusTestMixin
+
+
+def result_value(status):
+    return str(status)
+
+
+class SubjectsMixin(StatusTestMixin):
+
+    def setUp(self):
+        self.subjects = []
+        for n, result in enumerate([POS, NEG, None, POS, NEG]):
+            subject = Subject.objects.create(subject_identifier='12345678{}'.format(n))
+            self.create_results(subject, [result] if result else [])
+            self.subjects.append(subject)
+
+
+class TestStatusPool(SubjectsMixin, TestCase):
+
+    def test_evaluate(self):
+        progress = []
+        pool = StatusPool(
+            processes=1, chunk_size=2, values=result_value, progress=lambda *args: progress.append(args),
+            tested=HivResult, documented=HivStatusReview, result_list=[POS, NEG])
+        values = pool.evaluate(Subject.objects.all())
+        self.assertEqual(values, {subject.pk: str(Status(subject, tested=HivResult, result_list=[POS, NEG]))
+                                  for subject in self.subjects})
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+
+    def test_default_values(self):
+        values = StatusPool(processes=1, tested=HivResult).evaluate(Subject.objects.all())
+        self.assertEqual(values[self.subjects[0].pk]['result'], POS)
+        self.assertTrue(values[self.subjects[0].pk]['newly_positive'])
+
+    def test_chunks(self):
+        pool = StatusPool(processes=2)
+        self.assertEqual(pool.chunks(list(range(20))), [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9, 10, 11],
+                                                        [12, 13, 14], [15, 16, 17], [18, 19]])
+        self.assertEqual(len(pool.chunks(list(range(10000)))[0]), 500)
+        self.assertEqual(pool.chunks([]), [])
+
+
+class TestStatusPoolProcesses(SubjectsMixin, TransactionTestCase):
+
+    def test_evaluate_in_processes(self):
+        """Evaluates in two spawned workers reading a file copy of the in-memory test database."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        name = os.path.join(directory, 'db.sqlite3')
+        self.addCleanup(os.remove, name)
+        copy = sqlite3.connect(name)
+        copy.executescript('\n'.join(connection.connection.iterdump()))
+        copy.close()
+        progress = []
+        pool = StatusPool(
+            processes=2, chunk_size=2, values=result_value, progress=lambda *args: progress.append(args),
+            databases={'default': {'NAME': name}}, tested=HivResult, result_list=[POS, NEG])
+        values = pool.evaluate(Subject.objects.all())
+        self.assertEqual(values, {subject.pk: str(Status(subject, tested=HivResult, result_list=[POS, NEG]))
+                                  for subject in self.subjects})
+        self.assertEqual(sorted(progress)[-1], (5, 5))
+        self.assertEqual(len(progress), 3)
@@ -0,0 +1,124 @@
+from datetime import date, datetime
+from django.test import TestCase
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview
+from hiv_status.status import Status
+
+from .mixins import StatusTestMixin
+
+
+class TestStatusQuerySet(StatusTestMixin, TestCase):
+
+    def setUp(self):
+        self.subjects = []
+        # tested results in visit order per subject
+        for index, results in enumerate([
+                [NEG, NEG, POS], [NEG, POS, NEG, POS], [NEG, NEG], [POS], [], [NEG, POS], [NEG]]):
+            subject = Subject.objects.create(subject_identifier='12345678{}'.format(index))
+            self.subjects.append(subject)
+            self.create_results(subject, results)
+        for subject, documented_result, documented_result_date in [
+                (self.subjects[2], POS, date(2001, 1, 1)),
+                (self.subjects[4], POS, date(2002, 1, 1)),
+                (self.subjects[5], NEG, date(2003, 1, 1)),
+                (self.subjects[6], NEG, date.today())]:
+            HivStatusReview.objects.create(
+                visit=Visit.objects.filter(subject=subject).order_by('visit_datetime')[0]
+                if subject.visit_set.exists() else self.create_visit(subject, timezone.now()),
+                documented_result=documented_result,
+                documented_result_date=documented_result_date)
+
+    def assert_same_as_status(self, subjects, **kwargs):
+        subjects = list(subjects)
+        self.assertEqual(subjects, self.subjects)
+        for subject in subjects:
+            expected = Status(subject, tested=HivResult, documented=HivStatusReview, **kwargs)
+            self.assertEqual(subject.result, str(expected.result) or None)
+            self.assertEqual(subject.previous, str(expected.previous) or None)
+            self.assertEqual(subject.previous_datetime, expected.previous.result_datetime)
+            self.assertEqual(subject.documented, str(expected.documented) or None)
+            self.assertEqual(subject.subject_aware, expected.subject_aware)
+            self.assertEqual(subject.newly_positive, expected.newly_positive)
+
+    def test_with_hiv_status(self):
+        self.assert_same_as_status(Subject.objects.with_hiv_status().order_by('pk'))
+
+    def test_with_hiv_status_result_list(self):
+        self.assert_same_as_status(
+            Subject.objects.with_hiv_status(result_list=[NEG]).order_by('pk'), result_list=[NEG])
+
+    def test_with_hiv_status_reference_date(self):
+        reference_date = (timezone.now() - relativedelta(months=2)).date()
+        self.assert_same_as_status(
+            Subject.objects.with_hiv_status(result_list=[NEG], reference_date=reference_date).order_by('pk'),
+            result_list=[NEG], reference_date=reference_date)
+
+    def test_with_hiv_status_visit_code(self):
+        self.create_results(self.subjects[3], [NEG], visit_code='2000')
+        self.create_results(self.subjects[4], [POS], visit_code='2000')
+        self.assert_same_as_status(
+            Subject.objects.with_hiv_status(result_list=[NEG], visit_code='2000').order_by('pk'),
+            result_list=[NEG], visit_code='2000')
+
+    def test_filter_and_order(self):
+        subjects = Subject.objects.with_hiv_status(result_list=[NEG])
+        statuses = [Status(subject, tested=HivResult, documented=HivStatusReview, result_list=[NEG])
+                    for subject in self.subjects]
+        self.assertEqual(
+            list(subjects.filter(newly_positive=True).order_by('pk')),
+            [status.subject for status in statuses if status.newly_positive])
+        self.assertEqual(
+            list(subjects.filter(result=NEG, subject_aware=False).order_by('pk')),
+            [status.subject for status in statuses if status.result == NEG and not status.subject_aware])
+        self.assertEqual(
+            list(subjects.filter(previous__isnull=False).order_by('-previous_datetime')),
+            [status.subject for status in sorted(
+                [status for status in statuses if status.previous.result_value],
+                key=lambda status: status.previous.result_datetime, reverse=True)])
+
+    def test_explicit_sources(self):
+        subjects = Subject.objects.with_hiv_status(tested=HivResult).order_by('pk')
+        for subject in subjects:
+            self.assertIsNone(subject.hiv_status_documented)
+            self.assertEqual(subject.result, str(Status(subject, tested=HivResult).result) or None)
+
+    def test_source_not_a_model(self):
+        self.assertRaises(TypeError, Subject.objects.with_hiv_status, tested=POS)
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            list(Subject.objects.with_hiv_status())
+
+    def test_subqueries_selected_once(self):
+        # the outer query, the derived table, its rows and the pk of tested, documented and previous
+        sql = str(Subject.objects.with_hiv_status().filter(newly_positive=True).order_by('result').query)
+        self.assertEqual(sql.count('SELECT'), 6)
+
+    def test_filtered_queryset(self):
+        subjects = Subject.objects.filter(pk__in=[self.subjects[1].pk, self.subjects[3].pk])
+        self.assertEqual(list(subjects.with_hiv_status().filter(newly_positive=True).order_by('pk')),
+                         [self.subjects[3]])
+        self.assertEqual(
+            Subject.objects.with_hiv_status().filter(subject_identifier='123456783').get().result, POS)
+        self.assertEqual(
+            list(Subject.objects.filter(
+                pk__in=Subject.objects.with_hiv_status().filter(result=POS).values('pk')).order_by('pk')),
+            [subject for subject in self.subjects
+             if Status(subject, tested=HivResult, documented=HivStatusReview) == POS])
+        self.assertEqual(Subject.objects.with_hiv_status().filter(newly_positive=True).count(), len(
+            [subject for subject in self.subjects
+             if Status(subject, tested=HivResult, documented=HivStatusReview).newly_positive]))
+
+    def test_previous_on_tested_date(self):
+        subject = Subject.objects.create(subject_identifier='999999999')
+        visit = self.create_visit(subject, timezone.make_aware(datetime(2016, 6, 1, 10, 0)))
+        HivResult.objects.create(visit=visit, result_value=POS, result_datetime=visit.visit_datetime)
+        annotated = Subject.objects.with_hiv_status().get(pk=subject.pk)
+        self.assertEqual(annotated.result, POS)
+        self.assertIsNone(annotated.previous)
+        self.assertIsNone(annotated.previous_datetime)
+        self.assertTrue(annotated.newly_positive)
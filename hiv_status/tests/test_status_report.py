@@ -0,0 +1,95 @@
+from collections import defaultdict
+from datetime import date
+from django.test import TestCase
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview
+from hiv_status.status import Status
+from hiv_status.status_report import StatusReport
+
+
+class TestStatusReport(TestCase):
+
+    def setUp(self):
+        self.encounter = 0
+        # tested results per visit code per subject
+        for index, results in enumerate([
+                {'1000': NEG, '2000': POS}, {'1000': POS, '2000': POS}, {'1000': NEG, '2000': NEG},
+                {'1000': NEG}, {'2000': POS}, {'1000': None, '2000': NEG}]):
+            subject = Subject.objects.create(subject_identifier='12345678{}'.format(index))
+            for m, (visit_code, result) in enumerate(sorted(results.items())):
+                self.encounter += 1
+                visit = Visit.objects.create(
+                    subject=subject, visit_code=visit_code, encounter=self.encounter,
+                    visit_datetime=timezone.now() - relativedelta(months=3 - m))
+                if result:
+                    HivResult.objects.create(
+                        visit=visit, result_value=result, result_datetime=visit.visit_datetime)
+                if index == 2:
+                    HivStatusReview.objects.create(
+                        visit=visit, documented_result=POS, documented_result_date=date(2001, 1, 1))
+
+    def expected(self, by_encounter=False, **kwargs):
+        """Returns the rows of the report computed with Status per visit."""
+        group_by = ['visit_code', 'encounter'] if by_encounter else ['visit_code']
+        groups = {}
+        for visit in Visit.objects.all():
+            group = tuple(getattr(visit, field) for field in group_by)
+            options = dict(zip(group_by, group), **kwargs)
+            status = Status(visit.subject, tested=HivResult, documented=HivStatusReview, **options)
+            subjects = groups.setdefault(group, defaultdict(set))
+            subjects['subjects'].add(visit.subject_id)
+            for key, counted in [('pos', status.result == POS), ('neg', status.result == NEG),
+                                 ('unknown', not status.result.result_value),
+                                 ('subject_aware', status.subject_aware), ('newly_positive', status.newly_positive)]:
+                if counted:
+                    subjects[key].add(visit.subject_id)
+        return [dict(zip(group_by, group), **{key: len(subjects[key]) for key in self.counts})
+                for group, subjects in sorted(groups.items())]
+
+    counts = ['subjects', 'pos', 'neg', 'unknown', 'subject_aware', 'newly_positive']
+
+    def assert_rows(self, report, expected):
+        keys = [key for key in ['visit_code', 'encounter'] if key in (expected or [{}])[0]] + self.counts
+        self.assertEqual([{key: row[key] for key in keys} for row in report],
+                         [{key: row[key] for key in keys} for row in expected])
+
+    def test_report(self):
+        self.assert_rows(StatusReport(), self.expected())
+
+    def test_report_result_list(self):
+        self.assert_rows(StatusReport(result_list=[NEG]), self.expected(result_list=[NEG]))
+
+    def test_report_visits(self):
+        report = StatusReport(visits=Visit.objects.filter(visit_code='2000'), result_list=[NEG])
+        self.assert_rows(report, [row for row in self.expected(result_list=[NEG]) if row['visit_code'] == '2000'])
+
+    def test_report_by_encounter(self):
+        self.assert_rows(StatusReport(by_encounter=True), self.expected(by_encounter=True))
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            rows = list(StatusReport())
+        self.assertEqual([(row['visit_code'], row['subjects']) for row in rows], [('1000', 5), ('2000', 5)])
+        self.assertEqual(len(list(StatusReport(by_encounter=True))), Visit.objects.count())
+
+    def test_subqueries_selected_once(self):
+        # the outer query, the derived table, its rows, the distinct groups, the pk of tested
+        # and documented, then the subjects of the distinct groups and the pk of their previous
+        sql = str(StatusReport().queryset().query)
+        self.assertEqual(sql.count('SELECT'), 10)
+        self.assertEqual(sql.count('DISTINCT'), 3)
+
+    def test_subject_counted_once(self):
+        subject = Subject.objects.get(subject_identifier='123456781')
+        self.encounter += 1
+        visit = Visit.objects.create(
+            subject=subject, visit_code='1000', encounter=self.encounter, visit_datetime=timezone.now())
+        HivResult.objects.create(visit=visit, result_value=POS, result_datetime=visit.visit_datetime)
+        rows = list(StatusReport())
+        self.assertEqual([(row['visit_code'], row['subjects'], row['pos']) for row in rows], [
+            ('1000', 5, 2), ('2000', 5, 4)])
+        self.assert_rows(rows, self.expected())
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview
+from hiv_status.status import Status
+
+from .mixins import StatusTestMixin
+
+
+class TestStatusTimeline(StatusTestMixin, TestCase):
+
+    def setUp(self):
+        self.subjects = []
+        self.dates = [(timezone.now() - relativedelta(months=m)).date() for m in range(8)]
+        for n, results in enumerate([[NEG, NEG, POS, NEG, POS], [NEG, NEG], [], [POS]]):
+            subject = Subject.objects.create(subject_identifier='12345678{}'.format(n))
+            visits = self.create_results(subject, results, base_datetime=timezone.now() - relativedelta(days=1))
+            if len(visits) > 1:
+                HivStatusReview.objects.create(
+                    visit=visits[1], documented_result=POS if n else NEG,
+                    documented_result_date=visits[1].visit_datetime.date())
+            self.subjects.append(subject)
+
+    def status_on(self, subject, reference_date, **kwargs):
+        """Returns a Status of only the results on or before reference_date."""
+        status = Status(subject)
+        return Status(
+            subject,
+            tested=HivResult.objects.filter(
+                result_datetime__lt=status.zero_time(reference_date + timedelta(days=1))),
+            documented=HivStatusReview.objects.filter(documented_result_date__lte=reference_date),
+            reference_date=reference_date, **kwargs)
+
+    def assert_same_as_status(self, **kwargs):
+        timelines = list(Status.timeline(
+            Subject.objects.order_by('pk'), self.dates, tested=HivResult, documented=HivStatusReview,
+            chunk_size=3, **kwargs))
+        self.assertEqual([subject for subject, _ in timelines], self.subjects)
+        for subject, timeline in timelines:
+            self.assertEqual([d for d, _ in timeline], sorted(self.dates))
+            for reference_date, status in timeline:
+                self.assert_same_status(
+                    status, self.status_on(subject, reference_date, **kwargs),
+                    attrs=['tested', 'previous', 'documented'], date_attr='result_datetime')
+
+    def test_same_as_status(self):
+        self.assert_same_as_status()
+
+    def test_same_as_status_result_list(self):
+        self.assert_same_as_status(result_list=[NEG])
+
+    def test_becomes_positive(self):
+        timeline = list(Status.timeline([self.subjects[0]], self.dates, tested=HivResult))[0][1]
+        self.assertEqual([str(status) for _, status in timeline], [''] * 4 + [POS] * 4)
+        # from the second POS on, the first POS is the previous result
+        self.assertEqual([status.newly_positive for _, status in timeline], [False] * 4 + [True] * 2 + [False] * 2)
+
+    def test_queries(self):
+        with self.assertNumQueries(4):
+            list(Status.timeline(Subject.objects.all(), self.dates, tested=HivResult, documented=HivStatusReview))
+
+    def test_null_result_datetime(self):
+        subject = self.subjects[2]
+        visits = self.create_results(subject, [NEG])
+        HivResult.objects.create(visit=self.create_visit(subject, timezone.now()), result_value=POS)
+        HivStatusReview.objects.create(visit=visits[0], documented_result=POS)
+        self.assert_same_as_status()
+        self.assert_same_as_status(result_list=[NEG])
+        timeline = list(Status.timeline([subject], self.dates, tested=HivResult, result_list=[NEG]))[0][1]
+        self.assertEqual(str(timeline[-1][1]), NEG)
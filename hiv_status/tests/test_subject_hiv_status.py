@@ -0,0 +1,92 @@
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+from dateutil.relativedelta import relativedelta
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, Visit, HivStatusReview, SubjectHivStatus
+
+
+class TestSubjectHivStatus(TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        self.visits = []
+        for m in range(0, 3):
+            self.visits.append(Visit.objects.create(
+                subject=self.subject,
+                visit_code='1000',
+                encounter=m,
+                visit_datetime=timezone.now() - relativedelta(months=3 - m)))
+
+    def test_created_on_result(self):
+        HivResult.objects.create(
+            visit=self.visits[0], result_value=NEG, result_datetime=self.visits[0].visit_datetime)
+        subject_hiv_status = SubjectHivStatus.objects.get(subject=self.subject)
+        self.assertIsNone(subject_hiv_status.result)
+        self.assertFalse(subject_hiv_status.newly_positive)
+
+    def test_updated_on_result(self):
+        HivResult.objects.create(
+            visit=self.visits[0], result_value=NEG, result_datetime=self.visits[0].visit_datetime)
+        hiv_result = HivResult.objects.create(
+            visit=self.visits[1], result_value=POS, result_datetime=self.visits[1].visit_datetime)
+        subject_hiv_status = SubjectHivStatus.objects.get(subject=self.subject)
+        self.assertEqual(subject_hiv_status.result, POS)
+        self.assertEqual(subject_hiv_status.result_datetime, hiv_result.result_datetime)
+        self.assertEqual(subject_hiv_status.source, 'tested')
+        self.assertIsNone(subject_hiv_status.previous)
+        self.assertTrue(subject_hiv_status.newly_positive)
+        self.assertFalse(subject_hiv_status.subject_aware)
+        hiv_result.delete()
+        subject_hiv_status = SubjectHivStatus.objects.get(subject=self.subject)
+        self.assertIsNone(subject_hiv_status.result)
+        self.assertFalse(subject_hiv_status.newly_positive)
+
+    def test_updated_on_status_review(self):
+        HivStatusReview.objects.create(
+            visit=self.visits[0],
+            documented_result=POS,
+            documented_result_date=self.visits[0].visit_datetime.date())
+        subject_hiv_status = SubjectHivStatus.objects.get(subject=self.subject)
+        self.assertEqual(subject_hiv_status.result, POS)
+        self.assertEqual(subject_hiv_status.source, 'documented')
+        self.assertTrue(subject_hiv_status.subject_aware)
+
+    def test_deleted_with_subject(self):
+        HivResult.objects.create(
+            visit=self.visits[0], result_value=POS, result_datetime=self.visits[0].visit_datetime)
+        self.subject.delete()
+        self.assertEqual(SubjectHivStatus.objects.all().count(), 0)
+
+    def test_rebuild(self):
+        HivResult.objects.create(
+            visit=self.visits[1], result_value=POS, result_datetime=self.visits[1].visit_datetime)
+        Subject.objects.create(subject_identifier='987654321')
+        SubjectHivStatus.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_hiv_status', stdout=out)
+        self.assertIn('2 subjects', out.getvalue())
+        self.assertNotIn('Evaluated', out.getvalue())
+        self.assertEqual(SubjectHivStatus.objects.get(subject=self.subject).result, POS)
+        self.assertIsNone(SubjectHivStatus.objects.get(subject__subject_identifier='987654321').result)
+
+    def test_rebuild_processes(self):
+        HivResult.objects.create(
+            visit=self.visits[1], result_value=POS, result_datetime=self.visits[1].visit_datetime)
+        Subject.objects.create(subject_identifier='987654321')
+        out = StringIO()
+        call_command('rebuild_hiv_status', processes=1, chunk_size=1, verbosity=2, stdout=out)
+        self.assertIn('Evaluated 2 of 2 subjects.', out.getvalue())
+        self.assertEqual(SubjectHivStatus.objects.get(subject=self.subject).result, POS)
+        self.assertEqual(SubjectHivStatus.objects.all().count(), 2)
+
+    def test_rebuild_progress(self):
+        Subject.objects.create(subject_identifier='987654321')
+        Subject.objects.create(subject_identifier='987654322')
+        out = StringIO()
+        call_command('rebuild_hiv_status', chunk_size=2, verbosity=2, stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            'Evaluated 2 of 3 subjects.', 'Evaluated 3 of 3 subjects.', 'Rebuilt HIV status for 3 subjects.'])
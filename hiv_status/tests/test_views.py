@@ -0,0 +1,241 @@
+import json
+
+from datetime import date
+from django.contrib.auth.models import Permission, User
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from edc_constants.constants import POS, NEG
+
+from hiv_status.models import HivResult, Subject, SubjectHivStatus, Visit, HivStatusReview
+
+from .mixins import StatusTestMixin
+
+
+class LoginMixin:
+
+    def login(self, permission=True):
+        """Logs the test client in as a new user with VIEW_PERMISSION, if permission."""
+        user = User.objects.create_user('user{}'.format(User.objects.count()), password='password')
+        if permission:
+            user.user_permissions.add(Permission.objects.get(codename='view_subjecthivstatus'))
+        self.client.force_login(user)
+        return user
+
+
+class TestSubjectStatusView(StatusTestMixin, LoginMixin, TestCase):
+
+    def setUp(self):
+        self.login()
+        self.subject = Subject.objects.create(subject_identifier='123456789')
+        self.visit, = self.create_results(self.subject, [NEG])
+        HivStatusReview.objects.create(
+            visit=self.visit, documented_result=POS, documented_result_date=date(2001, 1, 1))
+        self.url = reverse('subject_status', args=[self.subject.subject_identifier])
+
+    def test_status(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'subject_identifier': '123456789', 'result': POS, 'result_datetime': '2001-01-01T00:00:00+02:00',
+            'previous': None, 'previous_datetime': None, 'documented': POS, 'indirect': None,
+            'subject_aware': True, 'newly_positive': False})
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_options(self):
+        response = self.client.get(self.url, {'visit_code': '2000'})
+        self.assertEqual(response.json()['result'], None)
+        response = self.client.get(self.url, {'visit_code': '1000', 'encounter': '1'})
+        self.assertEqual(response.json()['result'], POS)
+        response = self.client.get(self.url, {'reference_date': '2000-01-01'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_options(self):
+        for params in [{'reference_date': '2000-13-01'}, {'reference_date': 'x'}, {'encounter': 'x'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+
+    def test_not_found(self):
+        response = self.client.get(reverse('subject_status', args=['987654321']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        # the session, the user and its permissions, then the ETag from the subject and its SubjectHivStatus
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get(self.url, {'visit_code': '1000'})['ETag'], etag)
+
+    def test_modified_on_change(self):
+        etag = self.client.get(self.url)['ETag']
+        HivResult.objects.create(
+            visit=Visit.objects.create(
+                subject=self.subject, visit_code='2000', encounter=1, visit_datetime=timezone.now()),
+            result_value=POS, result_datetime=timezone.now())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['newly_positive'], True)
+        etag = response['ETag']
+        HivStatusReview.objects.filter(visit=self.visit).update(documented_result=NEG)
+        HivStatusReview.objects.get(visit=self.visit).save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_etag_without_subject_hiv_status(self):
+        SubjectHivStatus.objects.filter(subject=self.subject).delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response.get('ETag', '*'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_not_allowed(self):
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login/', response['Location'])
+
+    def test_permission_required(self):
+        self.login(permission=False)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class TestBatchStatusView(StatusTestMixin, LoginMixin, TestCase):
+
+    def setUp(self):
+        self.login()
+        self.subjects = []
+        for index, result in enumerate([POS, NEG, None, POS]):
+            subject = Subject.objects.create(subject_identifier='12345678{}'.format(index))
+            self.subjects.append(subject)
+            self.create_results(subject, [result] if result else [])
+        self.url = reverse('batch_status')
+
+    def post(self, data):
+        return self.client.post(self.url, json.dumps(data), content_type='application/json')
+
+    def test_batch(self):
+        identifiers = ['123456783', '123456780', '999999999', '123456781', '123456780']
+        response = self.post({'subject_identifiers': identifiers, 'visit_code': '1000'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([status['subject_identifier'] for status in data['statuses']],
+                         ['123456783', '123456780', '123456781'])
+        self.assertEqual([status['result'] for status in data['statuses']], [POS, POS, None])
+        self.assertEqual(data['missing'], ['999999999'])
+        self.assertRegex(response['Server-Timing'], r'^subjects;dur=[\d.]+, status;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_same_as_subject_status(self):
+        data = self.post({'subject_identifiers': [s.subject_identifier for s in self.subjects],
+                          'reference_date': '2030-01-01'}).json()
+        for subject, status in zip(self.subjects, data['statuses']):
+            self.assertEqual(status, self.client.get(
+                reverse('subject_status', args=[subject.subject_identifier]),
+                {'reference_date': '2030-01-01'}).json())
+
+    def test_queries(self):
+        # the session, the user and its permissions, then the subjects and tested, previous and
+        # documented for all subjects
+        with self.assertNumQueries(8):
+            self.post({'subject_identifiers': [s.subject_identifier for s in self.subjects]})
+
+    @override_settings(HIV_STATUS_BATCH_MAX_SIZE=3)
+    def test_max_size(self):
+        response = self.post({'subject_identifiers': [s.subject_identifier for s in self.subjects]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most 3', response.json()['error'])
+
+    def test_invalid(self):
+        for body in ['x', '[]', '{}', '{"subject_identifiers": [1]}',
+                     '{"subject_identifiers": [], "encounter": "x"}']:
+            response = self.client.post(self.url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_get_not_allowed(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.post({'subject_identifiers': ['123456780']}).status_code, 302)
+
+    def test_permission_required(self):
+        self.login(permission=False)
+        self.assertEqual(self.post({'subject_identifiers': ['123456780']}).status_code, 403)
+
+    def test_csrf_required(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.login()
+        self.assertEqual(self.post({'subject_identifiers': ['123456780']}).status_code, 403)
+        token = 'x' * 32
+        self.client.cookies['csrftoken'] = token
+        response = self.client.post(
+            self.url, json.dumps({'subject_identifiers': ['123456780']}), content_type='application/json',
+            HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 200)
+
+
+class TestStatusFeedView(StatusTestMixin, LoginMixin, TestCase):
+
+    def setUp(self):
+        self.login()
+        self.subjects = []
+        for index in range(7):
+            subject = Subject.objects.create(subject_identifier='12345678{}'.format(index))
+            self.subjects.append(subject)
+            self.create_results(subject, [POS if index % 3 else NEG], visit_code='1000' if index % 2 else '2000')
+        self.url = reverse('status_feed')
+
+    def pages(self, params):
+        pages = []
+        url = self.url
+        while url:
+            response = self.client.get(url, params if not pages else None)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            url = pages[-1]['next']
+        return pages
+
+    def test_feed(self):
+        pages = self.pages({'limit': 3})
+        self.assertEqual([len(page['statuses']) for page in pages], [3, 3, 1])
+        self.assertEqual([status['subject_identifier'] for page in pages for status in page['statuses']],
+                         [subject.subject_identifier for subject in self.subjects])
+        self.assertEqual([status['result'] for page in pages for status in page['statuses']],
+                         [None, POS, POS, None, POS, POS, None])
+
+    def test_exact_pages(self):
+        pages = self.pages({'limit': 7})
+        self.assertEqual(len(pages), 1)
+        self.assertIsNone(pages[0]['next'])
+
+    def test_visit_code(self):
+        pages = self.pages({'limit': 2, 'visit_code': '1000'})
+        self.assertEqual([status['subject_identifier'] for page in pages for status in page['statuses']],
+                         ['123456781', '123456783', '123456785'])
+        self.assertIn('visit_code=1000', pages[0]['next'])
+
+    def test_queries(self):
+        # the session, the user and its permissions, then the page of subjects and tested,
+        # previous and documented for the page
+        with self.assertNumQueries(8):
+            self.client.get(self.url, {'limit': 3})
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login/', response['Location'])
+
+    def test_permission_required(self):
+        self.login(permission=False)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_invalid(self):
+        for params in [{'cursor': 'x'}, {'limit': 0}, {'limit': 100000}, {'limit': 'x'}, {'encounter': 'x'}]:
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
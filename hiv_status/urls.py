@@ -17,8 +17,13 @@ Including another URLconf
 from django.conf.urls import include, url, patterns
 from django.contrib import admin
 
+from . import views
+
 admin.autodiscover()
 
 urlpatterns = [
     url(r'^admin/', include(admin.site.urls)),
+    url(r'^status/batch/$', views.batch_status, name='batch_status'),
+    url(r'^status/feed/$', views.status_feed, name='status_feed'),
+    url(r'^status/(?P<subject_identifier>[^/]+)/$', views.subject_status, name='subject_status'),
 ]
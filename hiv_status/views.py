@@ -0,0 +1,197 @@
+import hashlib
+import json
+
+from collections import OrderedDict
+from datetime import date
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, permission_required
+from django.core import signing
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import condition, require_POST, require_safe
+
+from .models import Subject, SubjectHivStatus, Visit
+
+FEED_CURSOR_SALT = 'hiv_status.views.status_feed'
+
+# status is sensitive, the views require a login with this permission
+VIEW_PERMISSION = 'hiv_status.view_subjecthivstatus'
+
+
+def status_options(params):
+    """Returns the Status options reference_date, visit_code and encounter given in
+    params, e.g. request.GET or a dictionary decoded from JSON, or raises ValueError."""
+    options = {}
+    if params.get('reference_date'):
+        try:
+            options['reference_date'] = parse_date(params['reference_date'])
+        except (TypeError, ValueError):
+            options['reference_date'] = None
+        if not options['reference_date']:
+            raise ValueError('Invalid reference_date {}. Expected YYYY-MM-DD.'.format(params['reference_date']))
+    if params.get('visit_code'):
+        options['visit_code'] = str(params['visit_code'])
+    if params.get('encounter'):
+        try:
+            options['encounter'] = int(params['encounter'])
+        except (TypeError, ValueError):
+            raise ValueError('Invalid encounter {}. Expected an integer.'.format(params['encounter']))
+    return options
+
+
+def status_json(status):
+    """Returns a dictionary of the result, previous, documented, indirect, subject_aware
+    and newly_positive of a Status for JsonResponse."""
+    return OrderedDict([
+        ('subject_identifier', status.subject.subject_identifier),
+        ('result', str(status.result) or None),
+        ('result_datetime', SubjectHivStatus.to_datetime(status, status.result.result_datetime)),
+        ('previous', str(status.previous) or None),
+        ('previous_datetime', SubjectHivStatus.to_datetime(status, status.previous.result_datetime)),
+        ('documented', str(status.documented) or None),
+        ('indirect', str(status.indirect) or None),
+        ('subject_aware', status.subject_aware),
+        ('newly_positive', status.newly_positive),
+    ])
+
+
+def subject_status_etag(request, subject_identifier):
+    """Returns the ETag of the status of a subject, or None if there is no such subject
+    or it has no SubjectHivStatus yet.
+
+    The ETag changes with the options, the reference date (today if not given) and the
+    time the subject's SubjectHivStatus was last modified, which the signals in
+    signals.py update whenever a result or visit of the subject is saved or deleted.
+    It is read with the subject in one query.
+
+    Writes that send no signals, i.e. loaddata (raw saves), bulk_create and
+    QuerySet.update of results or visits, leave the SubjectHivStatus as is, so the
+    ETag goes stale until the subject's SubjectHivStatus is recomputed, e.g. with
+    SubjectHivStatus.objects.update_subject."""
+    try:
+        options = status_options(request.GET)
+    except ValueError:
+        return None
+    subject = Subject.objects.filter(subject_identifier=subject_identifier).values(
+        'pk', 'subjecthivstatus__modified').first()
+    if subject is None or subject['subjecthivstatus__modified'] is None:
+        return None
+    parts = [
+        subject['pk'],
+        subject['subjecthivstatus__modified'],
+        options.get('reference_date') or date.today(),
+        options.get('visit_code'),
+        options.get('encounter'),
+    ]
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+@require_safe
+@login_required
+@permission_required(VIEW_PERMISSION, raise_exception=True)
+@condition(etag_func=subject_status_etag)
+def subject_status(request, subject_identifier):
+    """Returns the status of a subject as JSON, or 304 Not Modified if the ETag given in
+    If-None-Match is current, see subject_status_etag. Requires VIEW_PERMISSION.
+
+    Accepts the query parameters reference_date (YYYY-MM-DD), visit_code and encounter."""
+    try:
+        options = status_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    subject = get_object_or_404(Subject, subject_identifier=subject_identifier)
+    options.update(SubjectHivStatus.sources)
+    return JsonResponse(status_json(SubjectHivStatus.status_class(subject, **options)))
+
+
+@require_POST
+@login_required
+@permission_required(VIEW_PERMISSION, raise_exception=True)
+def batch_status(request):
+    """Returns the statuses of many subjects as JSON, resolved together by Status.bulk.
+    Requires VIEW_PERMISSION and, as any POST with a session, the CSRF token, e.g.
+    in the X-CSRFToken header.
+
+    Expects a JSON object with a list of subject_identifiers, at most
+    settings.HIV_STATUS_BATCH_MAX_SIZE (default 100), and optionally reference_date,
+    visit_code and encounter. Returns {"statuses": [...], "missing": [...]} in the
+    order requested, missing listing the identifiers of unknown subjects. The
+    Server-Timing header reports the milliseconds spent fetching the subjects,
+    resolving the statuses and in total."""
+    started = perf_counter()
+    max_size = getattr(settings, 'HIV_STATUS_BATCH_MAX_SIZE', 100)
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object.')
+        identifiers = data.get('subject_identifiers')
+        if not isinstance(identifiers, list) or not all(isinstance(i, str) for i in identifiers):
+            raise ValueError('Expected subject_identifiers, a list of strings.')
+        if len(identifiers) > max_size:
+            raise ValueError('Expected at most {} subject_identifiers. Got {}.'.format(max_size, len(identifiers)))
+        options = status_options(data)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    identifiers = list(OrderedDict.fromkeys(identifiers))
+    subjects = {subject.subject_identifier: subject
+                for subject in Subject.objects.filter(subject_identifier__in=identifiers)}
+    fetched = perf_counter()
+    options.update(SubjectHivStatus.sources)
+    statuses = SubjectHivStatus.status_class.bulk(
+        [subjects[i] for i in identifiers if i in subjects], chunk_size=max_size, **options)
+    response = JsonResponse({
+        'statuses': [status_json(status) for status in statuses],
+        'missing': [i for i in identifiers if i not in subjects]})
+    resolved = perf_counter()
+    response['Server-Timing'] = 'subjects;dur={:.1f}, status;dur={:.1f}, total;dur={:.1f}'.format(
+        (fetched - started) * 1000, (resolved - fetched) * 1000, (resolved - started) * 1000)
+    return response
+
+
+@require_safe
+@login_required
+@permission_required(VIEW_PERMISSION, raise_exception=True)
+def status_feed(request):
+    """Returns a page of the statuses of all subjects ordered by Subject.id as JSON.
+
+    Pages are selected by keyset, i.e. the subjects after the last id of the previous
+    page, so each page costs the same however far into the cohort. Returns
+    {"statuses": [...], "next": <url of the next page or null>}; the next url carries
+    an opaque, signed cursor. Accepts the query parameters limit (default
+    settings.HIV_STATUS_FEED_PAGE_SIZE or 100, at most HIV_STATUS_FEED_MAX_PAGE_SIZE
+    or 1000), cursor, reference_date, visit_code and encounter. With visit_code only
+    subjects with a visit of that code are listed. Each page is resolved with
+    Status.bulk."""
+    max_limit = getattr(settings, 'HIV_STATUS_FEED_MAX_PAGE_SIZE', 1000)
+    try:
+        options = status_options(request.GET)
+        limit = int(request.GET.get('limit') or getattr(settings, 'HIV_STATUS_FEED_PAGE_SIZE', 100))
+        if not 0 < limit <= max_limit:
+            raise ValueError('Invalid limit {}. Expected 1 to {}.'.format(limit, max_limit))
+        after = None
+        if request.GET.get('cursor'):
+            try:
+                after = signing.loads(request.GET['cursor'], salt=FEED_CURSOR_SALT)['after']
+            except (signing.BadSignature, KeyError, TypeError):
+                raise ValueError('Invalid cursor.')
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    subjects = Subject.objects.order_by('pk')
+    if after is not None:
+        subjects = subjects.filter(pk__gt=after)
+    if options.get('visit_code'):
+        subjects = subjects.filter(pk__in=Visit.objects.filter(
+            visit_code=options['visit_code']).values('subject_id'))
+    subjects = list(subjects[:limit + 1])
+    next_url = None
+    if len(subjects) > limit:
+        subjects = subjects[:limit]
+        params = request.GET.copy()
+        params['cursor'] = signing.dumps({'after': subjects[-1].pk}, salt=FEED_CURSOR_SALT)
+        next_url = request.build_absolute_uri('{}?{}'.format(request.path, params.urlencode()))
+    options.update(SubjectHivStatus.sources)
+    statuses = SubjectHivStatus.status_class.bulk(subjects, chunk_size=limit, **options)
+    return JsonResponse({'statuses': [status_json(status) for status in statuses], 'next': next_url})
@@ -0,0 +1,97 @@
+from django.db import connections, router
+from django.db.models import F, Value
+
+from .status import ResultValues
+from .status_batch import StatusBatch
+
+
+class WindowStatusBatch(StatusBatch):
+
+    """A StatusBatch that selects the latest and previous instance of every source
+    for a chunk of subjects in a single query using ROW_NUMBER() window functions.
+
+    The per-source querysets of StatusBatch, built from the `lookup_options`,
+    `field_attr` and `get_latest_by` of `status_class`, are compiled to SQL, ranked with
+
+        ROW_NUMBER() OVER (PARTITION BY subject ORDER BY <get_latest_by> DESC)
+
+    ("previous" ranks POS ahead of NEG, then by date ascending) and combined with
+    UNION ALL. The selected rows carry the result value, result datetime and visit
+    of their source and are passed to `status_class` as ResultValues, as with
+    Status.fetch_values, so a chunk takes one query; `result.instance` is None and
+    `result.visit` is the visit's pk. The final decision is left to `status_class`,
+    as for StatusBatch.
+
+        >>> batch = Status.bulk(
+            Subject.objects.all(), tested=HivResult, documented=HivStatusReview,
+            batch_class=WindowStatusBatch)
+
+    Requires a database with window functions, e.g. SQLite >= 3.25, PostgreSQL, MySQL 8.
+    """
+
+    columns = ['hs_pk', 'hs_order_by', 'hs_value', 'hs_datetime', 'hs_visit']
+
+    def instances(self, subject_ids):
+        instances = {subject_id: {} for subject_id in subject_ids}
+        models = dict(self.models())
+        for name in models:
+            for subject_id in subject_ids:
+                instances[subject_id][name] = None
+        if not models:
+            return instances
+        selects, params = [], []
+        for name, model in models.items():
+            sql, select_params = self.ranked_sql(model, name, subject_ids)
+            selects.append(sql)
+            params.extend(select_params)
+        # hs_datetime is a date or a datetime depending on the source; as an expression it has no
+        # declared type from the first select for the driver to convert it by, see result_values.
+        sql = ('SELECT hs_source, {subject_id}, hs_pk, hs_value, COALESCE(hs_datetime, NULL), hs_visit '
+               'FROM ({selects}) hs_ranked WHERE hs_row_number = 1').format(
+            subject_id=self.subject_id_attr, selects=' UNION ALL '.join(selects))
+        connection = connections[router.db_for_read(list(models.values())[0])]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        for source, subject_id, pk, result_value, result_datetime, visit in rows:
+            instances[subject_id][source] = self.result_values(
+                connection, models[source], source, pk, result_value, result_datetime, visit)
+        return instances
+
+    def result_values(self, connection, model, name, pk, *values):
+        """Returns the ResultValues of a selected row, its result value, result datetime
+        and visit converted as QuerySet.values() would."""
+        attrs = self.prototype.attrs(name)
+        row = {'pk': pk}
+        for attr, value in zip(attrs, values):
+            field = model._meta.get_field(attr)
+            expression = Value(None, output_field=field)
+            for converter in connection.ops.get_db_converters(expression) + field.get_db_converters(connection):
+                value = converter(value, expression, connection, {})
+            row[attr] = field.to_python(value)
+        return ResultValues(**row)
+
+    def values_sql(self, name, queryset, ordering, *columns):
+        """Returns the SQL and params of the queryset selecting the ranking and result columns."""
+        result_value_attr, result_datetime_attr, visit_attr = self.prototype.attrs(name)
+        queryset = queryset.order_by().annotate(
+            hs_pk=F('pk'), hs_order_by=F(ordering), hs_value=F(result_value_attr),
+            hs_datetime=F(result_datetime_attr), hs_visit=F(visit_attr)).values(
+            self.subject_id_attr, *(self.columns + list(columns)))
+        return queryset.query.sql_with_params()
+
+    def ranked_sql(self, model, name, subject_ids):
+        """Returns the SQL and params selecting the rows of 'name' numbered per subject
+        in the order of Status.latest_instance or Status.previous_instance."""
+        if name == 'previous':
+            rank, ordering = self.prototype.previous_ordering(name)
+            sql, params = self.values_sql(name, self.previous_queryset(model, subject_ids), ordering, rank)
+            order_by = '{}, hs_order_by'.format(rank)
+        else:
+            sql, params = self.values_sql(
+                name, self.latest_queryset(model, name, subject_ids), self.get_latest_by(name))
+            order_by = 'hs_order_by DESC'
+        sql = ('SELECT %s AS hs_source, {subject_id}, hs_pk, hs_value, hs_datetime, hs_visit, ROW_NUMBER() OVER ('
+               'PARTITION BY {subject_id} ORDER BY {order_by}) AS hs_row_number FROM ({sql}) hs_rows').format(
+            subject_id=self.subject_id_attr, order_by=order_by, sql=sql)
+        return sql, [name] + list(params)
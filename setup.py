@@ -21,6 +21,9 @@ setup(
     description='hiv-status',
     long_description=README,
     zip_safe=False,
+    python_requires='>=3.5',
+    install_requires=['Django>=1.9,<1.10'],
+    extras_require={'numpy': ['numpy']},
     keywords='django EDC hiv status',
     classifiers=[
         'Environment :: Web Environment',
@@ -29,8 +32,11 @@ setup(
         'License :: OSI Approved :: GNU General Public License (GPL)',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
+        'Framework :: Django :: 1.9',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.6',
         'Topic :: Internet :: WWW/HTTP',
         'Topic :: Internet :: WWW/HTTP :: Dynamic Content',
     ],